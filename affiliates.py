@@ -7,9 +7,19 @@ import os
 import requests
 from typing import Dict, Any, List, Optional
 
+from resilience import call_sync
+from rate_limiter import ensure_within_cap, counted
+
 DADATA_API_URL = "https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/party"
 
 
+def _suggest_party(payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Одна попытка запроса подсказок DaData (поиск не меняет данных — его можно повторять)."""
+    response = requests.post(DADATA_API_URL, json=payload, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
 def find_affiliated_companies(manager_name: str, exclude_inn: str = None, limit: int = 10) -> List[Dict[str, Any]]:
     """
     Ищет компании, где указанное лицо является руководителем или учредителем.
@@ -40,9 +50,8 @@ def find_affiliated_companies(manager_name: str, exclude_inn: str = None, limit:
     }
     
     try:
-        response = requests.post(DADATA_API_URL, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        ensure_within_cap("dadata", ["suggest_party"])
+        data = call_sync("dadata", counted("dadata", ["suggest_party"], _suggest_party), payload, headers)
         
         companies = []
         for suggestion in data.get("suggestions", []):
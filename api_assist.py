@@ -4,43 +4,82 @@
 """
 
 import os
+import time
+import asyncio
+import logging
+import aiohttp
 import requests
 from typing import Dict, Any, List, Optional
 from urllib.parse import quote
 
+from http_client import get_session, make_timeout
+from resilience import call_sync, call_async
+from risk_engine import THRESHOLDS
+import rate_limiter
+from rate_limiter import ensure_within_cap, get_bucket, counted, QuotaExceededError
+
 API_ASSIST_KEY = os.getenv("API_ASSIST_KEY", "")
 BASE_URL = "https://service.api-assist.com/parser"
 
-# Флаг для отслеживания API (импортируем лениво чтобы избежать циклических импортов)
-_api_tracking_enabled = True
+REQUEST_TIMEOUT = 30     # Один запрос, сек
+EXTENDED_DEADLINE = 20   # Общий дедлайн расширенной проверки (все запросы параллельно), сек
+
+# Названия секций расширенной проверки (для отметки о недогруженных)
+EXTENDED_SECTIONS = {
+    "fssp": "ФССП",
+    "nalog_org": "ФНС",
+    "arbitr": "Арбитраж",
+    "disqualified": "Дисквалификация",
+}
+
+
+def _get_json(endpoint: str, params: Dict[str, str]) -> Dict[str, Any]:
+    """Одна попытка GET-запроса к API."""
+    response = requests.get(f"{BASE_URL}/{endpoint}", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
 
 
 def _make_request(endpoint: str, params: Dict[str, str]) -> Dict[str, Any]:
-    """Выполняет HTTP запрос к API и отслеживает использование."""
+    """Выполняет HTTP запрос к API (с повторами и circuit breaker) и учитывает его в квоте api_assist."""
     params["key"] = API_ASSIST_KEY
     try:
-        response = requests.get(f"{BASE_URL}/{endpoint}", params=params, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        
-        # Отслеживаем использование API
-        if _api_tracking_enabled:
-            try:
-                from database import increment_api_usage
-                usage_info = increment_api_usage("zachestnyibiznes")
-                # Если нужно отправить алерт, сохраняем в результате
-                if usage_info.get("should_alert"):
-                    result["_api_alert"] = usage_info
-            except Exception:
-                pass  # Не блокируем запрос если трекинг не работает
-        
-        return result
+        ensure_within_cap("api_assist", [endpoint])
+        wait = get_bucket("api_assist").try_acquire()
+        if wait > 0:
+            time.sleep(wait)
+        return call_sync("api_assist", counted("api_assist", [endpoint], _get_json), endpoint, params)
+    except QuotaExceededError as e:
+        return {"error": str(e), "success": 0}
     except requests.exceptions.RequestException as e:
         return {"error": str(e), "success": 0}
     except Exception as e:
         return {"error": str(e), "success": 0}
 
 
+async def _get_json_async(endpoint: str, params: Dict[str, str], timeout: float) -> Dict[str, Any]:
+    """Одна попытка GET-запроса к API через общую aiohttp-сессию."""
+    session = get_session()
+    async with session.get(f"{BASE_URL}/{endpoint}", params=params, timeout=make_timeout(timeout)) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def _make_request_async(endpoint: str, params: Dict[str, str], timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """Асинхронный вариант _make_request: те же повторы, breaker и учёт квоты."""
+    params["key"] = API_ASSIST_KEY
+    try:
+        await rate_limiter.acquire("api_assist", [endpoint])
+        attempt = counted("api_assist", [endpoint], _get_json_async)
+        return await call_async("api_assist", attempt, endpoint, params, timeout)
+    except QuotaExceededError as e:
+        return {"error": str(e), "success": 0}
+    except aiohttp.ClientError as e:
+        return {"error": str(e), "success": 0}
+    except Exception as e:
+        return {"error": str(e), "success": 0}
+
+
 # ============ ФССП API ============
 
 def get_fssp_by_inn(inn: str) -> Dict[str, Any]:
@@ -48,8 +87,10 @@ def get_fssp_by_inn(inn: str) -> Dict[str, Any]:
     Поиск исполнительных производств по ИНН юр.лица.
     Возвращает список долгов и общую сумму.
     """
-    result = _make_request("fssp_api/search_ur_by_inn", {"inn": inn})
-    
+    return _parse_fssp(_make_request("fssp_api/search_ur_by_inn", {"inn": inn}))
+
+
+def _parse_fssp(result: Dict[str, Any]) -> Dict[str, Any]:
     if result.get("done") != 1:
         return {"found": False, "total": 0, "sum": 0, "items": [], "error": result.get("error")}
     
@@ -108,8 +149,10 @@ def format_fssp_report(data: Dict[str, Any]) -> str:
 
 def get_nalog_org(inn: str) -> Dict[str, Any]:
     """Получает информацию об организации из pb.nalog.ru."""
-    result = _make_request("nalog_pb_api/", {"type": "TYPE_SEARCH_ORG", "inn": inn})
-    
+    return _parse_nalog_org(_make_request("nalog_pb_api/", {"type": "TYPE_SEARCH_ORG", "inn": inn}))
+
+
+def _parse_nalog_org(result: Dict[str, Any]) -> Dict[str, Any]:
     if result.get("success") != 1:
         return {"found": False, "error": result.get("error")}
     
@@ -146,8 +189,10 @@ def get_nalog_director_limits(inn: str) -> Dict[str, Any]:
 
 def check_disqualified(fio: str) -> Dict[str, Any]:
     """Проверяет, дисквалифицировано ли лицо."""
-    result = _make_request("nalog_pb_api/", {"type": "TYPE_SEARCH_DIS", "fio": fio})
-    
+    return _parse_disqualified(_make_request("nalog_pb_api/", {"type": "TYPE_SEARCH_DIS", "fio": fio}))
+
+
+def _parse_disqualified(result: Dict[str, Any]) -> Dict[str, Any]:
     if result.get("success") != 1:
         return {"found": False, "items": []}
     
@@ -192,8 +237,10 @@ def get_arbitr_cases(inn: str) -> Dict[str, Any]:
     Поиск арбитражных дел по ИНН.
     Возвращает количество дел и краткую информацию.
     """
-    result = _make_request("arbitr_api/search", {"Inn": inn})
-    
+    return _parse_arbitr(_make_request("arbitr_api/search", {"Inn": inn}), inn)
+
+
+def _parse_arbitr(result: Dict[str, Any], inn: str) -> Dict[str, Any]:
     if result.get("Success") != 1:
         return {"found": False, "total": 0, "cases": [], "error": result.get("error")}
     
@@ -249,7 +296,7 @@ def format_arbitr_report(data: Dict[str, Any]) -> str:
     if bankruptcy > 0:
         emoji = "🔴"
         risk_note = " (БАНКРОТСТВО!)"
-    elif respondent > 3:
+    elif respondent > THRESHOLDS["arb_defendant_high"]:
         emoji = "🔴"
         risk_note = ""
     elif respondent > 0:
@@ -298,8 +345,51 @@ def check_company_extended(inn: str, director_name: str = None) -> Dict[str, Any
     return result
 
 
+async def check_company_extended_async(
+    inn: str, director_name: str = None, deadline: float = EXTENDED_DEADLINE
+) -> Dict[str, Any]:
+    """
+    Асинхронная полная проверка: все запросы к API-Assist идут параллельно
+    под одним общим дедлайном (а не 4 × 30 сек подряд).
+    
+    Returns:
+        Те же секции, что check_company_extended. Не уложившиеся в дедлайн
+        секции равны None и перечислены в "missing".
+    """
+    requests_by_section = {
+        "fssp": (_make_request_async("fssp_api/search_ur_by_inn", {"inn": inn}), _parse_fssp, ()),
+        "nalog_org": (_make_request_async("nalog_pb_api/", {"type": "TYPE_SEARCH_ORG", "inn": inn}), _parse_nalog_org, ()),
+        "arbitr": (_make_request_async("arbitr_api/search", {"Inn": inn}), _parse_arbitr, (inn,)),
+    }
+    if director_name and director_name != "Не указан":
+        requests_by_section["disqualified"] = (
+            _make_request_async("nalog_pb_api/", {"type": "TYPE_SEARCH_DIS", "fio": director_name}),
+            _parse_disqualified, (),
+        )
+    
+    tasks = {name: asyncio.ensure_future(coro) for name, (coro, _, _) in requests_by_section.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        # Дожидаемся завершения отменённых запросов, чтобы они не пережили проверку
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    result = {"fssp": None, "nalog_org": None, "arbitr": None, "disqualified": None, "missing": []}
+    for name, task in tasks.items():
+        if task not in done:
+            result["missing"].append(name)
+            continue
+        _, parser, args = requests_by_section[name]
+        result[name] = parser(task.result(), *args)
+    
+    if result["missing"]:
+        logging.warning(f"api_assist extended check for {inn}: deadline exceeded, missing {result['missing']}")
+    return result
+
+
 def format_extended_report(data: Dict[str, Any]) -> str:
-    """Форматирует полный расширенный отчет."""
+    """Форматирует полный расширенный отчет (с пометкой о секциях, не уложившихся в дедлайн)."""
     parts = []
     
     # ФССП
@@ -330,4 +420,9 @@ def format_extended_report(data: Dict[str, Any]) -> str:
         else:
             parts.append("\n👤 **Дисквалификация директора:** нет")
     
+    # Секции, которые не успели загрузиться
+    missing = [EXTENDED_SECTIONS.get(name, name) for name in data.get("missing", [])]
+    if missing:
+        parts.append(f"\n⏳ **Не успели загрузиться:** {', '.join(missing)}")
+    
     return "".join(parts)
@@ -0,0 +1,46 @@
+"""
+Размер PDF-отчёта в обычном и компактном режиме (pdf_generator.COMPACT_OUTPUT).
+
+Каждый режим собирается в отдельном процессе: шрифты и rl_config настраиваются
+один раз на процесс. Печатает общий размер и размер встроенных шрифтов.
+
+Запуск: python benchmarks/pdf_size.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RENDER_SNIPPET = """
+import json, re, sys
+sys.path.insert(0, "benchmarks")
+import pdf_generator
+from sample_data import sample_profile
+pdf_generator.COMPACT_OUTPUT = {compact}
+content = pdf_generator.generate_pdf_report({{}}, 0, profile=sample_profile())
+fonts = sum(int(m.group(1)) for m in re.finditer(rb"/Length (\\d+)[^>]*/Length1", content))
+print(json.dumps({{"total": len(content), "fonts": fonts}}))
+"""
+
+
+def measure(compact: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", RENDER_SNIPPET.format(compact=compact)], cwd=ROOT, check=True,
+        capture_output=True, text=True,
+    ).stdout
+    return json.loads(out)
+
+
+def main():
+    plain, compact = measure(False), measure(True)
+    print(f"{'':24}{'обычный':>12}{'компактный':>12}")
+    for key, title in (("total", "Отчёт, байт"), ("fonts", "Шрифты, байт")):
+        print(f"{title:24}{plain[key]:12,}{compact[key]:12,}")
+    print(f"Экономия: {1 - compact['total'] / plain['total']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк запуска и сборки PDF (pdf_generator).
+
+Показывает:
+- время импорта pdf_generator в новом процессе (шрифты теперь не регистрируются при импорте)
+  и сколько стоила бы прежняя регистрация шрифтов при импорте;
+- первый отчёт (регистрация шрифтов + реестр стилей) против последующих;
+- сколько занимала пересборка стилей на каждый отчёт.
+
+Запуск: python benchmarks/pdf_startup.py [повторов]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sample_data import sample_profile  # noqa: E402
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import pdf_generator
+imported = time.perf_counter()
+pdf_generator.ensure_fonts()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def measure_import(runs: int) -> tuple:
+    """Медианы (импорт, регистрация шрифтов) в новых процессах, мс."""
+    imports, fonts = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, check=True,
+            capture_output=True, text=True,
+        ).stdout.split()
+        imports.append(float(out[0]) * 1000)
+        fonts.append(float(out[1]) * 1000)
+    return statistics.median(imports), statistics.median(fonts)
+
+
+def measure_render(runs: int) -> dict:
+    """Первый и последующие отчёты, пересборка стилей, мс."""
+    import pdf_generator
+
+    profile = sample_profile()
+    started = time.perf_counter()
+    pdf_generator.generate_pdf_report({}, 0, profile=profile)
+    first = (time.perf_counter() - started) * 1000
+
+    warm = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        pdf_generator.generate_pdf_report({}, 0, profile=profile)
+        warm.append((time.perf_counter() - started) * 1000)
+
+    # Так раньше стоил каждый отчёт: стили собирались заново при каждом вызове
+    rebuild = []
+    for _ in range(runs):
+        pdf_generator._styles = None
+        started = time.perf_counter()
+        pdf_generator.get_styles()
+        rebuild.append((time.perf_counter() - started) * 1000)
+
+    return {"first": first, "warm": statistics.median(warm), "styles": statistics.median(rebuild)}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    import_ms, fonts_ms = measure_import(max(3, runs // 2))
+    render = measure_render(runs)
+
+    print(f"Импорт pdf_generator:             {import_ms:8.1f} мс")
+    print(f"Регистрация шрифтов (отложена):   {fonts_ms:8.1f} мс  — раньше входила в импорт")
+    print(f"Первый отчёт (шрифты + стили):    {render['first']:8.1f} мс")
+    print(f"Следующие отчёты (медиана):       {render['warm']:8.1f} мс")
+    print(f"Сборка стилей, сэкономлено/отчёт: {render['styles']:8.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
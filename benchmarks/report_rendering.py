@@ -0,0 +1,178 @@
+"""
+Бенчмарк отрисовки отчёта: текст для Telegram и PDF.
+
+Цели:
+- CompanyProfile.from_data — разбор сырых секций (на huge это основная часть пути);
+- format_company_report — отчёт ЗАЧЕСТНЫЙБИЗНЕС в чат (по CompanyProfile);
+- format_risk_report — отчёт risk_analyzer в чат (по ответу DaData);
+- generate_pdf_report — PDF по CompanyProfile.
+
+Фикстуры (sample_data.FIXTURES): small — ИП, typical — ООО, huge — 5 000
+арбитражных дел, 2 000 производств ФССП, 100 связей. Данные синтетические,
+сеть не нужна; PDF собирается в режиме invariant, поэтому размер воспроизводим.
+
+Для каждой пары «фикстура × цель»: время (лучший из --runs замеров, каждый —
+среднее по серии вызовов не короче MIN_SAMPLE_MS, как в timeit), пиковая память
+(tracemalloc, отдельный прогон — трассировка замедляет) и размер результата.
+
+Порог регрессии: --save-baseline сохраняет результаты в BASELINE_PATH
+(время зависит от машины, поэтому файл не коммитится), обычный запуск
+сравнивает с ним и завершается с кодом 1, если время, память или размер
+выросли больше чем на --threshold.
+
+Запуск: python benchmarks/report_rendering.py [--runs 5] [--fixtures small,huge] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sample_data import FIXTURES, sample_dadata, sample_data, sample_profile  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25   # Допустимый рост относительно базы
+MIN_TIME_DELTA_MS = 0.5    # Рост времени меньше этого — шум, не регрессия
+MIN_SAMPLE_MS = 50         # Минимальная длительность одного замера
+METRICS = ("time_ms", "peak_kb", "size")
+
+
+def _targets() -> dict:
+    """Цель -> (функция, какой вход нужен: data, profile или dadata)."""
+    from pdf_generator import generate_pdf_report
+    from risk_analyzer import format_risk_report
+    from zachestnyibiznes import CompanyProfile, format_company_report
+
+    return {
+        "CompanyProfile.from_data": (lambda data: CompanyProfile.from_data(data, fetched_at="2026-01-15T09:30:00"), "data"),
+        "format_company_report": (format_company_report, "profile"),
+        "format_risk_report": (format_risk_report, "dadata"),
+        "generate_pdf_report": (lambda profile: generate_pdf_report({}, 0, profile=profile), "profile"),
+    }
+
+
+def _size(result) -> int:
+    if isinstance(result, str):
+        return len(result.encode("utf-8"))
+    return len(result) if isinstance(result, bytes) else 0   # Профиль — без размера
+
+
+def _sample(func, arg, number: int) -> float:
+    """Среднее время одного вызова в серии из number вызовов, мс."""
+    started = time.perf_counter()
+    for _ in range(number):
+        func(arg)
+    return (time.perf_counter() - started) * 1000 / number
+
+
+def measure(func, arg, runs: int) -> dict:
+    """Время одного вызова (после прогрева), пик памяти и размер результата."""
+    func(arg)  # Прогрев: шрифты, стили, ленивые импорты
+
+    # Быстрые функции вызываются сериями, чтобы замер не тонул в шуме таймера
+    number = 1
+    while _sample(func, arg, number) * number < MIN_SAMPLE_MS and number < 100_000:
+        number *= 10
+    times = [_sample(func, arg, number) for _ in range(runs)]
+
+    tracemalloc.start()
+    result = func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time_ms": min(times), "peak_kb": peak / 1024, "size": _size(result)}
+
+
+def run_suite(fixtures: list, runs: int) -> dict:
+    """Результаты в виде {"фикстура/цель": {time_ms, peak_kb, size}}."""
+    from reportlab import rl_config
+    rl_config.invariant = 1  # Без даты создания и случайного ID — одинаковый PDF на одинаковых данных
+
+    targets = _targets()
+    results = {}
+    for fixture in fixtures:
+        params = FIXTURES[fixture]
+        inputs = {
+            "data": sample_data(**params),
+            "profile": sample_profile(**params),
+            "dadata": sample_dadata(**params),
+        }
+        for target, (func, source) in targets.items():
+            results[f"{fixture}/{target}"] = measure(func, inputs[source], runs)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Регрессии относительно базы: [(ключ, метрика, было, стало)]."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in METRICS:
+            old, new = base.get(metric), current[metric]
+            if not old or new <= old * (1 + threshold):
+                continue
+            if metric == "time_ms" and new - old < MIN_TIME_DELTA_MS:
+                continue
+            regressions.append((key, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отрисовки отчёта (Telegram и PDF)")
+    parser.add_argument("--runs", type=int, default=5, help="замеров времени на каждую пару")
+    parser.add_argument("--fixtures", default=",".join(FIXTURES), help="через запятую: " + ", ".join(FIXTURES))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="допустимый рост, доля")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="файл базовых результатов")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как базу")
+    args = parser.parse_args()
+
+    fixtures = [name.strip() for name in args.fixtures.split(",") if name.strip()]
+    unknown = [name for name in fixtures if name not in FIXTURES]
+    if unknown:
+        parser.error(f"неизвестные фикстуры: {', '.join(unknown)}")
+
+    results = run_suite(fixtures, max(1, args.runs))
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'Фикстура/цель':42}{'время, мс':>11}{'память, КБ':>12}{'размер, Б':>12}{'к базе':>10}")
+    for key, current in results.items():
+        delta = ""
+        base = baseline.get(key)
+        if base and base.get("time_ms"):
+            delta = f"{current['time_ms'] / base['time_ms'] - 1:+.0%}"
+        print(f"{key:42}{current['time_ms']:11.2f}{current['peak_kb']:12.0f}{current['size']:12,}{delta:>10}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nБаза сохранена: {args.baseline}")
+        return
+
+    if not baseline:
+        print("\nБазы нет — сохраните её ключом --save-baseline, чтобы проверять регрессии.")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"\nРегрессий нет (порог {args.threshold:.0%}).")
+        return
+
+    print(f"\nРегрессии (порог {args.threshold:.0%}):")
+    for key, metric, old, new in regressions:
+        print(f"  {key} {metric}: {old:,.2f} → {new:,.2f} ({new / old - 1:+.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Типовые данные для бенчмарков: ответ API ЗАЧЕСТНЫЙБИЗНЕС по крупной компании
+(много производств ФССП, арбитражных дел и связей) и собранный из него профиль,
+ответ DaData для risk_analyzer и фикстуры трёх размеров (FIXTURES).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_INN = "7707083893"
+SAMPLE_IP_INN = "500100732259"
+
+# Размеры фикстур: small — ИП, typical — обычное ООО, huge — предельный случай
+FIXTURES = {
+    "small": {"ip": True, "fssp_items": 2, "arbitration_cases": 1, "affiliates": 0},
+    "typical": {"fssp_items": 5, "arbitration_cases": 12, "affiliates": 5},
+    "huge": {"fssp_items": 2000, "arbitration_cases": 5000, "affiliates": 100},
+}
+
+IP_CARD = {
+    "ТипДокумента": "ip", "ФИО": "Петров Пётр Петрович",
+    "ИНИП": SAMPLE_IP_INN, "ОГРНИП": "304500116000157", "ДатаОГРНИП": "12.03.2004",
+    "СвСтатус": "Действующий", "Адрес": {"АдресПолн": "Московская обл., г. Балашиха"},
+    "КодОКВЭД": "47.91", "НаимОКВЭД": "Торговля розничная по почте или по информационно-коммуникационной сети Интернет",
+}
+
+
+def sample_data(fssp_items: int = 40, arbitration_cases: int = 60, affiliates: int = 15, ip: bool = False) -> dict:
+    """Сырые секции в формате multiple-methods (ip=True — карточка ИП без бухотчётности)."""
+    data = {
+        "card": {"status": "200", "body": {"docs": [{
+            "НаимЮЛСокр": "ООО «Пример Холдинг»",
+            "НаимЮЛПолн": "ОБЩЕСТВО С ОГРАНИЧЕННОЙ ОТВЕТСТВЕННОСТЬЮ «ПРИМЕР ХОЛДИНГ»",
+            "ИНН": SAMPLE_INN, "ОГРН": "1027700132195", "КПП": "773601001",
+            "Активность": "Действующая", "ДатаОГРН": "16.08.2002",
+            "Руководители": [{"fl": "Иванов Иван Иванович", "inn": "770000000001", "date": "2019-03-01"}],
+            "Адрес": {"АдресПолн": "117312, г. Москва, ул. Вавилова, д. 19, этаж 3, помещение 12"},
+            "КодОКВЭД": "64.19", "НаимОКВЭД": "Денежное посредничество прочее",
+            "УстКап": "67760844000", "ЧислСотруд": "1200",
+        }]}},
+        "fs-fns": {"status": "200", "body": {"Документ": {
+            "@attributes": {"ОтчетГод": "2024"},
+            "ФинРез": {
+                "Выруч": {"@attributes": {"СумОтч": "3500000", "СумПред": "3100000"}},
+                "ЧистПрибУб": {"@attributes": {"СумОтч": "420000", "СумПред": "380000"}},
+            },
+        }}},
+        "fssp-list": {"status": "200", "body": {"Записи": [
+            {"СодИП": f"Задолженность по платежам №{i}", "СуммаДолга": str(1000 + i * 137)}
+            for i in range(fssp_items)
+        ]}},
+        "rating": {"status": "200", "body": {"rating_category": "средний", "point": 3}},
+        "court-arbitration": {"status": "200", "body": {"Дела": [
+            {"НомерДела": f"А40-{1000 + i}/2024", "Роль": "Ответчик" if i % 3 else "Истец",
+             "Статус": "Рассмотрение дела завершено"}
+            for i in range(arbitration_cases)
+        ]}},
+        "affilation-company": {"status": "200", "body": {"docs": [
+            {"НаимЮЛСокр": f"ООО «Дочерняя компания {i}»", "ИНН": f"77{i:08d}", "Активность": "Действующая"}
+            for i in range(affiliates)
+        ]}},
+        "contacts": {"status": "200", "body": {
+            "ТелВсе": "+74955000000;+74955000001;+74955000002",
+            "EmailВсе": "info@example.ru;press@example.ru",
+            "СайтВсе": "example.ru",
+        }},
+    }
+    if ip:
+        data["card"] = {"status": "200", "body": {"docs": [IP_CARD]}}
+        data["fs-fns"] = {"status": "200", "body": {}}
+    return data
+
+
+def sample_profile(**kwargs):
+    """CompanyProfile для sample_data (время данных фиксировано — отчёты детерминированы)."""
+    from zachestnyibiznes import CompanyProfile
+    inn = SAMPLE_IP_INN if kwargs.get("ip") else SAMPLE_INN
+    return CompanyProfile.from_data(sample_data(**kwargs), inn, "2026-01-15T09:30:00")
+
+
+def sample_dadata(ip: bool = False, affiliates: int = 15, **_) -> dict:
+    """Ответ DaData (findById/party) для risk_analyzer; affiliates — число записей managers."""
+    if ip:
+        return {
+            "inn": SAMPLE_IP_INN, "ogrn": "304500116000157", "type": "INDIVIDUAL",
+            "name": {"full_with_opf": "Индивидуальный предприниматель Петров Пётр Петрович",
+                     "short_with_opf": "ИП Петров Пётр Петрович"},
+            "address": {"value": "Московская обл., г. Балашиха", "data": {"qc": "0"}},
+            "okved": "47.91",
+            "state": {"status": "ACTIVE", "registration_date": 1079049600000, "actuality_date": 1704067200000},
+        }
+    return {
+        "inn": SAMPLE_INN, "ogrn": "1027700132195", "kpp": "773601001", "type": "LEGAL",
+        "name": {"full_with_opf": "ОБЩЕСТВО С ОГРАНИЧЕННОЙ ОТВЕТСТВЕННОСТЬЮ «ПРИМЕР ХОЛДИНГ»",
+                 "short_with_opf": "ООО «Пример Холдинг»"},
+        "address": {"value": "117312, г. Москва, ул. Вавилова, д. 19", "data": {"qc": "0"}},
+        "management": {"name": "Иванов Иван Иванович", "post": "Генеральный директор"},
+        "managers": [
+            {"fio": {"surname": f"Фамилия{i}", "name": "Имя", "patronymic": "Отчество"},
+             "post": "Учредитель", "date": 1551398400000}
+            for i in range(affiliates)
+        ],
+        "okved": "64.19",
+        "capital": {"type": "УСТАВНЫЙ КАПИТАЛ", "value": 67760844000},
+        "finance": {"revenue": 3500000, "income": 3900000, "expense": 3480000, "profit": 420000, "year": 2024},
+        "state": {"status": "ACTIVE", "registration_date": 1029456000000, "actuality_date": 1704067200000},
+    }
@@ -0,0 +1,252 @@
+"""
+Массовая проверка контрагентов из файла (CSV / XLSX / TXT).
+
+ИНН читаются из файла потоково, проверяются с ограниченной параллельностью
+через тот же конвейер, что и одиночная проверка, а результат собирается
+в одну таблицу (CSV или XLSX).
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from database import get_api_usage
+from risk_engine import features_from_profile, score_batch
+from zachestnyibiznes import get_quick_company_data, has_risk_sections, CompanyProfile
+
+SUPPORTED_EXTENSIONS = (".csv", ".txt", ".xlsx")
+MAX_FILE_SIZE = 10 * 1024 * 1024   # 10 МБ
+MAX_INNS_PER_FILE = 1000
+BULK_CONCURRENCY = 5               # Одновременных запросов к API на одну загрузку
+PROGRESS_INTERVAL = 3              # Как часто обновлять сообщение о прогрессе, сек
+
+INN_PATTERN = re.compile(r"(?<!\d)(\d{12}|\d{10})(?!\d)")
+
+RESULT_COLUMNS = [
+    ("inn", "ИНН"),
+    ("name", "Наименование"),
+    ("status", "Статус"),
+    ("risk_level", "Уровень риска"),
+    ("fssp_sum", "Сумма ФССП, ₽"),
+    ("defendant_cases", "Дел в роли ответчика"),
+]
+RISK_LABELS = {"low": "Низкий", "medium": "Средний", "high": "Высокий"}
+
+
+# ============ Разбор файла ============
+
+def is_valid_inn(inn: str) -> bool:
+    """Проверяет контрольные цифры ИНН (10 — юрлицо, 12 — ИП/физлицо)."""
+    def checksum(digits: str, weights: list) -> int:
+        return sum(int(d) * w for d, w in zip(digits, weights)) % 11 % 10
+
+    if len(inn) == 10:
+        return checksum(inn, [2, 4, 10, 3, 5, 9, 4, 6, 8]) == int(inn[9])
+    if len(inn) == 12:
+        return (checksum(inn, [7, 2, 4, 10, 3, 5, 9, 4, 6, 8]) == int(inn[10])
+                and checksum(inn, [3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8]) == int(inn[11]))
+    return False
+
+
+def _detect_encoding(fileobj) -> str:
+    """UTF-8 или Windows-1251 (выгрузки из 1С и Excel)."""
+    head = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        decoder.decode(head)  # Неполный последний символ не считается ошибкой
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _iter_text_cells(fileobj) -> Iterator[str]:
+    """Строки текстового файла (CSV читается построчно, как текст)."""
+    text = io.TextIOWrapper(fileobj, encoding=_detect_encoding(fileobj), errors="replace", newline="")
+    try:
+        for line in text:
+            yield line
+    finally:
+        text.detach()  # Не закрываем исходный файл
+
+
+def _iter_xlsx_cells(fileobj) -> Iterator[str]:
+    """Ячейки XLSX построчно, в режиме read_only (лист не загружается целиком)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Для чтения XLSX на сервере не установлен openpyxl. Сохраните файл как CSV.")
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                for value in row:
+                    if value is None:
+                        continue
+                    if isinstance(value, float) and value.is_integer():
+                        value = int(value)  # Excel хранит ИНН числом: 7707083893.0
+                    yield str(value)
+    finally:
+        workbook.close()
+
+
+def iter_inns(fileobj, filename: str, limit: int = MAX_INNS_PER_FILE) -> Iterator[str]:
+    """
+    Потоково извлекает уникальные корректные ИНН из файла.
+    Номера телефонов, счетов и прочие числа отсекаются проверкой контрольных цифр.
+    """
+    if filename.lower().endswith(".xlsx"):
+        cells = _iter_xlsx_cells(fileobj)
+    else:
+        cells = _iter_text_cells(fileobj)
+
+    seen = set()
+    for cell in cells:
+        for inn in INN_PATTERN.findall(cell):
+            if inn in seen or not is_valid_inn(inn):
+                continue
+            seen.add(inn)
+            yield inn
+            if len(seen) >= limit:
+                return
+
+
+# ============ Проверка ============
+
+def get_quota_budget() -> Optional[int]:
+    """Сколько запросов к API можно потратить, не уходя ниже порога оповещения (None — без ограничения)."""
+    usage = get_api_usage()
+    if not usage:
+        return None
+    return max(0, usage["remaining"] - usage["alert_threshold"])
+
+
+async def check_inn_row(inn: str) -> Dict[str, Any]:
+    """
+    Проверяет одну компанию и возвращает строку итоговой таблицы.
+    Уровень риска не считается: признаки лежат в "_features" до общего пересчёта в run_bulk_check.
+    """
+    result = await get_quick_company_data(inn)
+    if not result.get("success"):
+        return {"inn": inn, "name": "", "status": "", "risk_level": "",
+                "fssp_sum": "", "defendant_cases": "", "error": result.get("error", "Ошибка")}
+
+    data = result.get("data", {})
+    profile = CompanyProfile.from_data(data, inn, score=False)
+    row = {
+        "inn": inn,
+        "name": profile.card.get("name") or profile.card.get("full_name", ""),
+        "status": profile.card.get("status", ""),
+        "risk_level": "",
+        "fssp_sum": round(profile.fssp["total_sum"], 2),
+        "defendant_cases": profile.arbitration["as_defendant"],
+        "error": "",
+    }
+    if has_risk_sections(data):
+        row["_features"] = features_from_profile(profile)   # Иначе риск не оценён
+    return row
+
+
+async def run_bulk_check(
+    inns: List[str],
+    on_progress: Callable[[int, int, int], Awaitable[None]] = None,
+    concurrency: int = BULK_CONCURRENCY,
+    can_check: Callable[[], bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Проверяет список ИНН с ограниченной параллельностью.
+
+    Args:
+        inns: ИНН для проверки
+        on_progress: корутина (готово, всего, ошибок), вызывается не чаще PROGRESS_INTERVAL
+        concurrency: сколько проверок идёт одновременно
+        can_check: вызывается перед каждой проверкой (лимит пользователя, квота API);
+                   False — ИНН пропускается с пометкой
+
+    Returns:
+        Строки результата в порядке исходного списка
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(inns)
+    state = {"done": 0, "errors": 0, "last_report": time.monotonic()}
+
+    async def worker(index: int, inn: str):
+        async with semaphore:
+            if can_check is not None and not can_check():
+                row = {"inn": inn, "name": "", "status": "", "risk_level": "",
+                       "fssp_sum": "", "defendant_cases": "", "error": "Не проверен: исчерпан лимит"}
+            else:
+                try:
+                    row = await check_inn_row(inn)
+                except Exception as e:
+                    row = {"inn": inn, "name": "", "status": "", "risk_level": "",
+                           "fssp_sum": "", "defendant_cases": "", "error": str(e)[:100]}
+        rows[index] = row
+        state["done"] += 1
+        if row["error"]:
+            state["errors"] += 1
+
+        now = time.monotonic()
+        if on_progress and now - state["last_report"] >= PROGRESS_INTERVAL:
+            state["last_report"] = now
+            try:
+                await on_progress(state["done"], len(inns), state["errors"])
+            except Exception:
+                pass  # Прогресс не должен ронять проверку
+
+    await asyncio.gather(*(worker(i, inn) for i, inn in enumerate(inns)))
+
+    # Уровни риска — одним векторным проходом по всей загрузке
+    scored = [row for row in rows if "_features" in row]
+    if scored:
+        levels = score_batch([row.pop("_features") for row in scored])
+        for row, level in zip(scored, levels):
+            row["risk_level"] = str(level)
+    return rows
+
+
+# ============ Итоговая таблица ============
+
+def _table_rows(rows: List[Dict[str, Any]]) -> Iterator[list]:
+    yield [title for _, title in RESULT_COLUMNS] + ["Ошибка"]
+    for row in rows:
+        values = [row.get(key, "") for key, _ in RESULT_COLUMNS]
+        values[3] = RISK_LABELS.get(row.get("risk_level"), row.get("risk_level", ""))
+        yield values + [row.get("error", "")]
+
+
+def build_result_csv(rows: List[Dict[str, Any]]) -> bytes:
+    """Таблица результатов в CSV (UTF-8 с BOM и «;» — открывается в Excel без настройки)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerows(_table_rows(rows))
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def build_result_xlsx(rows: List[Dict[str, Any]]) -> bytes:
+    """Таблица результатов в XLSX (write_only — строки не держатся в памяти листа)."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Проверка")
+    for values in _table_rows(rows):
+        sheet.append(values)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Сводка для итогового сообщения."""
+    summary = {"total": len(rows), "low": 0, "medium": 0, "high": 0, "errors": 0}
+    for row in rows:
+        if row.get("error"):
+            summary["errors"] += 1
+        elif row.get("risk_level") in summary:
+            summary[row["risk_level"]] += 1
+    return summary
@@ -0,0 +1,199 @@
+"""
+Очередь проверок перед конвейером ЗАЧЕСТНЫЙБИЗНЕС.
+
+- Фиксированный пул воркеров (WORKERS): одновременно выполняется не больше
+  WORKERS проверок, сколько бы ИНН ни прислали.
+- Полосы приоритета: admin → premium → free; внутри полосы — по очереди.
+- У пользователя не больше PER_USER_LIMIT проверок в очереди и в работе.
+- Позиция в очереди сообщается пользователю.
+- Метрики (глубина очереди, время ожидания по полосам) — в админ-статистике.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+WORKERS = 8               # Одновременных проверок
+PER_USER_LIMIT = 2        # Проверок одного пользователя в очереди и в работе
+WAIT_SAMPLES = 500        # Сколько последних ожиданий хранить для перцентилей
+
+LANES = ("admin", "premium", "free")
+_PRIORITY = {lane: i for i, lane in enumerate(LANES)}
+
+
+class UserBusyError(Exception):
+    """У пользователя уже PER_USER_LIMIT проверок в очереди или в работе."""
+
+    def __init__(self, user_id: int, limit: int):
+        self.user_id = user_id
+        self.limit = limit
+        super().__init__(f"User {user_id} already has {limit} checks in progress")
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    user_id: int = field(compare=False)
+    lane: str = field(compare=False)
+    run: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class CheckQueue:
+    """Приоритетная очередь проверок с пулом воркеров."""
+
+    def __init__(self, workers: int = WORKERS, per_user_limit: int = PER_USER_LIMIT):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._waiting: Dict[int, _Job] = {}      # seq -> задание в очереди
+        self._per_user: Dict[int, int] = {}      # user_id -> в очереди + в работе
+        self._busy = 0
+        self._waits = {lane: deque(maxlen=WAIT_SAMPLES) for lane in LANES}
+        self.stats = {
+            "submitted": {lane: 0 for lane in LANES},
+            "completed": {lane: 0 for lane in LANES},
+            "rejected": 0,       # Отказов из-за лимита на пользователя
+            "failed": 0,
+            "peak_depth": 0,
+        }
+
+    # ---------- Жизненный цикл ----------
+
+    def start(self):
+        """Запускает воркеров (внутри работающего event loop)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Останавливает воркеров; задания в очереди отменяются."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._waiting.values():
+            job.future.cancel()
+        self._waiting.clear()
+
+    # ---------- Постановка в очередь ----------
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def idle_workers(self) -> int:
+        return max(0, self.workers - self._busy - self.depth)
+
+    def submit(self, user_id: int, lane: str, run: Callable[[], Awaitable[Any]]) -> _Job:
+        """
+        Ставит проверку в очередь. run — фабрика корутины проверки.
+        Бросает UserBusyError, если у пользователя уже PER_USER_LIMIT проверок.
+        """
+        if self._queue is None:
+            self.start()
+        if self._per_user.get(user_id, 0) >= self.per_user_limit:
+            self.stats["rejected"] += 1
+            raise UserBusyError(user_id, self.per_user_limit)
+
+        job = _Job(
+            priority=_PRIORITY.get(lane, _PRIORITY["free"]),
+            seq=next(self._seq),
+            user_id=user_id,
+            lane=lane if lane in _PRIORITY else "free",
+            run=run,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=time.monotonic(),
+        )
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self._waiting[job.seq] = job
+        self.stats["submitted"][job.lane] += 1
+        self.stats["peak_depth"] = max(self.stats["peak_depth"], self.depth)
+        self._queue.put_nowait(job)
+        return job
+
+    def position(self, job: _Job) -> int:
+        """Сколько заданий в очереди будут выполнены раньше этого (0 — следующее)."""
+        if job.seq not in self._waiting:
+            return 0
+        return sum(1 for other in self._waiting.values() if other < job)
+
+    def will_wait(self, job: _Job) -> bool:
+        """Задание не начнётся сразу: все воркеры заняты."""
+        return job.seq in self._waiting and self._busy + self.position(job) >= self.workers
+
+    # ---------- Воркеры ----------
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._waiting.pop(job.seq, None)
+            if job.future.cancelled():
+                self._release(job)
+                continue
+
+            self._waits[job.lane].append(time.monotonic() - job.enqueued_at)
+            self._busy += 1
+            try:
+                result = await job.run()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"Queued check failed for user {job.user_id}: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._busy -= 1
+                self.stats["completed"][job.lane] += 1
+                self._release(job)
+
+    def _release(self, job: _Job):
+        left = self._per_user.get(job.user_id, 1) - 1
+        if left > 0:
+            self._per_user[job.user_id] = left
+        else:
+            self._per_user.pop(job.user_id, None)
+
+    # ---------- Метрики ----------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Снимок для админ-статистики: глубина, загрузка воркеров, ожидание по полосам."""
+        waits = {}
+        for lane, samples in self._waits.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            waits[lane] = {
+                "avg": sum(ordered) / len(ordered),
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max": ordered[-1],
+            }
+        return {
+            "depth": self.depth,
+            "peak_depth": self.stats["peak_depth"],
+            "busy": self._busy,
+            "workers": self.workers,
+            "submitted": dict(self.stats["submitted"]),
+            "completed": dict(self.stats["completed"]),
+            "rejected": self.stats["rejected"],
+            "failed": self.stats["failed"],
+            "waits": waits,
+        }
+
+
+check_queue = CheckQueue()
@@ -1,5 +1,6 @@
 import sqlite3
 import os
+import json
 from datetime import datetime, timedelta
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "bot.db")
@@ -114,6 +115,82 @@ def init_db():
                 FOREIGN KEY (user_id) REFERENCES users(user_id)
             )
         """)
+        
+        # Посуточный учёт запросов к API (по провайдеру и методу)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_usage_daily (
+                day TEXT,
+                service_name TEXT,
+                method TEXT,
+                used_count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, service_name, method)
+            )
+        """)
+        
+        # Отслеживание изменений компаний
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS watches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                inn TEXT,
+                company_name TEXT,
+                added_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, inn),
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_watches_inn ON watches(inn)")
+        
+        # Последний известный снимок отслеживаемых полей компании (один на ИНН)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS company_snapshots (
+                inn TEXT PRIMARY KEY,
+                snapshot TEXT,
+                updated_at TEXT
+            )
+        """)
+        
+        # Кеш готовых PDF-отчётов (по хешу входных данных) и file_id загруженного в Telegram файла
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pdf_cache (
+                digest TEXT PRIMARY KEY,
+                inn TEXT,
+                content BLOB,
+                file_id TEXT,
+                created_at TEXT,
+                last_used_at TEXT
+            )
+        """)
+        
+        # Персональные копии отчётов (с отметкой выдачи): номер экземпляра и file_id
+        # по отчёту и пользователю. В PDF печатается только номер, не user_id
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pdf_issued (
+                digest TEXT,
+                user_id INTEGER,
+                file_id TEXT,
+                issued_at TEXT,
+                issue_no TEXT,
+                size INTEGER,
+                PRIMARY KEY (digest, user_id)
+            )
+        """)
+        for column in ("issue_no TEXT", "size INTEGER"):
+            try:
+                cursor.execute(f"ALTER TABLE pdf_issued ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        
+        # Кеш ответов API ЗАЧЕСТНЫЙБИЗНЕС (по ИНН и методу)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_cache (
+                inn TEXT,
+                method TEXT,
+                payload TEXT,
+                fetched_at TEXT,
+                PRIMARY KEY (inn, method)
+            )
+        """)
         conn.commit()
 
 
@@ -124,6 +201,18 @@ def is_admin(username: str) -> bool:
     return username.lower() in [u.lower() for u in ADMIN_USERNAMES]
 
 
+def get_admin_user_ids() -> list:
+    """Возвращает user_id администраторов, которые уже писали боту."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        placeholders = ",".join("?" * len(ADMIN_USERNAMES))
+        cursor.execute(
+            f"SELECT user_id FROM users WHERE LOWER(username) IN ({placeholders})",
+            [u.lower() for u in ADMIN_USERNAMES]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
 def get_or_create_user(user_id: int, username: str = None, first_name: str = None):
     """Возвращает информацию о пользователе или создает нового."""
     with sqlite3.connect(DB_PATH) as conn:
@@ -180,6 +269,29 @@ def add_check_history(user_id: int, inn: str, company_name: str, risk_level: str
         conn.commit()
 
 
+def get_history_inns() -> list:
+    """Все ИНН из истории проверок (для пересчёта уровня риска)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT inn FROM check_history WHERE inn IS NOT NULL AND inn != ''")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def update_history_risk_levels(levels: dict) -> int:
+    """Обновляет risk_level в истории по ИНН. Возвращает число изменённых записей."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        changed = 0
+        for inn, level in levels.items():
+            cursor.execute(
+                "UPDATE check_history SET risk_level = ? WHERE inn = ? AND (risk_level IS NULL OR risk_level != ?)",
+                (level, inn, level)
+            )
+            changed += cursor.rowcount
+        conn.commit()
+        return changed
+
+
 def get_check_history(user_id: int, limit: int = 10):
     """Получает историю проверок пользователя."""
     with sqlite3.connect(DB_PATH) as conn:
@@ -413,6 +525,34 @@ def reset_api_usage(service_name: str = "zachestnyibiznes", new_limit: int = Non
         conn.commit()
 
 
+def add_daily_api_usage(service_name: str, method_counts: dict, day: str = None):
+    """Добавляет запросы к посуточной статистике по методам."""
+    day = day or datetime.now().strftime("%Y-%m-%d")
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """INSERT INTO api_usage_daily (day, service_name, method, used_count)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(day, service_name, method)
+               DO UPDATE SET used_count = used_count + excluded.used_count""",
+            [(day, service_name, method, count) for method, count in method_counts.items()]
+        )
+        conn.commit()
+
+
+def get_daily_api_usage(service_name: str, day: str = None) -> dict:
+    """Возвращает запросы за день по методам: {method: count}."""
+    day = day or datetime.now().strftime("%Y-%m-%d")
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT method, used_count FROM api_usage_daily
+               WHERE day = ? AND service_name = ?""",
+            (day, service_name)
+        )
+        return dict(cursor.fetchall())
+
+
 def set_api_limit(service_name: str, total_limit: int, alert_threshold: int = 5000):
     """Устанавливает лимит и порог оповещения для API."""
     with sqlite3.connect(DB_PATH) as conn:
@@ -554,3 +694,245 @@ def is_favorite(user_id: int, inn: str) -> bool:
             (user_id, inn)
         )
         return cursor.fetchone() is not None
+
+
+def get_favorite_inns() -> list:
+    """ИНН из избранного всех пользователей без повторов (сначала самые популярные)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT inn FROM favorites
+               GROUP BY inn
+               ORDER BY COUNT(*) DESC, MAX(added_at) DESC"""
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+
+# === Функции для отслеживания изменений ===
+
+def add_watch(user_id: int, inn: str, company_name: str) -> bool:
+    """Подписывает пользователя на изменения компании."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """INSERT INTO watches (user_id, inn, company_name) VALUES (?, ?, ?)""",
+                (user_id, inn, company_name)
+            )
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            return False  # Уже отслеживается
+
+
+def remove_watch(user_id: int, inn: str) -> bool:
+    """Отписывает пользователя от изменений компании."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """DELETE FROM watches WHERE user_id = ? AND inn = ?""",
+            (user_id, inn)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def get_user_watches(user_id: int, limit: int = 20) -> list:
+    """Компании, которые отслеживает пользователь."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT inn, company_name, added_at
+               FROM watches
+               WHERE user_id = ?
+               ORDER BY added_at DESC
+               LIMIT ?""",
+            (user_id, limit)
+        )
+        return cursor.fetchall()
+
+
+def get_watchers_by_inn() -> dict:
+    """Все подписки, сгруппированные по ИНН: {inn: [user_id, ...]} (заблокировавшие бота не включаются)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT w.inn, w.user_id
+               FROM watches w
+               LEFT JOIN users u ON u.user_id = w.user_id
+               WHERE COALESCE(u.is_blocked, 0) = 0
+               ORDER BY w.inn"""
+        )
+        watchers = {}
+        for inn, user_id in cursor.fetchall():
+            watchers.setdefault(inn, []).append(user_id)
+        return watchers
+
+
+def get_snapshot(inn: str) -> dict:
+    """Последний сохранённый снимок компании (None, если его ещё нет)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT snapshot FROM company_snapshots WHERE inn = ?", (inn,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except (TypeError, ValueError):
+            return None
+
+
+def save_snapshot(inn: str, snapshot: dict):
+    """Сохраняет снимок компании (перезаписывая прежний)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT OR REPLACE INTO company_snapshots (inn, snapshot, updated_at)
+               VALUES (?, ?, ?)""",
+            (inn, json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")), datetime.now().isoformat())
+        )
+        conn.commit()
+
+
+# === Кеш ответов API ===
+
+def get_cached_sections(inn: str) -> dict:
+    """Возвращает закешированные секции компании: {method: {"data": ..., "fetched_at": iso}}."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT method, payload, fetched_at FROM api_cache WHERE inn = ?",
+            (inn,)
+        )
+        sections = {}
+        for method, payload, fetched_at in cursor.fetchall():
+            try:
+                sections[method] = {"data": json.loads(payload), "fetched_at": fetched_at}
+            except (TypeError, ValueError):
+                continue  # Битая запись — считаем, что её нет
+        return sections
+
+
+def get_cached_times(inn: str) -> dict:
+    """Время загрузки закешированных секций компании (без разбора данных): {method: fetched_at}."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT method, fetched_at FROM api_cache WHERE inn = ?", (inn,))
+        return dict(cursor.fetchall())
+
+
+def save_cached_sections(inn: str, sections: dict, fetched_at: str = None):
+    """Сохраняет секции ответа API в кеш (перезаписывая старые)."""
+    fetched_at = fetched_at or datetime.now().isoformat()
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """INSERT OR REPLACE INTO api_cache (inn, method, payload, fetched_at)
+               VALUES (?, ?, ?, ?)""",
+            [(inn, method, json.dumps(data, ensure_ascii=False), fetched_at)
+             for method, data in sections.items()]
+        )
+        conn.commit()
+
+
+def prune_api_cache(max_age: timedelta) -> int:
+    """Удаляет секции, загруженные раньше max_age назад. Возвращает число удалённых строк."""
+    cutoff = (datetime.now() - max_age).isoformat()
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM api_cache WHERE fetched_at < ?", (cutoff,))
+        conn.commit()
+        return cursor.rowcount
+
+
+# === Кеш PDF-отчётов ===
+
+def get_pdf_cache(digest: str) -> dict:
+    """Готовый отчёт по хешу: {"content": bytes, "file_id": str|None} или None."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT content, file_id FROM pdf_cache WHERE digest = ?", (digest,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute(
+            "UPDATE pdf_cache SET last_used_at = ? WHERE digest = ?",
+            (datetime.now().isoformat(), digest)
+        )
+        conn.commit()
+        return {"content": row[0], "file_id": row[1]}
+
+
+def save_pdf_cache(digest: str, inn: str, content: bytes):
+    """Сохраняет отчёт (file_id появится после первой отправки)."""
+    now = datetime.now().isoformat()
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT OR REPLACE INTO pdf_cache (digest, inn, content, file_id, created_at, last_used_at)
+               VALUES (?, ?, ?, NULL, ?, ?)""",
+            (digest, inn, content, now, now)
+        )
+        conn.commit()
+
+
+def set_pdf_file_id(digest: str, file_id: str = None):
+    """Запоминает file_id отправленного отчёта (None — сбросить недействительный)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE pdf_cache SET file_id = ? WHERE digest = ?", (file_id, digest))
+        conn.commit()
+
+
+def get_issued_copy(digest: str, user_id: int) -> dict:
+    """Персональная копия отчёта, выданная пользователю: {"issue_no", "file_id", "size"} или None."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT issue_no, file_id, size FROM pdf_issued WHERE digest = ? AND user_id = ?",
+            (digest, user_id)
+        )
+        row = cursor.fetchone()
+        if not row or not row[0]:
+            return None   # Записи до номеров экземпляров — как будто копии не было
+        return {"issue_no": row[0], "file_id": row[1], "size": row[2] or 0}
+
+
+def save_issued_copy(digest: str, user_id: int, issue_no: str, file_id: str, size: int):
+    """Запоминает выданную копию: номер экземпляра, file_id и размер файла."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT OR REPLACE INTO pdf_issued (digest, user_id, file_id, issued_at, issue_no, size)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (digest, user_id, file_id, datetime.now().isoformat(), issue_no, size)
+        )
+        conn.commit()
+
+
+def set_issued_file_id(digest: str, user_id: int, file_id: str = None):
+    """Обновляет file_id копии (None — сбросить недействительный; номер экземпляра остаётся)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE pdf_issued SET file_id = ? WHERE digest = ? AND user_id = ?",
+            (file_id, digest, user_id)
+        )
+        conn.commit()
+
+
+def prune_pdf_cache(max_age_days: int) -> int:
+    """
+    Удаляет отчёты, которые не запрашивали дольше max_age_days, вместе с их
+    персональными копиями. Возвращает число удалённых отчётов.
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM pdf_cache WHERE last_used_at < ?", (cutoff,))
+        removed = cursor.rowcount
+        cursor.execute("DELETE FROM pdf_issued WHERE digest NOT IN (SELECT digest FROM pdf_cache)")
+        conn.commit()
+        return removed
@@ -0,0 +1,165 @@
+"""
+Фоновое обновление избранных компаний.
+
+Раз в сутки, в ночное окно (FAVORITES_REFRESH_HOURS, по умолчанию 2–6 ч),
+бот обновляет кеш по всем ИНН из избранного — без повторов, даже если
+компанию добавили многие пользователи. Обновляются только секции, которые
+устарели или устареют в ближайшие REFRESH_AHEAD, поэтому днём ФССП, суды,
+финансы, связи и контакты избранной компании отдаются из кеша.
+
+Секции с TTL не длиннее REFRESH_AHEAD (карточка и рейтинг, 6 ч) ночью
+не обновляются: к рабочему дню они всё равно устареют, и ночной запрос
+был бы лишней тратой квоты. Их дозапрашивает сама дневная проверка.
+
+Расход ограничен бюджетом на прогон (FAVORITES_REFRESH_BUDGET, единиц квоты)
+и долей остатка дневного лимита провайдера — пользовательским проверкам
+всегда остаётся запас.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import rate_limiter
+from database import get_favorite_inns, get_cached_sections
+from zachestnyibiznes import (
+    CACHE_TTL, DEFAULT_CACHE_TTL, DEFAULT_METHODS, QUOTA_EXCEEDED_MESSAGE,
+    split_methods, plan_refresh, refresh_cached_sections
+)
+
+PROVIDER = "zachestnyibiznes"
+
+DEFAULT_WINDOW = "2-6"       # Часы ночного окна: с 2:00 до 6:00
+DEFAULT_BUDGET = 300         # Единиц квоты (методов) на один прогон
+DAILY_CAP_SHARE = 0.5        # Не больше этой доли остатка дневного лимита
+REFRESH_AHEAD = timedelta(hours=12)   # Обновляем то, что устареет до конца рабочего дня
+REFRESH_BATCH = 10           # ИНН, обновляемых одновременно
+CHECK_INTERVAL = 600         # Как часто проверять, не наступило ли окно, сек
+MIN_RUN_GAP = timedelta(hours=12)     # Не чаще одного прогона за ночь
+
+# Итоги последнего прогона для админ-статистики
+refresh_stats = {
+    "last_run": None,     # datetime окончания
+    "inns": 0,            # ИНН в избранном
+    "refreshed": 0,       # Компаний обновлено
+    "methods": 0,         # Потрачено единиц квоты
+    "up_to_date": 0,      # Уже были свежими
+    "deferred": 0,        # Не хватило бюджета — до следующей ночи
+    "errors": 0,
+}
+
+
+def get_window() -> Tuple[int, int]:
+    """Ночное окно (час начала, час конца) из FAVORITES_REFRESH_HOURS."""
+    value = os.getenv("FAVORITES_REFRESH_HOURS", DEFAULT_WINDOW)
+    try:
+        start, end = (int(part) % 24 for part in value.split("-"))
+        return start, end
+    except ValueError:
+        logging.warning(f"Invalid FAVORITES_REFRESH_HOURS: {value!r}")
+        start, end = DEFAULT_WINDOW.split("-")
+        return int(start), int(end)
+
+
+def in_window(now: datetime = None) -> bool:
+    """Попадает ли время в ночное окно (окно может переходить через полночь)."""
+    hour = (now or datetime.now()).hour
+    start, end = get_window()
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def refresh_methods() -> list:
+    """Методы, которые имеет смысл обновлять ночью: их TTL длиннее REFRESH_AHEAD."""
+    return [
+        m for m in split_methods(DEFAULT_METHODS)
+        if CACHE_TTL.get(m, DEFAULT_CACHE_TTL) > REFRESH_AHEAD
+    ]
+
+
+def get_budget() -> int:
+    """Бюджет прогона: FAVORITES_REFRESH_BUDGET, но не больше доли остатка дневного лимита."""
+    try:
+        budget = int(os.getenv("FAVORITES_REFRESH_BUDGET", DEFAULT_BUDGET))
+    except ValueError:
+        budget = DEFAULT_BUDGET
+    cap = rate_limiter.get_daily_cap(PROVIDER)
+    if cap is not None:
+        budget = min(budget, int((cap - rate_limiter.daily_used(PROVIDER)) * DAILY_CAP_SHARE))
+    return max(0, budget)
+
+
+async def refresh_favorites(budget: Optional[int] = None) -> Dict[str, int]:
+    """
+    Один прогон: обновляет устаревшие секции избранных компаний в пределах бюджета.
+    Популярные ИНН (в избранном у большего числа пользователей) обновляются первыми.
+    """
+    budget = get_budget() if budget is None else budget
+    method_list = refresh_methods()
+    stats = {"inns": 0, "refreshed": 0, "methods": 0, "up_to_date": 0, "deferred": 0, "errors": 0}
+
+    inns = get_favorite_inns()
+    stats["inns"] = len(inns)
+    ahead = datetime.now() + REFRESH_AHEAD
+
+    quota_exhausted = False
+    for start in range(0, len(inns), REFRESH_BATCH):
+        batch = inns[start:start + REFRESH_BATCH]
+        if quota_exhausted:
+            stats["deferred"] += len(batch)
+            continue
+
+        planned = []
+        for inn in batch:
+            stale = plan_refresh(method_list, get_cached_sections(inn), ahead)
+            if not stale:
+                stats["up_to_date"] += 1
+            elif len(stale) > budget:
+                stats["deferred"] += 1
+            else:
+                budget -= len(stale)
+                planned.append((inn, stale))
+        if not planned:
+            continue
+
+        results = await asyncio.gather(
+            *(refresh_cached_sections(inn, stale) for inn, stale in planned),
+            return_exceptions=True,
+        )
+        for (inn, stale), result in zip(planned, results):
+            if isinstance(result, Exception):
+                logging.error(f"Favorites refresh failed for {inn}: {result}")
+                stats["errors"] += 1
+                continue
+            if not result.get("success"):
+                stats["errors"] += 1
+                if result.get("error") == QUOTA_EXCEEDED_MESSAGE:
+                    quota_exhausted = True
+                continue
+            stats["methods"] += len(stale)
+            if result["refreshed"]:
+                stats["refreshed"] += 1
+            if result["errors"]:
+                stats["errors"] += 1
+
+    logging.info(f"Favorites refresh: {stats}")
+    return stats
+
+
+async def run_refresher():
+    """Фоновая задача бота: раз за ночь запускает refresh_favorites в ночном окне."""
+    while True:
+        try:
+            now = datetime.now()
+            last_run = refresh_stats["last_run"]
+            if in_window(now) and (last_run is None or now - last_run >= MIN_RUN_GAP):
+                stats = await refresh_favorites()
+                refresh_stats.update(stats, last_run=datetime.now())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Favorites refresher error: {e}")
+        await asyncio.sleep(CHECK_INTERVAL)
@@ -0,0 +1,49 @@
+"""
+Общая асинхронная HTTP-сессия для внешних API.
+
+Одна aiohttp.ClientSession на процесс: keep-alive соединения переиспользуются
+между запросами, число одновременных соединений ограничено (в т.ч. на один хост),
+а у каждого запроса есть общий дедлайн.
+"""
+
+import aiohttp
+from typing import Optional
+
+# Пул соединений
+MAX_CONNECTIONS = 100          # Всего одновременных соединений
+MAX_CONNECTIONS_PER_HOST = 20  # На один хост API
+KEEPALIVE_TIMEOUT = 30         # Сколько держать простаивающее соединение, сек
+DNS_CACHE_TTL = 300
+
+# Таймауты по умолчанию, сек
+CONNECT_TIMEOUT = 5
+REQUEST_TIMEOUT = 30
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def make_timeout(total: float = REQUEST_TIMEOUT) -> aiohttp.ClientTimeout:
+    """Дедлайн на весь запрос (соединение + ответ) и отдельный лимит на подключение."""
+    return aiohttp.ClientTimeout(total=total, sock_connect=min(CONNECT_TIMEOUT, total))
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую сессию (создаётся лениво внутри запущенного event loop)."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONNECTIONS,
+            limit_per_host=MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=make_timeout())
+    return _session
+
+
+async def close_session():
+    """Закрывает общую сессию (вызывается при остановке бота)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
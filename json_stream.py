@@ -0,0 +1,191 @@
+"""
+Потоковый разбор больших JSON-ответов API.
+
+У крупных компаний court-arbitration возвращает тысячи «Дела», а fssp-list —
+тысячи «Записи», хотя отчёту нужны только счётчики, суммы и первые несколько
+элементов. Ответ разбирается по мере получения байтов (ijson): длинные списки
+сворачиваются в первые PREVIEW_ITEMS элементов и сводку «_summary», поэтому
+пиковая память на проверку не зависит от размера ответа.
+
+Без ijson ответ читается целиком, но сворачивается так же — формат данных
+для парсеров и кеша одинаковый.
+"""
+
+from typing import Any, Dict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CHUNK_SIZE = 64 * 1024
+PREVIEW_ITEMS = 5   # Сколько элементов длинного списка сохраняется для отчёта
+
+SUMMARY_KEY = "_summary"
+
+
+class _ListReducer:
+    """Сворачивает список: считает элементы, копит сводку, хранит первые PREVIEW_ITEMS."""
+
+    def __init__(self):
+        self.items = []
+        self.count = 0
+
+    def add(self, item: Any):
+        self.count += 1
+        if isinstance(item, dict):
+            self.aggregate(item)
+        if len(self.items) < PREVIEW_ITEMS:
+            self.items.append(item)
+
+    def aggregate(self, item: dict):
+        pass
+
+    def summary(self) -> Dict[str, Any]:
+        return {"count": self.count}
+
+
+class _FsspReducer(_ListReducer):
+    """Исполнительные производства (fssp-list → Записи)."""
+
+    def __init__(self):
+        super().__init__()
+        self.total_sum = 0.0
+
+    def aggregate(self, item: dict):
+        try:
+            self.total_sum += float(item.get("СуммаДолга", 0) or 0)
+        except (TypeError, ValueError):
+            pass
+
+    def summary(self) -> Dict[str, Any]:
+        return {"count": self.count, "total_sum": self.total_sum}
+
+
+class _ArbitrationReducer(_ListReducer):
+    """Арбитражные дела (court-arbitration → Дела)."""
+
+    def __init__(self):
+        super().__init__()
+        self.as_plaintiff = 0
+        self.as_defendant = 0
+
+    def aggregate(self, item: dict):
+        role = item.get("Роль")
+        if role == "Истец":
+            self.as_plaintiff += 1
+        elif role == "Ответчик":
+            self.as_defendant += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {"count": self.count, "as_plaintiff": self.as_plaintiff, "as_defendant": self.as_defendant}
+
+
+# Ключ списка -> его свёртка. Эти ключи встречаются только в своих секциях.
+REDUCERS = {
+    "Записи": _FsspReducer,
+    "Дела": _ArbitrationReducer,
+}
+
+
+class _TreeBuilder:
+    """Собирает дерево из событий ijson, сворачивая списки из REDUCERS на лету."""
+
+    def __init__(self):
+        self.root = None
+        self._stack = []   # Открытые контейнеры: dict, list или _ListReducer
+        self._keys = []    # Текущий ключ для каждого открытого dict (None для списков)
+        self._owners = []  # Для _ListReducer: (dict-родитель, ключ списка)
+
+    def _attach(self, value: Any):
+        if not self._stack:
+            self.root = value
+            return
+        top = self._stack[-1]
+        if isinstance(top, dict):
+            top[self._keys[-1]] = value
+        elif isinstance(top, list):
+            top.append(value)
+        # В _ListReducer элемент добавляется, когда он собран полностью (см. _close)
+
+    def _open(self, container):
+        self._attach(container)
+        self._stack.append(container)
+        self._keys.append(None)
+
+    def _close(self):
+        value = self._stack.pop()
+        self._keys.pop()
+        if isinstance(value, _ListReducer):
+            parent, key = self._owners.pop()
+            parent[key] = value.items
+            parent[SUMMARY_KEY] = value.summary()
+            value = value.items
+        if self._stack and isinstance(self._stack[-1], _ListReducer):
+            self._stack[-1].add(value)
+
+    def event(self, event: str, value: Any):
+        if event == "map_key":
+            self._keys[-1] = value
+        elif event == "start_map":
+            self._open({})
+        elif event == "start_array":
+            top = self._stack[-1] if self._stack else None
+            reducer = REDUCERS.get(self._keys[-1]) if isinstance(top, dict) else None
+            if reducer is not None:
+                self._owners.append((top, self._keys[-1]))
+                top[self._keys[-1]] = []
+                self._stack.append(reducer())
+                self._keys.append(None)
+            else:
+                self._open([])
+        elif event in ("end_map", "end_array"):
+            self._close()
+        else:
+            # Скаляр: string, number, boolean, null
+            if self._stack and isinstance(self._stack[-1], _ListReducer):
+                self._stack[-1].add(value)
+            else:
+                self._attach(value)
+
+
+def compact(data: Any) -> Any:
+    """Сворачивает длинные списки в уже разобранном дереве (путь без ijson)."""
+    if isinstance(data, list):
+        return [compact(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        reducer = REDUCERS.get(key)
+        if reducer is not None and isinstance(value, list) and SUMMARY_KEY not in data:
+            folded = reducer()
+            for item in value:
+                folded.add(item)
+            result[key] = folded.items
+            result[SUMMARY_KEY] = folded.summary()
+        else:
+            result[key] = compact(value)
+    return result
+
+
+async def read_json(response) -> Any:
+    """
+    Читает JSON из aiohttp-ответа со свёрткой длинных списков.
+    С ijson — потоково, по CHUNK_SIZE байт; без него — целиком через response.json().
+    """
+    if ijson is None:
+        return compact(await response.json(content_type=None))
+
+    builder = _TreeBuilder()
+    events = ijson.sendable_list()
+    parser = ijson.basic_parse_coro(events, use_float=True)
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        parser.send(chunk)
+        for event, value in events:
+            builder.event(event, value)
+        del events[:]
+    parser.close()
+    for event, value in events:
+        builder.event(event, value)
+    return builder.root
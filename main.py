@@ -2,12 +2,15 @@ import asyncio
 import logging
 import os
 import json
+import tempfile
+import time
 from datetime import datetime, timedelta
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile, ReplyKeyboardMarkup, KeyboardButton
 from dotenv import load_dotenv
 from dadata import Dadata
 from database import (
@@ -16,14 +19,32 @@ from database import (
     update_last_activity, get_all_active_users, get_clients_stats,
     mark_user_blocked, log_broadcast, increment_api_usage, get_api_usage,
     reset_api_usage, ADMIN_USERNAMES, save_payment, update_payment_status,
-    get_payment_by_id, set_premium, add_favorite, remove_favorite, get_favorites, is_favorite
+    get_payment_by_id, set_premium, add_favorite, remove_favorite, get_favorites, is_favorite,
+    get_admin_user_ids, add_watch, remove_watch, get_user_watches, get_snapshot, save_snapshot,
+    prune_api_cache, prune_pdf_cache
 )
 from risk_analyzer import format_risk_report, analyze_risks
 from affiliates import find_affiliated_companies, format_affiliates_report
-from pdf_generator import generate_pdf_report
+from pdf_cache import send_report, pdf_cache_stats, PDF_STAMP, PDF_CACHE_DAYS
+from pdf_pool import start_pool, shutdown_pool, get_pdf_metrics, PdfTimeoutError
 from api_assist import check_company_extended, format_extended_report
-from zachestnyibiznes import get_company_data, format_company_report, parse_card, parse_fssp, parse_arbitration, parse_affiliates, parse_finances, parse_contacts
+from zachestnyibiznes import (
+    QUICK_METHODS, API_CACHE_MAX_AGE, split_methods, iter_quick_sections, load_heavy_sections, cache_stats, coalesce_stats, lazy_stats,
+    CompanyProfile, format_company_report, format_related_sections, report_fetched_at
+)
 from payment import create_payment, check_payment_status, get_tariff_days, TARIFFS
+from http_client import close_session
+from bulk_check import (
+    SUPPORTED_EXTENSIONS, MAX_FILE_SIZE, iter_inns, get_quota_budget, run_bulk_check,
+    build_result_csv, build_result_xlsx, summarize
+)
+from resilience import get_breakers_status
+from rate_limiter import set_alert_handler, flush_usage, get_usage_snapshot
+from risk_engine import rescore_history
+from favorites_refresher import run_refresher, refresh_stats
+from check_queue import check_queue, UserBusyError
+from monitoring import run_monitor, make_snapshot, monitor_stats
+from portfolio import MAX_PORTFOLIO_COMPANIES, build_portfolio, portfolio_stats
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -31,7 +52,13 @@ bot = Bot(token=os.getenv("BOT_TOKEN"))
 dp = Dispatcher()
 
 # Хранилище данных для PDF (временное, по user_id)
-pdf_data_cache = {}  # {cache_key: {'data': data, 'affiliates': affs}}
+pdf_data_cache = {}  # {cache_key: CompanyProfile}
+
+# Прогрессивный отчёт: как часто можно редактировать сообщение с отчётом, сек
+REPORT_EDIT_INTERVAL = 1.0
+
+# Как часто чистить кеши ответов API и PDF-отчётов, сек
+CACHE_PRUNE_INTERVAL = 24 * 3600
 
 
 # Постоянная клавиатура внизу экрана
@@ -127,10 +154,15 @@ async def btn_help(msg: Message):
         "❓ **Помощь**\n\n"
         "**Как проверить компанию:**\n"
         "Просто отправьте ИНН (10-12 цифр)\n\n"
+        "**Массовая проверка:**\n"
+        "Пришлите файл CSV, XLSX или TXT со списком ИНН — "
+        "в ответ придёт таблица с результатами\n\n"
         "**Команды:**\n"
         "/start — Главное меню\n"
         "/profile — Ваш профиль\n"
         "/history — История проверок\n"
+        "/watches — Отслеживаемые компании\n"
+        "/portfolio — PDF-портфель по избранному\n"
         "/subscribe — Подписка\n\n"
         "**Связь:** @zegnas",
         parse_mode="Markdown"
@@ -233,6 +265,8 @@ async def show_history(msg: Message, user_id: int = None):
         return
     
     text = "📜 **Последние проверки:**\n\n"
+    buttons = []
+    rechecked = set()
     for i, (inn, name, risk, checked_at) in enumerate(history, 1):
         try:
             date = datetime.fromisoformat(checked_at).strftime("%d.%m %H:%M")
@@ -242,10 +276,14 @@ async def show_history(msg: Message, user_id: int = None):
         risk_emoji = {"low": "🟢", "medium": "🟡", "high": "🔴"}.get(risk, "⚪")
         short_name = name[:25] + "..." if len(name) > 25 else name
         text += f"{i}. {risk_emoji} **{short_name}**\n   ИНН: `{inn}` | {date}\n\n"
+        
+        # Кнопка перепроверки — по одной на компанию
+        if inn not in rechecked:
+            rechecked.add(inn)
+            buttons.append([InlineKeyboardButton(text=f"🔍 {short_name}", callback_data=f"recheck_{inn}")])
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")]
-    ])
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")])
+    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     
     await msg.answer(text, parse_mode="Markdown", reply_markup=keyboard)
 
@@ -284,6 +322,7 @@ async def show_favorites(msg: Message, user_id: int):
             InlineKeyboardButton(text="❌", callback_data=f"unfav_{inn}")
         ])
     
+    buttons.append([InlineKeyboardButton(text="📑 PDF-портфель", callback_data="portfolio_fav")])
     buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")])
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     
@@ -297,12 +336,13 @@ async def cb_add_favorite(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Получаем название компании из кеша
-    cache_key = f"{user_id}_{inn}"
-    cached = pdf_data_cache.get(cache_key, {})
-    company_name = cached.get('company_name', 'Компания')
+    profile = pdf_data_cache.get(f"{user_id}_{inn}")
+    company_name = profile.name if profile else 'Компания'
     
     if add_favorite(user_id, inn, company_name):
         await callback.answer("⭐ Добавлено в избранное!", show_alert=False)
+        # Избранное открывают повторно — сразу догружаем связи и контакты
+        await ensure_heavy_sections(user_id, inn)
     else:
         await callback.answer("Уже в избранном", show_alert=False)
 
@@ -320,27 +360,103 @@ async def cb_remove_favorite(callback: CallbackQuery):
         await callback.answer("Ошибка удаления")
 
 
+# === Отслеживание изменений ===
+@dp.callback_query(lambda c: c.data.startswith("watch_"))
+async def cb_watch(callback: CallbackQuery):
+    """Подписывает на изменения компании."""
+    inn = callback.data.replace("watch_", "")
+    user_id = callback.from_user.id
+    
+    profile = pdf_data_cache.get(f"{user_id}_{inn}")
+    company_name = profile.name if profile else 'Компания'
+    
+    if not add_watch(user_id, inn, company_name):
+        await callback.answer("Уже отслеживается", show_alert=False)
+        return
+    
+    # Первый снимок — из только что показанной проверки (если других подписчиков ещё нет).
+    # Только по секциям, которые действительно загрузились: у не загрузившейся
+    # ФССП count == 0, и следующий проход монитора прислал бы ложное «0 → N».
+    if profile is not None and get_snapshot(inn) is None:
+        save_snapshot(inn, make_snapshot(profile, profile.sections))
+    await callback.answer(
+        "🔔 Пришлю сообщение, если изменятся статус, руководитель, долги ФССП, суды или рейтинг",
+        show_alert=True
+    )
+
+
+@dp.callback_query(lambda c: c.data.startswith("unwatch_"))
+async def cb_unwatch(callback: CallbackQuery):
+    """Отписывает от изменений компании."""
+    inn = callback.data.replace("unwatch_", "")
+    user_id = callback.from_user.id
+    
+    if remove_watch(user_id, inn):
+        await callback.answer("🔕 Больше не отслеживается")
+        await show_watches(callback.message, user_id)
+    else:
+        await callback.answer("Ошибка удаления")
+
+
+@dp.message(Command("watches"))
+async def cmd_watches(msg: Message):
+    await show_watches(msg, msg.from_user.id)
+
+
+async def show_watches(msg: Message, user_id: int):
+    """Показывает отслеживаемые компании."""
+    watches = get_user_watches(user_id, 20)
+    
+    if not watches:
+        await msg.answer(
+            "🔔 **Отслеживание изменений**\n\n"
+            "Вы пока не отслеживаете ни одной компании.\n\n"
+            "После проверки компании нажмите 🔔, чтобы получать уведомления об изменениях.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    text = "🔔 **Отслеживаемые компании:**\n\n"
+    buttons = []
+    for inn, name, added_at in watches:
+        short_name = name[:25] + "..." if len(name) > 25 else name
+        text += f"• **{short_name}**\n  ИНН: `{inn}`\n\n"
+        buttons.append([
+            InlineKeyboardButton(text=f"🔍 {short_name}", callback_data=f"recheck_{inn}"),
+            InlineKeyboardButton(text="🔕", callback_data=f"unwatch_{inn}")
+        ])
+    
+    await msg.answer(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+
+
+async def send_watch_notification(user_id: int, inn: str, text: str) -> bool:
+    """Уведомление об изменениях (вызывается из monitoring для каждого подписчика)."""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔍 Проверить", callback_data=f"recheck_{inn}"),
+         InlineKeyboardButton(text="🔕 Не следить", callback_data=f"unwatch_{inn}")]
+    ])
+    try:
+        await bot.send_message(user_id, text, parse_mode="Markdown", reply_markup=keyboard)
+        return True
+    except Exception as e:
+        if "blocked" in str(e).lower() or "deactivated" in str(e).lower():
+            mark_user_blocked(user_id)
+        else:
+            logging.error(f"Failed to send watch notification to {user_id}: {e}")
+        return False
+    finally:
+        # Небольшая задержка чтобы не превышать лимиты Telegram
+        await asyncio.sleep(0.05)
+
+
 @dp.callback_query(lambda c: c.data.startswith("recheck_"))
 async def cb_recheck(callback: CallbackQuery):
-    """Быстрая перепроверка компании из избранного или истории."""
+    """Перепроверка компании в одно нажатие (из избранного, истории, подписок)."""
     inn = callback.data.replace("recheck_", "")
     await callback.answer(f"⏳ Проверяю {inn}...")
-    
-    # Симулируем сообщение с ИНН для повторной проверки
-    # Создаём фейковый объект с нужными данными
-    from types import SimpleNamespace
-    fake_msg = SimpleNamespace()
-    fake_msg.text = inn
-    fake_msg.from_user = callback.from_user
-    fake_msg.answer = callback.message.answer
-    
-    # Вызываем обычную проверку
-    from aiogram.fsm.context import FSMContext
-    # Просто отправляем инструкцию пользователю
-    await callback.message.answer(
-        f"🔍 Для проверки отправьте ИНН:\n\n`{inn}`",
-        parse_mode="Markdown"
-    )
+    # Тот же конвейер, что и для ИНН из сообщения: свежие секции — из кеша,
+    # устаревшие дозапрашиваются по отдельности
+    await enqueue_company_check(callback.message, callback.from_user, inn)
 
 
 # === Валидация ИНН ===
@@ -581,10 +697,15 @@ async def cb_help(callback: CallbackQuery):
         "❓ **Помощь**\n\n"
         "**Как проверить компанию:**\n"
         "Просто отправьте ИНН (10-12 цифр)\n\n"
+        "**Массовая проверка:**\n"
+        "Пришлите файл CSV, XLSX или TXT со списком ИНН — "
+        "в ответ придёт таблица с результатами\n\n"
         "**Команды:**\n"
         "/start — Главное меню\n"
         "/profile — Ваш профиль\n"
         "/history — История проверок\n"
+        "/watches — Отслеживаемые компании\n"
+        "/portfolio — PDF-портфель по избранному\n"
         "/subscribe — Подписка\n\n"
         "**Связь:** @zegnas",
         parse_mode="Markdown"
@@ -683,6 +804,85 @@ async def show_api_stats(msg: Message):
     filled = int(bar_length * used_percent / 100)
     bar = "█" * filled + "░" * (bar_length - filled)
     
+    # Кеш ответов API (с момента запуска бота)
+    # Секции, дождавшиеся чужого запроса, тоже обслужены без обращения к API
+    cache_served = cache_stats['hits'] + cache_stats['coalesced']
+    cache_total = cache_served + cache_stats['misses']
+    cache_rate = round(cache_served / cache_total * 100, 1) if cache_total else 0
+    lazy_saved = max(0, lazy_stats['deferred'] - lazy_stats['loaded'])
+    
+    # Расход за сегодня (rate limiter)
+    today = get_usage_snapshot("zachestnyibiznes")
+    cap_text = f"{today['daily_cap']:,}" if today['daily_cap'] else "без лимита"
+    methods_text = ", ".join(
+        f"`{method}` {count:,}" for method, count in sorted(today['by_method'].items(), key=lambda x: -x[1])
+    ) or "—"
+    
+    # Состояние внешних провайдеров (circuit breaker)
+    breaker_labels = {"closed": "🟢 работает", "half_open": "🟡 пробный запрос", "open": "🔴 отключён"}
+    breaker_lines = []
+    for b in get_breakers_status():
+        line = f"  `{b['name']}`: {breaker_labels[b['state']]}"
+        if b['state'] == "open":
+            line += f" (проба через {b['retry_in']:.0f} с)"
+        line += f", сбоев: {b['total_failures']}, отклонено: {b['rejected']}"
+        breaker_lines.append(line)
+    breakers_text = "\n".join(breaker_lines) if breaker_lines else "  Запросов ещё не было"
+    
+    # Ночное обновление избранного
+    if refresh_stats['last_run']:
+        refresher_text = (
+            f"{refresh_stats['last_run'].strftime('%d.%m %H:%M')}: обновлено {refresh_stats['refreshed']:,} "
+            f"из {refresh_stats['inns']:,}, запросов {refresh_stats['methods']:,}, "
+            f"отложено {refresh_stats['deferred']:,}, ошибок {refresh_stats['errors']:,}"
+        )
+    else:
+        refresher_text = "ещё не запускалось"
+    
+    # Мониторинг подписок
+    if monitor_stats['last_run']:
+        monitor_text = (
+            f"{monitor_stats['last_run'].strftime('%d.%m %H:%M')}: ИНН {monitor_stats['inns']:,}, "
+            f"с изменениями {monitor_stats['changed']:,}, уведомлений {monitor_stats['notified']:,}, "
+            f"ошибок {monitor_stats['errors']:,}"
+        )
+    else:
+        monitor_text = "ещё не запускался"
+    
+    # Очередь проверок
+    queue = check_queue.get_metrics()
+    lane_labels = {"admin": "админ", "premium": "премиум", "free": "бесплатно"}
+    wait_text = ", ".join(
+        f"{lane_labels[lane]} {w['avg']:.1f}/{w['p95']:.1f} с"
+        for lane, w in queue['waits'].items()
+    ) or "—"
+    
+    # Пул процессов PDF
+    pdf = get_pdf_metrics()
+    pdf_timing = (
+        f"сборка {pdf['render']['avg']:.1f}/{pdf['render']['max']:.1f} с, "
+        f"ожидание {pdf['wait']['avg']:.1f}/{pdf['wait']['max']:.1f} с, "
+        f"размер {pdf['size']['avg'] / 1024:.0f}/{pdf['size']['max'] / 1024:.0f} КБ (ср./макс.)"
+        if pdf['render'] else "отчётов ещё не было"
+    )
+    
+    portfolio_text = (
+        f"собрано {portfolio_stats['built']:,}, компаний {portfolio_stats['companies']:,}, "
+        f"в среднем {portfolio_stats['build_time'] / portfolio_stats['built']:.1f} с, "
+        f"пропущено разделов {portfolio_stats['sections_failed']:,}"
+        if portfolio_stats['built'] else "ещё не собирались"
+    )
+    
+    stamp_text = (
+        f", наложение в среднем {pdf_cache_stats['stamp_time'] / pdf_cache_stats['stamped'] * 1000:.0f} мс"
+        if pdf_cache_stats['stamped'] else ""
+    )
+    # Отметка выдачи отключает общий file_id: каждый новый получатель — новая загрузка
+    stamp_mode = (
+        "вкл. (каждому получателю — своя загрузка файла)" if PDF_STAMP
+        else "выкл. (один file_id на всех получателей)"
+    )
+    
     text = (
         f"📊 **Баланс API: За Честный Бизнес**\n\n"
         f"**Статус:** {status}\n\n"
@@ -691,7 +891,26 @@ async def show_api_stats(msg: Message):
         f"**Осталось:** {remaining:,}\n\n"
         f"[{bar}] {used_percent}%\n\n"
         f"⚠️ **Порог оповещения:** {usage['alert_threshold']:,}\n"
-        f"📅 **Дата сброса:** {usage['reset_date'] or 'Не установлена'}"
+        f"📅 **Дата сброса:** {usage['reset_date'] or 'Не установлена'}\n\n"
+        f"📆 **Сегодня:** {today['used_today']:,} из {cap_text}\n"
+        f"  По методам: {methods_text}\n\n"
+        f"🗄 **Кеш:** попаданий {cache_stats['hits']:,}, дождались общего запроса {cache_stats['coalesced']:,}, "
+        f"промахов {cache_stats['misses']:,} ({cache_rate}% без API)\n"
+        f"🔀 **Объединено запросов:** {coalesce_stats['collapsed']:,} (в API ушло {coalesce_stats['upstream']:,})\n"
+        f"💤 **Ленивая загрузка:** отложено методов {lazy_stats['deferred']:,}, "
+        f"догружено {lazy_stats['loaded']:,}, сэкономлено {lazy_saved:,}\n"
+        f"🌙 **Обновление избранного:** {refresher_text}\n"
+        f"🔔 **Мониторинг изменений:** {monitor_text}\n"
+        f"🚦 **Очередь проверок:** сейчас {queue['depth']:,} (пик {queue['peak_depth']:,}), "
+        f"воркеров занято {queue['busy']}/{queue['workers']}, отказов по лимиту {queue['rejected']:,}\n"
+        f"  Ожидание ср./p95: {wait_text}\n"
+        f"📄 **PDF:** собрано {pdf['rendered']:,}, ошибок {pdf['failed']:,}, таймаутов {pdf['timeouts']:,}, "
+        f"процессов {pdf['workers']}; {pdf_timing}\n"
+        f"  Кеш: по file_id {pdf_cache_stats['file_id_hits']:,}, из байтов {pdf_cache_stats['content_hits']:,}, "
+        f"собрано заново {pdf_cache_stats['misses']:,}, не загружено {pdf_cache_stats['bytes_saved'] / 1024 / 1024:.1f} МБ\n"
+        f"  Отметка выдачи: {stamp_mode}; персональных копий {pdf_cache_stats['stamped']:,}{stamp_text}\n"
+        f"  Портфели: {portfolio_text}\n\n"
+        f"🛡 **Провайдеры:**\n{breakers_text}"
     )
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -701,6 +920,28 @@ async def show_api_stats(msg: Message):
     await msg.answer(text, parse_mode="Markdown", reply_markup=keyboard)
 
 
+@dp.message(Command("rescore"))
+async def cmd_rescore(msg: Message):
+    """Пересчёт уровней риска в истории проверок по текущим порогам (только админ)."""
+    if not is_admin(msg.from_user.username):
+        return
+    status_msg = await msg.answer("⏳ Пересчитываю уровни риска в истории проверок...")
+    try:
+        stats = await asyncio.to_thread(rescore_history)
+    except Exception as e:
+        logging.error(f"Rescore failed: {e}")
+        await status_msg.edit_text(f"❌ Ошибка пересчёта: {str(e)[:100]}")
+        return
+    await status_msg.edit_text(
+        f"✅ **Пересчёт завершён**\n\n"
+        f"ИНН в истории: {stats['inns']:,}\n"
+        f"Пересчитано: {stats['rescored']:,}\n"
+        f"Изменился уровень: {stats['changed']:,} записей\n"
+        f"Нет данных в кеше: {stats['skipped']:,}",
+        parse_mode="Markdown"
+    )
+
+
 @dp.callback_query(lambda c: c.data == "reset_api_usage")
 async def cb_reset_api_usage(callback: CallbackQuery):
     if not is_admin(callback.from_user.username):
@@ -828,6 +1069,45 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
+# === Ленивая загрузка тяжёлых секций ===
+async def ensure_heavy_sections(user_id: int, inn: str):
+    """
+    Догружает связанные компании и контакты в профиль проверки пользователя.
+    Возвращает CompanyProfile или None, если проверка устарела.
+    """
+    profile = pdf_data_cache.get(f"{user_id}_{inn}")
+    if profile is None:
+        return None
+    
+    if not profile.heavy_loaded:
+        result = await load_heavy_sections(inn)
+        if result.get("success"):
+            profile.add_heavy_sections(result.get("data", {}))
+        else:
+            logging.warning(f"Heavy sections for {inn} not loaded: {result.get('error')}")
+    
+    return profile
+
+
+@dp.callback_query(lambda c: c.data.startswith("aff_"))
+async def cb_affiliates(callback: CallbackQuery):
+    """Показывает связанные компании и контакты (догружаются по запросу)."""
+    inn = callback.data.replace("aff_", "")
+    await callback.answer("🔗 Загружаю связи...")
+    
+    profile = await ensure_heavy_sections(callback.from_user.id, inn)
+    if profile is None:
+        await callback.message.answer("❌ Данные устарели. Отправьте ИНН повторно.")
+        return
+    
+    lines = format_related_sections(profile.affiliates or [], profile.contacts or {})
+    if not lines:
+        await callback.message.answer("🔗 Связанных компаний и контактов не найдено.")
+        return
+    
+    await callback.message.answer("\n".join(lines).strip(), parse_mode="Markdown")
+
+
 # === Обработчик PDF ===
 @dp.callback_query(lambda c: c.data.startswith("pdf_"))
 async def cb_download_pdf(callback: CallbackQuery):
@@ -836,39 +1116,230 @@ async def cb_download_pdf(callback: CallbackQuery):
     inn = callback.data.replace("pdf_", "")
     user_id = callback.from_user.id
     
-    # Получаем закешированные данные
-    cache_key = f"{user_id}_{inn}"
-    if cache_key not in pdf_data_cache:
+    # Получаем закешированный профиль (с догрузкой связей и контактов)
+    profile = await ensure_heavy_sections(user_id, inn)
+    if profile is None:
         await callback.message.answer("❌ Данные устарели. Отправьте ИНН повторно.")
         return
     
-    cached = pdf_data_cache[cache_key]
-    data = cached.get('data', cached)  # Обратная совместимость
-    affiliates = cached.get('affiliates', None)
-    extended_data = cached.get('extended', None)
+    try:
+        # Готовый отчёт по тем же данным отправляется по file_id,
+        # новый собирается в пуле процессов, чтобы не останавливать остальные чаты
+        await send_report(callback.message, profile, user_id, caption=f"📄 Отчет о проверке ИНН {inn}")
+    except PdfTimeoutError:
+        logging.error(f"PDF generation timeout for {inn}")
+        await callback.message.answer("❌ PDF формировался слишком долго. Попробуйте ещё раз позже.")
+    except Exception as e:
+        logging.error(f"PDF generation error: {e}")
+        await callback.message.answer(f"❌ Ошибка генерации PDF: {str(e)[:100]}")
+
+
+# === Массовая проверка из файла ===
+bulk_inns_cache = {}  # {user_id: ИНН последней массовой проверки} — для PDF-портфеля
+
+
+def make_quota_guard(uid: int, unlimited: bool):
+    """
+    Проверка перед каждой компанией массовой проверки: квота API не уходит
+    ниже порога оповещения, без подписки списывается проверка пользователя.
+    """
+    budget = get_quota_budget()
+    methods_per_check = len(split_methods(QUICK_METHODS))
+    quota = {"checks": budget // methods_per_check if budget is not None else None}
+    
+    def can_check() -> bool:
+        if quota["checks"] is not None:
+            if quota["checks"] <= 0:
+                return False
+            quota["checks"] -= 1
+        return unlimited or try_consume_check(uid)
+    
+    return can_check
+
+
+@dp.message(lambda m: m.document is not None)
+async def bulk_check_upload(msg: Message, state: FSMContext):
+    """Проверяет все ИНН из загруженного файла и возвращает таблицу результатов."""
+    current_state = await state.get_state()
+    if current_state is not None:
+        return
+    
+    doc = msg.document
+    filename = doc.file_name or ""
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        await msg.answer("📎 Для массовой проверки пришлите файл CSV, XLSX или TXT со списком ИНН.")
+        return
+    if doc.file_size and doc.file_size > MAX_FILE_SIZE:
+        await msg.answer(f"❌ Файл слишком большой (максимум {MAX_FILE_SIZE // (1024 * 1024)} МБ).")
+        return
     
-    # Новые данные ZaChestnyiBiznes
-    card = cached.get('card', None)
-    fssp = cached.get('fssp', None)
-    arbitration = cached.get('arbitration', None)
-    finances = cached.get('finances', None)
-    contacts = cached.get('contacts', None)
+    uid = msg.from_user.id
+    user = get_or_create_user(uid, msg.from_user.username, msg.from_user.first_name)
+    unlimited = is_admin(msg.from_user.username) or user['is_premium']
+    if not unlimited and user['checks_left'] <= 0:
+        await msg.answer(
+            "🚫 **Лимит исчерпан!**\n\n"
+            "Для массовой проверки оформите подписку.",
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="💎 Купить подписку", callback_data="subscribe")]
+            ])
+        )
+        return
+    
+    progress = await msg.answer("⏳ Читаю файл...")
     
     try:
-        filepath = generate_pdf_report(
-            data, user_id, affiliates, extended_data,
-            card=card, fssp=fssp, arbitration=arbitration, finances=finances, contacts=contacts
+        # Файл читается потоково из временного файла, а не целиком в память
+        with tempfile.TemporaryFile() as fileobj:
+            await bot.download(doc, destination=fileobj)
+            fileobj.seek(0)
+            inns = list(iter_inns(fileobj, filename))
+    except Exception as e:
+        logging.error(f"Bulk upload parse error: {e}")
+        await progress.edit_text(f"❌ Не удалось прочитать файл: {str(e)[:100]}")
+        return
+    
+    if not inns:
+        await progress.edit_text("❌ В файле не найдено корректных ИНН.")
+        return
+    
+    # Квота API: не тратим резерв ниже порога оповещения
+    can_check = make_quota_guard(uid, unlimited)
+    
+    async def on_progress(done: int, total: int, errors: int):
+        text = f"⏳ Проверено {done} из {total}"
+        if errors:
+            text += f" (ошибок: {errors})"
+        await progress.edit_text(text)
+    
+    await progress.edit_text(f"⏳ Найдено ИНН: {len(inns)}. Проверяю...")
+    rows = await run_bulk_check(inns, on_progress, can_check=can_check)
+    
+    for row in rows:
+        if not row["error"]:
+            add_check_history(uid, row["inn"], row["name"], row["risk_level"])
+    
+    # Результат в том же формате, что и загруженный файл (XLSX или CSV)
+    extension = "csv"
+    content = None
+    if filename.lower().endswith(".xlsx"):
+        try:
+            content = build_result_xlsx(rows)
+            extension = "xlsx"
+        except ImportError:
+            content = None
+    if content is None:
+        content = build_result_csv(rows)
+    
+    summary = summarize(rows)
+    await progress.edit_text(f"✅ Проверено {summary['total']} компаний")
+    
+    # По тем же компаниям можно собрать PDF-портфель (данные уже в кеше)
+    keyboard = None
+    if unlimited and summary['total'] > summary['errors']:
+        bulk_inns_cache[uid] = [row["inn"] for row in rows if not row["error"]]
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📑 PDF-портфель", callback_data="portfolio_bulk")]
+        ])
+    await msg.answer_document(
+        BufferedInputFile(content, filename=f"Проверка_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}"),
+        caption=(
+            f"📊 Результаты массовой проверки\n\n"
+            f"🟢 Низкий риск: {summary['low']}\n"
+            f"🟡 Средний риск: {summary['medium']}\n"
+            f"🔴 Высокий риск: {summary['high']}\n"
+            f"⚠️ Не проверено: {summary['errors']}"
+        ),
+        reply_markup=keyboard
+    )
+
+
+# === PDF-портфель ===
+portfolio_running = set()  # user_id, у которых портфель собирается прямо сейчас
+
+
+@dp.message(Command("portfolio"))
+async def cmd_portfolio(msg: Message):
+    await start_portfolio(msg, msg.from_user, from_bulk=False)
+
+
+@dp.callback_query(lambda c: c.data in ("portfolio_fav", "portfolio_bulk"))
+async def cb_portfolio(callback: CallbackQuery):
+    await callback.answer()
+    await start_portfolio(callback.message, callback.from_user, from_bulk=callback.data == "portfolio_bulk")
+
+
+async def start_portfolio(msg: Message, from_user, from_bulk: bool):
+    """Собирает один PDF по избранному или по списку последней массовой проверки."""
+    uid = from_user.id
+    user = get_or_create_user(uid, from_user.username, from_user.first_name)
+    if not (is_admin(from_user.username) or user['is_premium']):
+        await msg.answer(
+            "💎 PDF-портфель по нескольким компаниям доступен по подписке.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="💎 Купить подписку", callback_data="subscribe")]
+            ])
         )
-        pdf_file = FSInputFile(filepath)
-        await callback.message.answer_document(
-            pdf_file,
-            caption=f"📄 Отчет о проверке ИНН {inn}"
+        return
+    
+    if from_bulk:
+        inns, title = bulk_inns_cache.get(uid), "Список из файла"
+        if not inns:
+            await msg.answer("❌ Список устарел. Пришлите файл повторно.")
+            return
+    else:
+        inns, title = [inn for inn, _, _ in get_favorites(uid, MAX_PORTFOLIO_COMPANIES)], "Избранное"
+        if not inns:
+            await msg.answer("⭐ В избранном пока нет компаний.")
+            return
+    
+    if uid in portfolio_running:
+        await msg.answer("⏳ Портфель уже собирается, дождитесь файла.")
+        return
+    
+    portfolio_running.add(uid)
+    progress = await msg.answer(f"⏳ Портфель: {min(len(inns), MAX_PORTFOLIO_COMPANIES)} компаний. Проверяю...")
+    
+    async def on_progress(done: int, total: int, errors: int):
+        await progress.edit_text(f"⏳ Проверено {done} из {total}")
+    
+    async def on_section(done: int, total: int):
+        await progress.edit_text(f"📄 Собрано разделов: {done} из {total}")
+    
+    try:
+        result = await build_portfolio(
+            inns, user_id=uid, title=title,
+            on_progress=on_progress, on_section=on_section,
+            can_check=make_quota_guard(uid, unlimited=True),
         )
-        # Удаляем файл после отправки
-        os.remove(filepath)
+    except PdfTimeoutError:
+        logging.error(f"Portfolio timeout for user {uid}")
+        await progress.edit_text("❌ PDF формировался слишком долго. Попробуйте ещё раз позже.")
+        return
     except Exception as e:
-        logging.error(f"PDF generation error: {e}")
-        await callback.message.answer(f"❌ Ошибка генерации PDF: {str(e)[:100]}")
+        logging.error(f"Portfolio error for user {uid}: {e}")
+        await progress.edit_text(f"❌ Ошибка генерации PDF: {str(e)[:100]}")
+        return
+    finally:
+        portfolio_running.discard(uid)
+    
+    if not result["success"]:
+        await progress.edit_text(f"❌ {result['error']}")
+        return
+    
+    summary = summarize(result["rows"])
+    await progress.edit_text(f"✅ Портфель готов: {result['pages']} стр.")
+    await msg.answer_document(
+        BufferedInputFile(result["content"], filename=f"Портфель_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"),
+        caption=(
+            f"📑 PDF-портфель: {title}\n\n"
+            f"🟢 Низкий риск: {summary['low']}\n"
+            f"🟡 Средний риск: {summary['medium']}\n"
+            f"🔴 Высокий риск: {summary['high']}\n"
+            f"⚠️ Не проверено: {summary['errors']}"
+        )
+    )
 
 
 # === Проверка компании ===
@@ -879,11 +1350,63 @@ async def check_company(msg: Message, state: FSMContext):
     if current_state is not None:
         return
     
-    uid = msg.from_user.id
-    uname = msg.from_user.username
+    await enqueue_company_check(msg, msg.from_user, msg.text)
+
+
+async def enqueue_company_check(msg: Message, from_user, inn: str):
+    """
+    Ставит проверку в общую очередь (полоса по статусу пользователя)
+    и сообщает позицию, если все воркеры заняты.
+    """
+    uid = from_user.id
+    if is_admin(from_user.username):
+        lane = "admin"
+    elif get_or_create_user(uid, from_user.username, from_user.first_name)['is_premium']:
+        lane = "premium"
+    else:
+        lane = "free"
+    
+    # Проверка начнётся только после того, как отправлено сообщение о позиции
+    ready = asyncio.Event()
+    queued = {}
+    
+    async def run():
+        await ready.wait()
+        await run_company_check(msg, from_user, inn, queued.get("msg"))
+    
+    try:
+        job = check_queue.submit(uid, lane, run)
+    except UserBusyError as e:
+        await msg.answer(
+            f"⏳ У вас уже {e.limit} проверки в работе.\n"
+            f"Дождитесь результата и отправьте ИНН `{inn}` ещё раз.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    try:
+        if check_queue.will_wait(job):
+            queued["msg"] = await msg.answer(
+                f"🕐 Проверка в очереди. Перед вами: {check_queue.position(job)}"
+            )
+    finally:
+        ready.set()
+    await job.future
+
+
+async def run_company_check(msg: Message, from_user, inn: str, status_msg: Message = None):
+    """
+    Проверка компании: отвечает в чат msg от имени from_user.
+    Общая для ИНН, присланного сообщением, и перепроверки из истории/избранного/уведомлений.
+    status_msg — сообщение о месте в очереди; если есть, отчёт выводится в нём.
+    """
+    uid = from_user.id
+    uname = from_user.username
     admin = is_admin(uname)
     
     if not admin and not try_consume_check(uid):
+        if status_msg is not None:
+            await status_msg.delete()
         await msg.answer(
             "🚫 **Лимит исчерпан!**\n\n"
             "У вас закончились бесплатные проверки.\n"
@@ -895,7 +1418,7 @@ async def check_company(msg: Message, state: FSMContext):
         )
         return
     
-    user = get_or_create_user(uid, uname, msg.from_user.first_name)
+    user = get_or_create_user(uid, uname, from_user.first_name)
     
     # Определяем статус проверок
     if admin:
@@ -905,76 +1428,145 @@ async def check_company(msg: Message, state: FSMContext):
     else:
         left = f"Осталось: {user['checks_left']}"
     
-    await msg.answer(f"⏳ Ищу компанию... ({left})")
+    if status_msg is not None:
+        await status_msg.edit_text(f"⏳ Ищу компанию... ({left})")
+    else:
+        status_msg = await msg.answer(f"⏳ Ищу компанию... ({left})")
+    
+    async def show(text: str, **kwargs):
+        try:
+            await status_msg.edit_text(text, parse_mode="Markdown", **kwargs)
+        except TelegramBadRequest as e:
+            if "not modified" not in str(e):
+                raise
     
     try:
         # Используем новый API ЗАЧЕСТНЫЙБИЗНЕС
-        result = get_company_data(msg.text)
+        # Первая фаза: только лёгкие секции, связи и контакты — по запросу.
+        # Отчёт показывается, как только пришла карточка, и дополняется по мере прихода секций.
+        data, times = {}, {}
+        pending = split_methods(QUICK_METHODS)
+        failed = []
+        last_edit = 0.0
+        sections = iter_quick_sections(inn)
+        try:
+            async for batch in sections:
+                for method, section, error in batch:
+                    pending.remove(method)
+                    if section is None:
+                        if method == "card":
+                            await show(f"❌ {error or 'Компания не найдена'}")
+                            return
+                        failed.append(method)
+                        continue
+                    data[method] = section["data"]
+                    times[method] = section["fetched_at"]
+                
+                if "card" not in data or not pending:
+                    continue
+                if time.monotonic() - last_edit < REPORT_EDIT_INTERVAL:
+                    continue  # Не чаще раза в секунду (лимиты Telegram на редактирование)
+                partial = CompanyProfile.from_data(data, inn)
+                if not partial.card.get("inn") and not partial.card.get("name"):
+                    continue  # Пустая карточка — решим после всех секций
+                await show(format_company_report(partial, pending, failed))
+                last_edit = time.monotonic()
+        finally:
+            await sections.aclose()
         
-        if not result.get("success"):
-            await msg.answer(f"❌ {result.get('error', 'Компания не найдена')}")
+        # Парсим данные один раз: профиль используют отчёт, история, PDF и избранное
+        profile = CompanyProfile.from_data(data, inn, report_fetched_at(times))
+        if not profile.card.get("inn") and not profile.card.get("name"):
+            await show("❌ Компания не найдена")
             return
+        inn = profile.inn
         
-        # Парсим данные
-        data = result.get("data", {})
-        card = parse_card(data)
-        
-        inn = card.get("inn", msg.text)
-        company_name = card.get("name") or card.get("full_name", "Неизвестно")
-        
-        # Определяем уровень риска на основе ФССП и арбитража
-        fssp = parse_fssp(data)
-        arb = parse_arbitration(data)
-        affiliates = parse_affiliates(data)
-        finances = parse_finances(data)
-        
-        # Определяем риск
-        if fssp["count"] > 3 or fssp["total_sum"] > 500000:
-            risk_level = "high"
-        elif arb["as_defendant"] > 5 or fssp["count"] > 0:
-            risk_level = "medium"
-        else:
-            risk_level = "low"
-        
-        # Сохраняем в историю
-        add_check_history(uid, inn, company_name, risk_level)
+        # Сохраняем в историю (без ФССП или арбитража уровень пустой — «не оценён»)
+        add_check_history(uid, inn, profile.name, profile.risk_level)
         
         # Формируем отчёт с помощью нового модуля
-        report = format_company_report(result)
-        
-        # Парсим контакты для PDF
-        contacts = parse_contacts(data)
+        report = format_company_report(profile, failed=failed)
         
-        # Кешируем данные для PDF
-        cache_key = f"{uid}_{inn}"
-        pdf_data_cache[cache_key] = {
-            'data': data,
-            'affiliates': affiliates,
-            'company_name': company_name,
-            'card': card,
-            'fssp': fssp,
-            'arbitration': arb,
-            'finances': finances,
-            'contacts': contacts
-        }
+        # Кешируем профиль для PDF (связи и контакты догрузятся при запросе)
+        pdf_data_cache[f"{uid}_{inn}"] = profile
         
-        # Кнопки для PDF и избранного
+        # Кнопки для PDF, связей и избранного
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📄 Скачать PDF-отчет", callback_data=f"pdf_{inn}")],
-            [InlineKeyboardButton(text="⭐ В избранное", callback_data=f"fav_{inn}")]
+            [InlineKeyboardButton(text="🔗 Связанные компании", callback_data=f"aff_{inn}")],
+            [InlineKeyboardButton(text="⭐ В избранное", callback_data=f"fav_{inn}")],
+            [InlineKeyboardButton(text="🔔 Следить за изменениями", callback_data=f"watch_{inn}")]
         ])
         
-        await msg.answer(report, parse_mode="Markdown", reply_markup=keyboard)
+        await show(report, reply_markup=keyboard)
         
     except Exception as e:
         logging.error(f"Error checking company: {e}")
         await msg.answer(f"❌ Ошибка при проверке: {str(e)[:100]}")
 
 
+async def notify_admins_api_alert(provider: str, info: dict):
+    """Оповещение администраторов о квоте API (вызывается из rate_limiter)."""
+    if info.get("kind") == "daily_cap":
+        text = (
+            f"⛔ **Дневной лимит API исчерпан**\n\n"
+            f"Провайдер: `{provider}`\n"
+            f"Лимит: {info['cap']:,}, использовано: {info['used']:,}\n\n"
+            f"До конца дня проверки отдают данные из кеша."
+        )
+    else:
+        text = (
+            f"⚠️ **Заканчивается квота API**\n\n"
+            f"Провайдер: `{provider}`\n"
+            f"Осталось: {info['remaining']:,} из {info['total_limit']:,}\n"
+            f"Порог оповещения: {info['alert_threshold']:,}"
+        )
+    for admin_id in get_admin_user_ids():
+        try:
+            await bot.send_message(admin_id, text, parse_mode="Markdown")
+        except Exception as e:
+            logging.error(f"Failed to send API alert to {admin_id}: {e}")
+
+
+async def run_cache_pruner():
+    """Фоновая задача бота: раз в CACHE_PRUNE_INTERVAL удаляет устаревшие записи api_cache и pdf_cache."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(prune_api_cache, API_CACHE_MAX_AGE)
+            if removed:
+                logging.info(f"API cache: pruned {removed} sections")
+            removed = await asyncio.to_thread(prune_pdf_cache, PDF_CACHE_DAYS)
+            if removed:
+                logging.info(f"PDF cache: pruned {removed} reports")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Cache pruner error: {e}")
+        await asyncio.sleep(CACHE_PRUNE_INTERVAL)
+
+
 async def main():
     init_db()
+    set_alert_handler(notify_admins_api_alert)
+    refresher = asyncio.create_task(run_refresher())
+    monitor = asyncio.create_task(run_monitor(send_watch_notification))
+    pruner = asyncio.create_task(run_cache_pruner())
+    check_queue.start()
+    try:
+        await start_pool()
+    except Exception as e:
+        logging.error(f"PDF pool warm-up failed: {e}")  # Пул поднимется на первом отчёте
     print("--- Бот запущен ---")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        refresher.cancel()
+        monitor.cancel()
+        pruner.cancel()
+        await check_queue.stop()
+        shutdown_pool()
+        flush_usage()
+        await close_session()
 
 
 if __name__ == "__main__":
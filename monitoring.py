@@ -0,0 +1,162 @@
+"""
+Отслеживание изменений у компаний, на которые подписаны пользователи.
+
+Для каждого ИНН хранится компактный снимок отслеживаемых полей
+(company_snapshots). Раз в MONITOR_INTERVAL монитор проходит по ИНН с подписками —
+каждый ИНН один раз, сколько бы пользователей его ни отслеживали, —
+получает секции через общий конвейер (кеш + объединение запросов),
+сравнивает новый снимок с сохранённым и рассылает одно и то же
+сообщение об изменениях всем подписчикам.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database import get_watchers_by_inn, get_snapshot, save_snapshot
+from zachestnyibiznes import (
+    CompanyProfile, QUOTA_EXCEEDED_MESSAGE, get_company_data, format_number
+)
+
+# Секции, из которых собирается снимок
+WATCH_METHODS = "card,fssp-list,court-arbitration,rating"
+
+MONITOR_INTERVAL = 6 * 3600   # Период проверки подписок, сек
+MONITOR_BATCH = 10            # ИНН, проверяемых одновременно
+
+# Отслеживаемые поля: ключ снимка -> (секция, название в уведомлении)
+WATCH_FIELDS = {
+    "status": ("card", "Статус"),
+    "director": ("card", "Руководитель"),
+    "fssp_count": ("fssp-list", "Исполнительных производств"),
+    "fssp_sum": ("fssp-list", "Долги ФССП"),
+    "arb_defendant": ("court-arbitration", "Дел в роли ответчика"),
+    "rating": ("rating", "Рейтинг ЗСК"),
+}
+
+# Итоги последнего прохода для админ-статистики
+monitor_stats = {
+    "last_run": None,     # datetime окончания
+    "inns": 0,            # ИНН с подписками
+    "checked": 0,
+    "changed": 0,         # ИНН с изменениями
+    "notified": 0,        # Отправлено уведомлений
+    "errors": 0,
+}
+
+
+def make_snapshot(profile: CompanyProfile, sections=None) -> Dict[str, Any]:
+    """
+    Снимок отслеживаемых полей. sections — какие секции реально загружены;
+    поля незагруженных секций в снимок не попадают (их не с чем сравнивать).
+    """
+    values = {
+        "status": profile.card.get("status", ""),
+        "director": profile.card.get("director", ""),
+        "fssp_count": profile.fssp["count"],
+        "fssp_sum": round(profile.fssp["total_sum"], 2),
+        "arb_defendant": profile.arbitration["as_defendant"],
+        "rating": profile.rating.get("rating_category", ""),
+    }
+    if sections is None:
+        return values
+    return {key: value for key, value in values.items() if WATCH_FIELDS[key][0] in sections}
+
+
+def diff_snapshots(old: Dict[str, Any], new: Dict[str, Any]) -> List[Tuple[str, Any, Any]]:
+    """Изменившиеся поля: [(ключ, было, стало)]. Поля, которых нет в одном из снимков, не сравниваются."""
+    return [
+        (key, old[key], new[key])
+        for key in WATCH_FIELDS
+        if key in old and key in new and old[key] != new[key]
+    ]
+
+
+def _format_value(key: str, value: Any) -> str:
+    if key == "fssp_sum":
+        return format_number(value)
+    return str(value) if value not in ("", None) else "—"
+
+
+def format_changes(inn: str, name: str, changes: List[Tuple[str, Any, Any]]) -> str:
+    """Текст уведомления об изменениях (один на всех подписчиков)."""
+    lines = [f"🔔 **Изменения: {name or inn}**", f"ИНН: `{inn}`", ""]
+    for key, old, new in changes:
+        lines.append(f"• {WATCH_FIELDS[key][1]}: {_format_value(key, old)} → **{_format_value(key, new)}**")
+    return "\n".join(lines)
+
+
+async def check_inn(inn: str) -> Dict[str, Any]:
+    """
+    Проверяет один ИНН: новый снимок, сравнение с сохранённым, сохранение.
+    Returns: {"success", "name", "changes", "error"}
+    """
+    result = await get_company_data(inn, WATCH_METHODS)
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error", "Ошибка запроса")}
+
+    data = result.get("data", {})
+    profile = CompanyProfile.from_data(data, inn, score=False)
+    new = make_snapshot(profile, profile.sections)
+    old = get_snapshot(inn)
+
+    changes = diff_snapshots(old, new) if old else []
+    if old is None or changes or any(key not in old for key in new):
+        # Поля, которые в этот раз не загрузились, остаются из прежнего снимка
+        save_snapshot(inn, {**(old or {}), **new})
+    return {"success": True, "name": profile.name, "changes": changes}
+
+
+async def check_watches(notify: Callable[[int, str, str], Awaitable[bool]]) -> Dict[str, int]:
+    """
+    Один проход по всем подпискам.
+    notify(user_id, inn, text) отправляет уведомление и возвращает True при успехе.
+    """
+    stats = {"inns": 0, "checked": 0, "changed": 0, "notified": 0, "errors": 0}
+    watchers = get_watchers_by_inn()
+    inns = list(watchers)
+    stats["inns"] = len(inns)
+
+    for start in range(0, len(inns), MONITOR_BATCH):
+        batch = inns[start:start + MONITOR_BATCH]
+        results = await asyncio.gather(*(check_inn(inn) for inn in batch), return_exceptions=True)
+
+        quota_exhausted = False
+        for inn, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logging.error(f"Watch check failed for {inn}: {result}")
+                stats["errors"] += 1
+                continue
+            if not result.get("success"):
+                stats["errors"] += 1
+                quota_exhausted = quota_exhausted or result.get("error") == QUOTA_EXCEEDED_MESSAGE
+                continue
+            stats["checked"] += 1
+            if not result["changes"]:
+                continue
+
+            stats["changed"] += 1
+            text = format_changes(inn, result["name"], result["changes"])
+            for user_id in watchers[inn]:
+                if await notify(user_id, inn, text):
+                    stats["notified"] += 1
+
+        if quota_exhausted:
+            break  # Остальные ИНН — в следующий проход
+
+    logging.info(f"Watch monitor: {stats}")
+    return stats
+
+
+async def run_monitor(notify: Callable[[int, str, str], Awaitable[bool]], interval: Optional[int] = None):
+    """Фоновая задача бота: проверяет подписки каждые MONITOR_INTERVAL секунд."""
+    while True:
+        try:
+            stats = await check_watches(notify)
+            monitor_stats.update(stats, last_run=datetime.now())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Watch monitor error: {e}")
+        await asyncio.sleep(interval or MONITOR_INTERVAL)
@@ -0,0 +1,184 @@
+"""
+Кеш PDF-отчётов по содержимому.
+
+Ключ — SHA-256 от всех полей CompanyProfile (включая время данных) и версии
+макета PDF_LAYOUT_VERSION: одинаковые данные дают один и тот же отчёт.
+Для ключа хранятся байты PDF и file_id, который Telegram вернул после первой
+отправки. Повторная выдача того же отчёта — отправка по file_id: без сборки
+и без загрузки файла.
+
+Горячие отчёты держатся в памяти (LRU до MEMORY_CACHE_BYTES), все — в pdf_cache (SQLite).
+
+С PDF_STAMP пользователь получает персональную копию: на закешированный отчёт
+накладывается отметка выдачи с номером экземпляра (pdf_stamp), полной сборки нет.
+file_id копии запоминается для пары (отчёт, пользователь) — повторная выдача
+тому же пользователю снова идёт по file_id. Цена — трафик: общий file_id
+между пользователями не переиспользуется, каждый новый получатель — это
+новая загрузка файла в Telegram. Поэтому по умолчанию отметка выключена;
+включается переменной окружения PDF_STAMP=1.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+from dotenv import load_dotenv
+
+from database import (
+    get_pdf_cache, save_pdf_cache, set_pdf_file_id,
+    get_issued_copy, save_issued_copy, set_issued_file_id,
+)
+from pdf_generator import report_filename
+from pdf_pool import render_pdf
+from pdf_stamp import new_issue_number, stamp_pdf
+
+load_dotenv()
+
+PDF_LAYOUT_VERSION = 1                 # Увеличить при изменении макета отчёта
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024  # Отчётов в памяти, байт
+PDF_CACHE_DAYS = 7                     # Сколько хранить невостребованный отчёт (чистит main.run_cache_pruner)
+PDF_STAMP = os.getenv("PDF_STAMP", "0") == "1"   # Персональная отметка выдачи (каждому получателю — своя загрузка)
+
+_memory: "OrderedDict[str, dict]" = OrderedDict()   # digest -> {"content", "file_id"}
+_memory_bytes = 0
+_rendering: Dict[str, asyncio.Task] = {}            # digest -> сборка, которая идёт сейчас
+
+pdf_cache_stats = {
+    "file_id_hits": 0, "content_hits": 0, "misses": 0, "bytes_saved": 0,
+    "stamped": 0, "stamp_time": 0.0,   # Персональных копий и суммарное время наложения, сек
+}
+
+
+def report_digest(profile) -> str:
+    """Хеш входных данных отчёта."""
+    fields = {name: getattr(profile, name) for name in profile.__slots__}
+    payload = json.dumps(
+        {"layout": PDF_LAYOUT_VERSION, **fields},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _remember(digest: str, entry: dict):
+    """Кладёт отчёт в LRU в памяти, вытесняя самые давние сверх MEMORY_CACHE_BYTES."""
+    global _memory_bytes
+    old = _memory.pop(digest, None)
+    if old is not None:
+        _memory_bytes -= len(old["content"])
+    _memory[digest] = entry
+    _memory_bytes += len(entry["content"])
+    while _memory_bytes > MEMORY_CACHE_BYTES and len(_memory) > 1:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted["content"])
+
+
+def _lookup(digest: str) -> Optional[dict]:
+    entry = _memory.get(digest)
+    if entry is not None:
+        _memory.move_to_end(digest)
+        return entry
+    entry = get_pdf_cache(digest)
+    if entry is not None:
+        _remember(digest, entry)
+    return entry
+
+
+def _store(digest: str, inn: str, content: bytes) -> dict:
+    save_pdf_cache(digest, inn, content)
+    entry = {"content": content, "file_id": None}
+    _remember(digest, entry)
+    return entry
+
+
+async def _render_and_store(digest: str, profile, user_id: int) -> dict:
+    content = await render_pdf({}, user_id, profile=profile)
+    return _store(digest, profile.inn, content)
+
+
+async def _base_report(digest: str, profile, user_id: int) -> dict:
+    """Отчёт из кеша или, если такого ещё не было, собранный в пуле процессов."""
+    entry = _lookup(digest)
+    if entry is not None:
+        pdf_cache_stats["content_hits"] += 1
+        return entry
+
+    pdf_cache_stats["misses"] += 1
+    # Одновременные запросы одного отчёта ждут одну сборку
+    task = _rendering.get(digest)
+    if task is None:
+        task = asyncio.ensure_future(_render_and_store(digest, profile, user_id))
+        _rendering[digest] = task
+        task.add_done_callback(lambda _: _rendering.pop(digest, None))
+    return await asyncio.shield(task)
+
+
+async def _send_by_file_id(message: Message, file_id: str, caption: str, inn: str) -> bool:
+    """Отправка уже загруженного файла; False, если Telegram его больше не принимает."""
+    try:
+        await message.answer_document(file_id, caption=caption)
+    except TelegramBadRequest as e:
+        # file_id перестал действовать — загрузим файл заново
+        logging.warning(f"PDF file_id rejected for {inn}: {e}")
+        return False
+    pdf_cache_stats["file_id_hits"] += 1
+    return True
+
+
+async def _send_stamped(message: Message, profile, digest: str, user_id: int, caption: str):
+    """Персональная копия: отметка выдачи поверх закешированного отчёта."""
+    issued = get_issued_copy(digest, user_id)
+    if issued and issued["file_id"]:
+        if await _send_by_file_id(message, issued["file_id"], caption, profile.inn):
+            pdf_cache_stats["bytes_saved"] += issued["size"]
+            return
+        set_issued_file_id(digest, user_id, None)
+
+    # Повторная загрузка той же копии сохраняет её номер экземпляра
+    issue_no = issued["issue_no"] if issued else new_issue_number()
+    entry = await _base_report(digest, profile, user_id)
+    started = time.perf_counter()
+    content = await asyncio.to_thread(stamp_pdf, entry["content"], issue_no)
+    pdf_cache_stats["stamped"] += 1
+    pdf_cache_stats["stamp_time"] += time.perf_counter() - started
+
+    sent = await message.answer_document(
+        BufferedInputFile(content, filename=report_filename(profile.inn)),
+        caption=caption,
+    )
+    if sent.document is not None:
+        save_issued_copy(digest, user_id, issue_no, sent.document.file_id, len(content))
+
+
+async def send_report(message: Message, profile, user_id: int, caption: str):
+    """
+    Отправляет PDF-отчёт по профилю: по file_id, из сохранённых байтов
+    или, если такого отчёта ещё не было, собирает его в пуле процессов.
+    """
+    digest = report_digest(profile)
+    if PDF_STAMP:
+        await _send_stamped(message, profile, digest, user_id, caption)
+        return
+
+    entry = _lookup(digest)
+    if entry is not None and entry["file_id"]:
+        if await _send_by_file_id(message, entry["file_id"], caption, profile.inn):
+            pdf_cache_stats["bytes_saved"] += len(entry["content"])
+            return
+        entry["file_id"] = None
+        set_pdf_file_id(digest, None)
+
+    entry = await _base_report(digest, profile, user_id)
+    sent = await message.answer_document(
+        BufferedInputFile(entry["content"], filename=report_filename(profile.inn)),
+        caption=caption,
+    )
+    if sent.document is not None:
+        entry["file_id"] = sent.document.file_id
+        set_pdf_file_id(digest, sent.document.file_id)
@@ -3,30 +3,151 @@
 Обновлён для работы с API ЗАЧЕСТНЫЙБИЗНЕС.
 """
 
+import io
+import logging
 import os
+import struct
 from datetime import datetime
 from typing import Dict, Any, List
+from xml.sax.saxutils import escape
+from reportlab import rl_config
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
-# Путь для сохранения отчетов
-REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
-os.makedirs(REPORTS_DIR, exist_ok=True)
-
-# Регистрируем шрифт с поддержкой кириллицы
+# Шрифт с поддержкой кириллицы
 FONT_PATH = os.path.join(os.path.dirname(__file__), "DejaVuSans.ttf")
 FONT_BOLD_PATH = os.path.join(os.path.dirname(__file__), "DejaVuSans-Bold.ttf")
 
-if os.path.exists(FONT_PATH):
-    pdfmetrics.registerFont(TTFont('DejaVuSans', FONT_PATH))
-if os.path.exists(FONT_BOLD_PATH):
-    pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', FONT_BOLD_PATH))
+# Компактный вывод: в подмножества шрифтов попадают только использованные символы
+# (без обязательного набора ASCII) и короткая таблица name, потоки страниц пишутся
+# в двоичном виде (без ASCII85)
+COMPACT_OUTPUT = True
+if COMPACT_OUTPUT:
+    # Настройка ReportLab глобальная: действует на все холсты процесса, включая
+    # слой отметки pdf_stamp. Сжатые потоки без ASCII85 на ~25% меньше.
+    rl_config.useA85 = 0
+# ASCII-читаемые подмножества ReportLab всегда включают весь печатный набор ASCII
+# (~20 КБ на шрифт, в том числе в слое отметки), в компактном режиме — выключены
+FONT_ASCII_READABLE = not COMPACT_OUTPUT
+# Записи name, которые остаются (как у subsetter из fontTools по умолчанию):
+# копирайт, семейство, начертание, идентификатор, полное имя, версия, PostScript-имя
+KEEP_NAME_IDS = (0, 1, 2, 3, 4, 5, 6)
+
+_fonts = None    # (обычный, жирный) после регистрации
+_styles = None   # Реестр стилей, собирается один раз
+
+
+def _compact_name_table(table: bytes) -> bytes:
+    """
+    Таблица name только с KEEP_NAME_IDS для Windows/Unicode, английский (0x409).
+    У DejaVu это убирает ~15 КБ (текст лицензии, описание, дубли для Mac) из каждого шрифта в PDF.
+    """
+    _, count, string_offset = struct.unpack(">HHH", table[:6])
+    records = []
+    for i in range(count):
+        platform, encoding, language, name_id, length, offset = struct.unpack(
+            ">HHHHHH", table[6 + 12 * i:18 + 12 * i]
+        )
+        if platform == 3 and language == 0x409 and name_id in KEEP_NAME_IDS:
+            start = string_offset + offset
+            records.append((platform, encoding, language, name_id, table[start:start + length]))
+    if not records:
+        return table  # Нестандартный шрифт — оставляем как есть
+
+    header = struct.pack(">HHH", 0, len(records), 6 + 12 * len(records))
+    entries, strings = b"", b""
+    for platform, encoding, language, name_id, value in records:
+        entries += struct.pack(">HHHHHH", platform, encoding, language, name_id, len(value), len(strings))
+        strings += value
+    return header + entries + strings
+
+
+def _compact_font(font: TTFont) -> TTFont:
+    """
+    Подменяет таблицу name, которую ReportLab копирует в каждое подмножество шрифта.
+    Опирается на внутренний разборщик TTF (face.get_table): если в другой версии
+    ReportLab его нет или таблица не разбирается, шрифт остаётся как есть.
+    """
+    face = getattr(font, "face", None)
+    get_table = getattr(face, "get_table", None)
+    if not callable(get_table):
+        logging.warning("PDF fonts: TTF parser has no get_table, name table left as is")
+        return font
+    try:
+        name_table = _compact_name_table(get_table('name'))
+    except Exception as e:
+        logging.warning(f"PDF fonts: name table not compacted: {e!r}")
+        return font
+    face.get_table = lambda tag: name_table if tag == 'name' else get_table(tag)
+    return font
+
+
+def ensure_fonts() -> tuple:
+    """
+    Регистрирует шрифты DejaVu при первом обращении (разбор TTF — заметная часть
+    запуска, поэтому не при импорте модуля). Возвращает (обычный, жирный);
+    без файлов шрифтов — Helvetica.
+    """
+    global _fonts
+    if _fonts is None:
+        font_name, font_bold = 'Helvetica', 'Helvetica-Bold'
+        prepare = _compact_font if COMPACT_OUTPUT else (lambda font: font)
+        if os.path.exists(FONT_PATH):
+            pdfmetrics.registerFont(prepare(TTFont('DejaVuSans', FONT_PATH, asciiReadable=FONT_ASCII_READABLE)))
+            font_name = 'DejaVuSans'
+        if os.path.exists(FONT_BOLD_PATH):
+            pdfmetrics.registerFont(prepare(TTFont('DejaVuSans-Bold', FONT_BOLD_PATH, asciiReadable=FONT_ASCII_READABLE)))
+            font_bold = 'DejaVuSans-Bold'
+        _fonts = (font_name, font_bold)
+    return _fonts
+
+
+def get_styles() -> Dict[str, Any]:
+    """Стили абзацев и таблиц отчёта: создаются один раз и переиспользуются всеми отчётами."""
+    global _styles
+    if _styles is None:
+        font_name, font_bold = ensure_fonts()
+        # Таблица «подпись: значение» (основные сведения, контакты)
+        def key_value(font_size: int, padding: int) -> TableStyle:
+            return TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), font_name),
+                ('FONTSIZE', (0, 0), (-1, -1), font_size),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+            ])
+        # Таблица с сеткой и строкой заголовка (ФССП, арбитраж, связи)
+        grid = [
+            ('FONTNAME', (0, 0), (-1, -1), font_name),
+            ('FONTNAME', (0, 0), (-1, 0), font_bold),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ]
+        _styles = {
+            "font": font_name,
+            "font_bold": font_bold,
+            "title": ParagraphStyle('CustomTitle', fontName=font_bold, fontSize=14, spaceAfter=20, alignment=1),
+            "heading": ParagraphStyle('CustomHeading', fontName=font_bold, fontSize=11, spaceAfter=8, spaceBefore=15),
+            "normal": ParagraphStyle('CustomNormal', fontName=font_name, fontSize=9, spaceAfter=4),
+            "small": ParagraphStyle('SmallText', fontName=font_name, fontSize=8, textColor=colors.grey),
+            "footer": ParagraphStyle('Footer', fontName=font_name, fontSize=7, textColor=colors.grey),
+            "info_table": key_value(9, 5),
+            "contact_table": key_value(9, 4),
+            "grid_table": TableStyle(grid),
+            "fin_table": TableStyle(grid + [
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+                ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ]),
+        }
+    return _styles
 
 
 def format_money(value) -> str:
@@ -47,6 +168,242 @@ def format_money(value) -> str:
         return "Данных нет"
 
 
+def report_filename(inn: str) -> str:
+    """Имя файла отчёта для отправки пользователю."""
+    return f"report_{inn}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+# ============ Секции отчёта по компании ============
+# Общие для одиночного отчёта и портфеля: каждая возвращает список flowables
+
+RISK_TITLES = {
+    "high": ("ВЫСОКИЙ РИСК", colors.red),
+    "medium": ("СРЕДНИЙ РИСК", colors.orange),
+    "low": ("НИЗКИЙ РИСК", colors.green),
+}
+
+
+def card_fields(card: Dict) -> Dict[str, Any]:
+    """Поля блока «Основные сведения» из карточки ЗАЧЕСТНЫЙБИЗНЕС."""
+    address = card.get('address', 'Не указан')
+    if isinstance(address, dict):
+        address = address.get('АдресПолн', 'Не указан')
+    okved = card.get('okved', 'Н/Д')
+    okved_name = card.get('okved_name', '')
+    return {
+        "name": card.get('name') or card.get('full_name', 'Неизвестно'),
+        "inn": card.get('inn', 'unknown'),
+        "ogrn": card.get('ogrn', 'Н/Д'),
+        "kpp": card.get('kpp', 'Н/Д'),
+        "address": address,
+        "manager_name": card.get('director', 'Не указан'),
+        "manager_post": '',
+        "okved_full": f"{okved}" + (f" - {okved_name}" if okved_name else ""),
+        "capital": card.get('capital', 0),
+        "employees": card.get('employees', 0),
+        "status": card.get('status', ''),
+    }
+
+
+def build_info_section(fields: Dict[str, Any], styles: Dict[str, Any]) -> list:
+    """Основные сведения: наименование, реквизиты, руководитель, ОКВЭД."""
+    address = fields["address"]
+    info_data = [
+        ["Наименование:", fields["name"]],
+        ["ИНН:", fields["inn"]],
+        ["ОГРН:", fields["ogrn"]],
+        ["КПП:", fields["kpp"]],
+        ["Статус:", fields["status"] or "Н/Д"],
+        ["Адрес:", address[:70] + "..." if len(str(address)) > 70 else address],
+        ["Руководитель:", f"{fields['manager_name']}" + (f" ({fields['manager_post']})" if fields["manager_post"] else "")],
+        ["Основной ОКВЭД:", fields["okved_full"][:60]],
+    ]
+    
+    capital, employees = fields["capital"], fields["employees"]
+    if capital and float(capital) > 0:
+        info_data.append(["Уставный капитал:", format_money(capital)])
+    if employees and int(employees) > 0:
+        info_data.append(["Сотрудников:", str(employees)])
+    
+    info_table = Table(info_data, colWidths=[4.5*cm, 12.5*cm])
+    info_table.setStyle(styles["info_table"])
+    return [Paragraph("<b>ОСНОВНЫЕ СВЕДЕНИЯ</b>", styles["heading"]), info_table]
+
+
+def build_finance_section(finances: Dict, styles: Dict[str, Any]) -> list:
+    """Финансовые показатели по данным ФНС."""
+    if finances.get('has_data'):
+        year = f"{finances.get('year', 'Н/Д')} год"
+        fin_data = [
+            ["Показатель", "Значение", "Период"],
+            ["Выручка", format_money(finances.get('revenue', 0)), year],
+            ["Прибыль", format_money(finances.get('profit', 0)), year],
+        ]
+        if finances.get('taxes_paid') and float(finances.get('taxes_paid', 0)) > 0:
+            fin_data.append(["Уплачено налогов", format_money(finances['taxes_paid']), year])
+        if finances.get('tax_debt') and float(finances.get('tax_debt', 0)) > 0:
+            fin_data.append(["Задолженность по налогам", format_money(finances['tax_debt']), "⚠️"])
+        if finances.get('employees') and int(finances.get('employees', 0)) > 0:
+            fin_data.append(["Сотрудников (ФНС)", str(finances['employees']), year])
+    else:
+        fin_data = [["Показатель", "Значение", "Период"], ["Данные", "Отсутствуют", "-"]]
+    
+    fin_table = Table(fin_data, colWidths=[5*cm, 7*cm, 5*cm])
+    fin_table.setStyle(styles["fin_table"])
+    return [Paragraph("<b>ФИНАНСОВЫЕ ПОКАЗАТЕЛИ</b>", styles["heading"]), fin_table]
+
+
+def build_fssp_section(fssp: Dict, styles: Dict[str, Any]) -> list:
+    """Исполнительные производства: итог и первые пять предметов взыскания."""
+    elements = [Paragraph("<b>ИСПОЛНИТЕЛЬНЫЕ ПРОИЗВОДСТВА (ФССП)</b>", styles["heading"])]
+    fssp_count = fssp.get('count', 0)
+    if fssp_count <= 0:
+        elements.append(Paragraph("✓ Исполнительных производств не найдено", styles["normal"]))
+        return elements
+    
+    elements.append(Paragraph(
+        f"Найдено производств: {fssp_count}, общая сумма: {format_money(fssp.get('total_sum', 0))}",
+        styles["normal"]
+    ))
+    if fssp.get('items'):
+        fssp_data = [["Предмет взыскания", "Сумма"]]
+        for item in fssp['items'][:5]:
+            subject = item.get('СодИП', item.get('Предмет', 'Задолженность'))[:50]
+            fssp_data.append([subject, format_money(item.get('СуммаДолга', 0))])
+        
+        fssp_table = Table(fssp_data, colWidths=[12*cm, 5*cm])
+        fssp_table.setStyle(styles["grid_table"])
+        elements.append(fssp_table)
+    return elements
+
+
+def build_arbitration_section(arbitration: Dict, styles: Dict[str, Any]) -> list:
+    """Арбитражные дела: итог по ролям и первые пять дел."""
+    elements = [Paragraph("<b>АРБИТРАЖНЫЕ ДЕЛА</b>", styles["heading"])]
+    arb_total = arbitration.get('total', 0)
+    if arb_total <= 0:
+        elements.append(Paragraph("✓ Арбитражных дел не найдено", styles["normal"]))
+        return elements
+    
+    summary = f"Всего дел: {arb_total}"
+    if arbitration.get('as_plaintiff', 0) > 0:
+        summary += f", истец: {arbitration['as_plaintiff']}"
+    if arbitration.get('as_defendant', 0) > 0:
+        summary += f", ответчик: {arbitration['as_defendant']}"
+    elements.append(Paragraph(summary, styles["normal"]))
+    
+    if arbitration.get('cases'):
+        arb_data = [["Номер дела", "Статус"]]
+        for case in arbitration['cases'][:5]:
+            number = case.get('НомерДела', case.get('number', '?'))
+            status_case = case.get('Статус', case.get('status', ''))[:30]
+            arb_data.append([number, status_case])
+        
+        arb_table = Table(arb_data, colWidths=[8*cm, 9*cm])
+        arb_table.setStyle(styles["grid_table"])
+        elements.append(arb_table)
+    return elements
+
+
+def build_affiliates_section(affiliates_list: List[Dict], styles: Dict[str, Any]) -> list:
+    """Действующие компании, связанные с руководителем."""
+    elements = [Paragraph("<b>СВЯЗАННЫЕ КОМПАНИИ</b>", styles["heading"])]
+    
+    # Только действующие компании с именем и ИНН
+    active_affiliates = []
+    for aff in affiliates_list or []:
+        if isinstance(aff, dict):
+            aff_name = aff.get('name', aff.get('Наименование', ''))
+            aff_inn = aff.get('inn', aff.get('ИНН', ''))
+            aff_status = str(aff.get('status', aff.get('Статус', '')))
+            if aff_name and aff_inn and "Действ" in aff_status:
+                active_affiliates.append(aff)
+    
+    if not active_affiliates:
+        elements.append(Paragraph("Действующих связанных компаний не найдено", styles["normal"]))
+        return elements
+    
+    count = len(active_affiliates)
+    risk_text = "МАССОВЫЙ ДИРЕКТОР" if count >= 10 else ("Много связей" if count >= 5 else "Норма")
+    elements.append(Paragraph(f"Руководитель связан с {count} действующими компаниями. Оценка: {risk_text}", styles["normal"]))
+    
+    aff_data = [["Компания", "ИНН", "Статус"]]
+    for aff in active_affiliates[:10]:
+        aff_name = aff.get('name', aff.get('Наименование', '?'))
+        aff_inn = aff.get('inn', aff.get('ИНН', '?'))
+        if len(aff_name) > 35:
+            aff_name = aff_name[:35] + "..."
+        aff_data.append([aff_name, aff_inn, "Действует"])
+    
+    aff_table = Table(aff_data, colWidths=[9*cm, 4*cm, 4*cm])
+    aff_table.setStyle(styles["grid_table"])
+    elements.append(aff_table)
+    return elements
+
+
+def build_contacts_section(contacts: Dict, styles: Dict[str, Any]) -> list:
+    """Телефоны, email и сайты (пусто, если контактов нет)."""
+    if not contacts or not contacts.get("has_data"):
+        return []
+    elements = [Paragraph("<b>КОНТАКТНЫЕ ДАННЫЕ</b>", styles["heading"])]
+    
+    contact_info = []
+    if contacts.get("phones"):
+        contact_info.append(["Телефоны:", ", ".join(contacts["phones"][:3])])
+    if contacts.get("emails"):
+        contact_info.append(["Email:", ", ".join(contacts["emails"][:2])])
+    if contacts.get("sites"):
+        contact_info.append(["Веб-сайт:", ", ".join(contacts["sites"][:2])])
+    
+    if contact_info:
+        contact_table = Table(contact_info, colWidths=[4*cm, 13*cm])
+        contact_table.setStyle(styles["contact_table"])
+        elements.append(contact_table)
+    return elements
+
+
+def build_footer(styles: Dict[str, Any]) -> list:
+    """Подпись в конце отчёта."""
+    footer_style = styles["footer"]
+    return [
+        Spacer(1, 30),
+        Paragraph("_" * 70, styles["normal"]),
+        Paragraph("Отчет сформирован автоматически ботом @contragent111_bot", footer_style),
+        Paragraph(f"Источник данных: API ЗАЧЕСТНЫЙБИЗНЕС | Telegram: t.me/contragent111_bot", footer_style),
+    ]
+
+
+def _data_time_paragraph(profile, styles: Dict[str, Any]) -> Paragraph:
+    """
+    Для профиля — время данных: одинаковые данные дают одинаковый PDF (см. pdf_cache).
+    Без профиля — текущее время.
+    """
+    data_time = None
+    if profile is not None and profile.fetched_at:
+        try:
+            data_time = datetime.fromisoformat(profile.fetched_at)
+        except ValueError:
+            pass
+    if data_time is not None:
+        return Paragraph(f"Данные на: {data_time.strftime('%d.%m.%Y %H:%M')}", styles["small"])
+    return Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles["small"])
+
+
+def _build_document(elements: list) -> bytes:
+    """Собирает PDF формата A4 со стандартными полями в память."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=1.5*cm,
+        leftMargin=1.5*cm,
+        topMargin=1.5*cm,
+        bottomMargin=1.5*cm
+    )
+    doc.build(elements)
+    return buffer.getvalue()
+
+
 def generate_pdf_report(
     data: Dict[str, Any], 
     user_id: int, 
@@ -57,87 +414,59 @@ def generate_pdf_report(
     fssp: Dict = None,
     arbitration: Dict = None,
     finances: Dict = None,
-    contacts: Dict = None
-) -> str:
+    contacts: Dict = None,
+    profile=None
+) -> bytes:
     """
-    Генерирует PDF-отчет о компании.
+    Генерирует PDF-отчет о компании и возвращает его содержимое (файл на диск не пишется).
     Поддерживает как старый формат (DaData), так и новый (ZaChestnyiBiznes).
+    Для нового формата достаточно передать profile (CompanyProfile) — секции берутся из него.
     """
     
+    risk_level_code = None
+    if profile is not None:
+        card, fssp, arbitration = profile.card, profile.fssp, profile.arbitration
+        finances, contacts = profile.finances, profile.contacts
+        affiliates_list = profile.affiliates
+        risk_level_code = profile.risk_level
+    
     # Определяем источник данных (новый API или старый)
     use_new_api = card is not None
     
     if use_new_api:
         # Новый формат ZaChestnyiBiznes
-        inn = card.get('inn', 'unknown')
-        name = card.get('name') or card.get('full_name', 'Неизвестно')
-        ogrn = card.get('ogrn', 'Н/Д')
-        kpp = card.get('kpp', 'Н/Д')
-        address = card.get('address', 'Не указан')
-        if isinstance(address, dict):
-            address = address.get('АдресПолн', 'Не указан')
-        manager_name = card.get('director', 'Не указан')
-        manager_post = ''
-        okved = card.get('okved', 'Н/Д')
-        okved_name = card.get('okved_name', '')
-        okved_full = f"{okved}" + (f" - {okved_name}" if okved_name else "")
-        capital = card.get('capital', 0)
-        employees = card.get('employees', 0)
-        status = card.get('status', '')
+        fields = card_fields(card)
     else:
         # Старый формат DaData
-        inn = data.get('inn', 'unknown')
-        name = data.get('name', {}).get('full_with_opf') or data.get('name', {}).get('short_with_opf') or 'Неизвестно'
-        ogrn = data.get('ogrn', 'Н/Д')
-        kpp = data.get('kpp', 'Н/Д')
-        address = data.get('address', {}).get('value', 'Не указан') if isinstance(data.get('address'), dict) else 'Не указан'
-        manager_name = data.get('management', {}).get('name', 'Не указан') if data.get('management') else 'Не указан'
-        manager_post = data.get('management', {}).get('post', '') if data.get('management') else ''
         from okved import get_okved_name
         okved = data.get('okved', 'Н/Д')
         okved_name = get_okved_name(okved)
-        okved_full = f"{okved}" + (f" - {okved_name}" if okved_name else "")
-        capital = 0
-        employees = 0
-        status = data.get('state', {}).get('status', '')
-    
-    filename = f"report_{inn}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(REPORTS_DIR, filename)
-    
-    doc = SimpleDocTemplate(
-        filepath,
-        pagesize=A4,
-        rightMargin=1.5*cm,
-        leftMargin=1.5*cm,
-        topMargin=1.5*cm,
-        bottomMargin=1.5*cm
-    )
-    
-    # Шрифты
-    font_name = 'DejaVuSans' if os.path.exists(FONT_PATH) else 'Helvetica'
-    font_bold = 'DejaVuSans-Bold' if os.path.exists(FONT_BOLD_PATH) else 'Helvetica-Bold'
+        fields = {
+            "name": data.get('name', {}).get('full_with_opf') or data.get('name', {}).get('short_with_opf') or 'Неизвестно',
+            "inn": data.get('inn', 'unknown'),
+            "ogrn": data.get('ogrn', 'Н/Д'),
+            "kpp": data.get('kpp', 'Н/Д'),
+            "address": data.get('address', {}).get('value', 'Не указан') if isinstance(data.get('address'), dict) else 'Не указан',
+            "manager_name": data.get('management', {}).get('name', 'Не указан') if data.get('management') else 'Не указан',
+            "manager_post": data.get('management', {}).get('post', '') if data.get('management') else '',
+            "okved_full": f"{okved}" + (f" - {okved_name}" if okved_name else ""),
+            "capital": 0,
+            "employees": 0,
+            "status": data.get('state', {}).get('status', ''),
+        }
     
-    # Стили
-    title_style = ParagraphStyle('CustomTitle', fontName=font_bold, fontSize=14, spaceAfter=20, alignment=1)
-    heading_style = ParagraphStyle('CustomHeading', fontName=font_bold, fontSize=11, spaceAfter=8, spaceBefore=15)
-    normal_style = ParagraphStyle('CustomNormal', fontName=font_name, fontSize=9, spaceAfter=4)
-    small_style = ParagraphStyle('SmallText', fontName=font_name, fontSize=8, textColor=colors.grey)
+    # Стили (и шрифты) — из общего реестра
+    styles = get_styles()
+    heading_style = styles["heading"]
+    normal_style = styles["normal"]
     
     # Определяем уровень риска
     if use_new_api and fssp and arbitration:
-        fssp_count = fssp.get('count', 0)
-        fssp_sum = fssp.get('total_sum', 0)
-        arb_defendant = arbitration.get('as_defendant', 0)
-        
-        if fssp_count > 3 or fssp_sum > 500000:
-            risk_level = "ВЫСОКИЙ РИСК"
-            risk_color = colors.red
-        elif arb_defendant > 5 or fssp_count > 0:
-            risk_level = "СРЕДНИЙ РИСК"
-            risk_color = colors.orange
-        else:
-            risk_level = "НИЗКИЙ РИСК"
-            risk_color = colors.green
+        if risk_level_code is None:
+            from zachestnyibiznes import assess_risk_level
+            risk_level_code = assess_risk_level(fssp, arbitration)
+        # Пустой уровень у профиля — ФССП или арбитраж не загрузились
+        risk_level, risk_color = RISK_TITLES.get(risk_level_code, ("НЕ ОЦЕНЕН", colors.grey))
     else:
         # Старый анализ через risk_analyzer
         from risk_analyzer import analyze_risks
@@ -148,8 +477,8 @@ def generate_pdf_report(
     elements = []
     
     # === ЗАГОЛОВОК ===
-    elements.append(Paragraph("ОТЧЕТ О ПРОВЕРКЕ КОНТРАГЕНТА", title_style))
-    elements.append(Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", small_style))
+    elements.append(Paragraph("ОТЧЕТ О ПРОВЕРКЕ КОНТРАГЕНТА", styles["title"]))
+    elements.append(_data_time_paragraph(profile, styles))
     elements.append(Spacer(1, 15))
     
     # === ОБЩАЯ ОЦЕНКА ===
@@ -157,52 +486,11 @@ def generate_pdf_report(
     elements.append(Spacer(1, 8))
     
     # === ОСНОВНЫЕ СВЕДЕНИЯ ===
-    elements.append(Paragraph("<b>ОСНОВНЫЕ СВЕДЕНИЯ</b>", heading_style))
-    
-    info_data = [
-        ["Наименование:", name],
-        ["ИНН:", inn],
-        ["ОГРН:", ogrn],
-        ["КПП:", kpp],
-        ["Статус:", status or "Н/Д"],
-        ["Адрес:", address[:70] + "..." if len(str(address)) > 70 else address],
-        ["Руководитель:", f"{manager_name}" + (f" ({manager_post})" if manager_post else "")],
-        ["Основной ОКВЭД:", okved_full[:60]],
-    ]
-    
-    if capital and float(capital) > 0:
-        info_data.append(["Уставный капитал:", format_money(capital)])
-    if employees and int(employees) > 0:
-        info_data.append(["Сотрудников:", str(employees)])
-    
-    info_table = Table(info_data, colWidths=[4.5*cm, 12.5*cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(info_table)
+    elements += build_info_section(fields, styles)
     
     # === ФИНАНСОВЫЕ ПОКАЗАТЕЛИ ===
-    elements.append(Paragraph("<b>ФИНАНСОВЫЕ ПОКАЗАТЕЛИ</b>", heading_style))
-    
     if use_new_api and finances:
-        if finances.get('has_data'):
-            fin_data = [
-                ["Показатель", "Значение", "Период"],
-                ["Выручка", format_money(finances.get('revenue', 0)), f"{finances.get('year', 'Н/Д')} год"],
-                ["Прибыль", format_money(finances.get('profit', 0)), f"{finances.get('year', 'Н/Д')} год"],
-            ]
-            if finances.get('taxes_paid') and float(finances.get('taxes_paid', 0)) > 0:
-                fin_data.append(["Уплачено налогов", format_money(finances['taxes_paid']), f"{finances.get('year', 'Н/Д')} год"])
-            if finances.get('tax_debt') and float(finances.get('tax_debt', 0)) > 0:
-                fin_data.append(["Задолженность по налогам", format_money(finances['tax_debt']), "⚠️"])
-            if finances.get('employees') and int(finances.get('employees', 0)) > 0:
-                fin_data.append(["Сотрудников (ФНС)", str(finances['employees']), f"{finances.get('year', 'Н/Д')} год"])
-        else:
-            fin_data = [["Показатель", "Значение", "Период"], ["Данные", "Отсутствуют", "-"]]
+        elements += build_finance_section(finances, styles)
     else:
         # Старый формат
         from risk_analyzer import get_financial_data
@@ -212,176 +500,144 @@ def generate_pdf_report(
             ["Выручка", format_money(finance.get('revenue')), f"{finance.get('year', 'Н/Д')} год"],
             ["Прибыль", format_money(finance.get('profit')), f"{finance.get('year', 'Н/Д')} год"],
         ]
-    
-    fin_table = Table(fin_data, colWidths=[5*cm, 7*cm, 5*cm])
-    fin_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTNAME', (0, 0), (-1, 0), font_bold),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(fin_table)
+        fin_table = Table(fin_data, colWidths=[5*cm, 7*cm, 5*cm])
+        fin_table.setStyle(styles["fin_table"])
+        elements += [Paragraph("<b>ФИНАНСОВЫЕ ПОКАЗАТЕЛИ</b>", heading_style), fin_table]
     
     # === ФССП (Исполнительные производства) ===
-    elements.append(Paragraph("<b>ИСПОЛНИТЕЛЬНЫЕ ПРОИЗВОДСТВА (ФССП)</b>", heading_style))
-    
     if use_new_api and fssp:
-        fssp_count = fssp.get('count', 0)
-        fssp_sum = fssp.get('total_sum', 0)
-        
-        if fssp_count > 0:
-            elements.append(Paragraph(
-                f"Найдено производств: {fssp_count}, общая сумма: {format_money(fssp_sum)}", 
-                normal_style
-            ))
-            
-            if fssp.get('items'):
-                fssp_data = [["Предмет взыскания", "Сумма"]]
-                for item in fssp['items'][:5]:
-                    subject = item.get('СодИП', item.get('Предмет', 'Задолженность'))[:50]
-                    amount = format_money(item.get('СуммаДолга', 0))
-                    fssp_data.append([subject, amount])
-                
-                fssp_table = Table(fssp_data, colWidths=[12*cm, 5*cm])
-                fssp_table.setStyle(TableStyle([
-                    ('FONTNAME', (0, 0), (-1, -1), font_name),
-                    ('FONTNAME', (0, 0), (-1, 0), font_bold),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ]))
-                elements.append(fssp_table)
-        else:
-            elements.append(Paragraph("✓ Исполнительных производств не найдено", normal_style))
-    elif extended_data and extended_data.get("fssp"):
-        # Старый формат
-        fssp_old = extended_data["fssp"]
-        if fssp_old.get("found") and fssp_old.get("total", 0) > 0:
-            elements.append(Paragraph(f"Найдено производств: {fssp_old.get('total', 0)}", normal_style))
-        else:
-            elements.append(Paragraph("Исполнительных производств не найдено", normal_style))
+        elements += build_fssp_section(fssp, styles)
     else:
-        elements.append(Paragraph("Данные недоступны", normal_style))
+        elements.append(Paragraph("<b>ИСПОЛНИТЕЛЬНЫЕ ПРОИЗВОДСТВА (ФССП)</b>", heading_style))
+        if extended_data and extended_data.get("fssp"):
+            # Старый формат
+            fssp_old = extended_data["fssp"]
+            if fssp_old.get("found") and fssp_old.get("total", 0) > 0:
+                elements.append(Paragraph(f"Найдено производств: {fssp_old.get('total', 0)}", normal_style))
+            else:
+                elements.append(Paragraph("Исполнительных производств не найдено", normal_style))
+        else:
+            elements.append(Paragraph("Данные недоступны", normal_style))
     
     # === АРБИТРАЖНЫЕ ДЕЛА ===
-    elements.append(Paragraph("<b>АРБИТРАЖНЫЕ ДЕЛА</b>", heading_style))
-    
     if use_new_api and arbitration:
-        arb_total = arbitration.get('total', 0)
-        arb_plaintiff = arbitration.get('as_plaintiff', 0)
-        arb_defendant = arbitration.get('as_defendant', 0)
-        
-        if arb_total > 0:
-            summary = f"Всего дел: {arb_total}"
-            if arb_plaintiff > 0:
-                summary += f", истец: {arb_plaintiff}"
-            if arb_defendant > 0:
-                summary += f", ответчик: {arb_defendant}"
-            elements.append(Paragraph(summary, normal_style))
-            
-            if arbitration.get('cases'):
-                arb_data = [["Номер дела", "Статус"]]
-                for case in arbitration['cases'][:5]:
-                    number = case.get('НомерДела', case.get('number', '?'))
-                    status_case = case.get('Статус', case.get('status', ''))[:30]
-                    arb_data.append([number, status_case])
-                
-                arb_table = Table(arb_data, colWidths=[8*cm, 9*cm])
-                arb_table.setStyle(TableStyle([
-                    ('FONTNAME', (0, 0), (-1, -1), font_name),
-                    ('FONTNAME', (0, 0), (-1, 0), font_bold),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ]))
-                elements.append(arb_table)
-        else:
-            elements.append(Paragraph("✓ Арбитражных дел не найдено", normal_style))
-    elif extended_data and extended_data.get("arbitr"):
-        arbitr = extended_data["arbitr"]
-        if arbitr.get("found") and arbitr.get("total", 0) > 0:
-            elements.append(Paragraph(f"Всего дел: {arbitr.get('total', 0)}", normal_style))
-        else:
-            elements.append(Paragraph("Арбитражных дел не найдено", normal_style))
+        elements += build_arbitration_section(arbitration, styles)
     else:
-        elements.append(Paragraph("Данные недоступны", normal_style))
+        elements.append(Paragraph("<b>АРБИТРАЖНЫЕ ДЕЛА</b>", heading_style))
+        if extended_data and extended_data.get("arbitr"):
+            arbitr = extended_data["arbitr"]
+            if arbitr.get("found") and arbitr.get("total", 0) > 0:
+                elements.append(Paragraph(f"Всего дел: {arbitr.get('total', 0)}", normal_style))
+            else:
+                elements.append(Paragraph("Арбитражных дел не найдено", normal_style))
+        else:
+            elements.append(Paragraph("Данные недоступны", normal_style))
     
     # === СВЯЗАННЫЕ КОМПАНИИ ===
-    elements.append(Paragraph("<b>СВЯЗАННЫЕ КОМПАНИИ</b>", heading_style))
-    
-    # Фильтруем только действующие компании с данными
-    active_affiliates = []
-    if affiliates_list:
-        for aff in affiliates_list:
-            if isinstance(aff, dict):
-                aff_name = aff.get('name', aff.get('Наименование', ''))
-                aff_inn = aff.get('inn', aff.get('ИНН', ''))
-                aff_status = str(aff.get('status', aff.get('Статус', '')))
-                # Только действующие компании с именем и ИНН
-                if aff_name and aff_inn and "Действ" in aff_status:
-                    active_affiliates.append(aff)
-    
-    if active_affiliates:
-        count = len(active_affiliates)
-        risk_text = "МАССОВЫЙ ДИРЕКТОР" if count >= 10 else ("Много связей" if count >= 5 else "Норма")
-        elements.append(Paragraph(f"Руководитель связан с {count} действующими компаниями. Оценка: {risk_text}", normal_style))
-        
-        aff_data = [["Компания", "ИНН", "Статус"]]
-        for aff in active_affiliates[:10]:
-            aff_name = aff.get('name', aff.get('Наименование', '?'))
-            aff_inn = aff.get('inn', aff.get('ИНН', '?'))
-            
-            if len(aff_name) > 35:
-                aff_name = aff_name[:35] + "..."
-            aff_data.append([aff_name, aff_inn, "Действует"])
-        
-        if len(aff_data) > 1:
-            aff_table = Table(aff_data, colWidths=[9*cm, 4*cm, 4*cm])
-            aff_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), font_name),
-                ('FONTNAME', (0, 0), (-1, 0), font_bold),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ]))
-            elements.append(aff_table)
-    else:
-        elements.append(Paragraph("Действующих связанных компаний не найдено", normal_style))
+    elements += build_affiliates_section(affiliates_list, styles)
     
     # === КОНТАКТЫ ===
-    if contacts and contacts.get("has_data"):
-        elements.append(Paragraph("<b>КОНТАКТНЫЕ ДАННЫЕ</b>", heading_style))
-        
-        contact_info = []
-        if contacts.get("phones"):
-            contact_info.append(["Телефоны:", ", ".join(contacts["phones"][:3])])
-        if contacts.get("emails"):
-            contact_info.append(["Email:", ", ".join(contacts["emails"][:2])])
-        if contacts.get("sites"):
-            contact_info.append(["Веб-сайт:", ", ".join(contacts["sites"][:2])])
-        
-        if contact_info:
-            contact_table = Table(contact_info, colWidths=[4*cm, 13*cm])
-            contact_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), font_name),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ]))
-            elements.append(contact_table)
+    elements += build_contacts_section(contacts, styles)
     
     # === ПОДПИСЬ ===
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("_" * 70, normal_style))
-    footer_style = ParagraphStyle('Footer', fontName=font_name, fontSize=7, textColor=colors.grey)
-    elements.append(Paragraph("Отчет сформирован автоматически ботом @contragent111_bot", footer_style))
-    elements.append(Paragraph(f"Источник данных: API ЗАЧЕСТНЫЙБИЗНЕС | Telegram: t.me/contragent111_bot", footer_style))
+    elements += build_footer(styles)
     
     # Генерируем PDF
-    doc.build(elements)
+    return _build_document(elements)
+
+
+# ============ Портфель компаний ============
+# Портфель собирается по частям (см. portfolio.py): сводная таблица и разделы
+# компаний пачками — отдельные небольшие PDF, которые склеиваются по мере готовности.
+
+PORTFOLIO_RISK_LABELS = {"low": "Низкий", "medium": "Средний", "high": "Высокий"}
+
+
+def generate_portfolio_summary(rows: List[Dict[str, Any]], title: str = "") -> bytes:
+    """
+    Первая часть портфеля: итоги по уровням риска и сводная таблица.
+    rows — строки массовой проверки (bulk_check): inn, name, risk_level, fssp_sum, defendant_cases, error.
+    Номер строки таблицы совпадает с номером раздела компании.
+    """
+    styles = get_styles()
+    counts = {code: 0 for code in RISK_TITLES}
+    unchecked = 0
+    
+    table_data = [["№", "Наименование", "ИНН", "Риск", "Долги ФССП", "Ответчик"]]
+    risk_colors = []
+    for number, row in enumerate(rows, start=1):
+        if row.get("error"):
+            unchecked += 1
+            table_data.append([str(number), "—", row["inn"], "Не проверен", "", ""])
+            continue
+        level = row.get("risk_level", "")
+        if level in counts:
+            counts[level] += 1
+            risk_colors.append(('TEXTCOLOR', (3, number), (3, number), RISK_TITLES[level][1]))
+        name = row.get("name") or "—"
+        table_data.append([
+            str(number),
+            name[:40] + "..." if len(name) > 40 else name,
+            row["inn"],
+            PORTFOLIO_RISK_LABELS.get(level, level),
+            format_money(row["fssp_sum"]) if row.get("fssp_sum") else "—",
+            str(row.get("defendant_cases", "")),
+        ])
+    
+    summary = (
+        f"Компаний: {len(rows)}. Высокий риск: {counts['high']}, средний: {counts['medium']}, "
+        f"низкий: {counts['low']}" + (f", не проверено: {unchecked}" if unchecked else "")
+    )
+    elements = [
+        Paragraph("ПОРТФЕЛЬ КОНТРАГЕНТОВ", styles["title"]),
+        Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles["small"]),
+    ]
+    if title:
+        elements.append(Paragraph(escape(title), styles["small"]))
+    elements += [
+        Spacer(1, 15),
+        Paragraph("<b>СВОДНАЯ ТАБЛИЦА РИСКОВ</b>", styles["heading"]),
+        Paragraph(summary, styles["normal"]),
+    ]
     
-    return filepath
+    # Длинная таблица переносится на следующие страницы с повтором заголовка
+    table = Table(table_data, colWidths=[1*cm, 7.3*cm, 3*cm, 2.3*cm, 2.4*cm, 2*cm], repeatRows=1)
+    table.setStyle(TableStyle(styles["grid_table"].getCommands() + risk_colors))
+    elements.append(table)
+    elements += build_footer(styles)
+    return _build_document(elements)
+
+
+def company_section(profile, number: int, styles: Dict[str, Any]) -> list:
+    """Раздел портфеля по одной компании: те же секции, что в одиночном отчёте."""
+    risk_level = RISK_TITLES[profile.risk_level][0] if profile.risk_level in RISK_TITLES else "Н/Д"
+    
+    elements = [
+        Paragraph(f"{number}. {escape(profile.name)}", styles["title"]),
+        _data_time_paragraph(profile, styles),
+        Spacer(1, 8),
+        Paragraph(f"<b>ОБЩАЯ ОЦЕНКА: {risk_level}</b>", styles["heading"]),
+    ]
+    elements += build_info_section(card_fields(profile.card), styles)
+    if profile.finances:
+        elements += build_finance_section(profile.finances, styles)
+    elements += build_fssp_section(profile.fssp, styles)
+    elements += build_arbitration_section(profile.arbitration, styles)
+    if profile.heavy_loaded:
+        elements += build_affiliates_section(profile.affiliates, styles)
+        elements += build_contacts_section(profile.contacts, styles)
+    return elements
+
+
+def generate_portfolio_sections(items: List[tuple]) -> bytes:
+    """
+    Пачка разделов портфеля: items — [(номер, CompanyProfile)], каждая компания с новой страницы.
+    Шрифты встраиваются один раз на пачку, а не на каждую компанию.
+    """
+    styles = get_styles()
+    elements = []
+    for number, profile in items:
+        if elements:
+            elements.append(PageBreak())
+        elements += company_section(profile, number, styles)
+    return _build_document(elements)
@@ -0,0 +1,233 @@
+"""
+Генерация PDF в пуле процессов.
+
+doc.build у ReportLab — чистая нагрузка на CPU: отчёт с длинными таблицами
+арбитража и связей, собранный прямо в event loop, останавливает все чаты.
+Поэтому отчёты собираются в отдельных процессах (PDF_WORKERS штук):
+
+- шрифты регистрируются один раз при старте процесса (_init_worker);
+- у каждого процесса свой ProcessPoolExecutor на один процесс: отчёт уходит
+  в свободный процесс, а зависший останавливается и пересоздаётся один —
+  сборки других пользователей и части портфеля в соседних процессах не страдают;
+- одновременно ждут не больше PDF_MAX_PENDING запросов, остальные ждут места;
+- на сборку одного отчёта — PDF_TIMEOUT секунд (ожидание свободного процесса не в счёт);
+- время ожидания и сборки, размер отчётов копятся для админ-статистики.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+PDF_WORKERS = 2           # Процессов для сборки PDF
+PDF_MAX_PENDING = 8       # Запросов в работе и в очереди пула одновременно
+PDF_TIMEOUT = 60          # Дедлайн на сборку одного отчёта, сек
+STATS_SAMPLES = 200       # Сколько последних замеров хранить
+
+
+class PdfTimeoutError(Exception):
+    """Отчёт не собран за PDF_TIMEOUT секунд."""
+
+
+_context = None
+_workers: Dict[int, ProcessPoolExecutor] = {}   # pid -> исполнитель этого процесса
+_idle: Optional[asyncio.Queue] = None           # Свободные процессы: pid или None (процесс надо создать)
+_slots: Optional[asyncio.Semaphore] = None
+_background = set()                             # Сборки, от которых ушёл ожидающий
+_render_times = deque(maxlen=STATS_SAMPLES)
+_wait_times = deque(maxlen=STATS_SAMPLES)
+_sizes = deque(maxlen=STATS_SAMPLES)
+pdf_stats = {"rendered": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+
+def _init_worker():
+    """Инициализация процесса пула: регистрация шрифтов и сборка стилей до первого отчёта."""
+    from pdf_generator import get_styles
+    get_styles()
+
+
+def _render(builder: str, args: tuple, kwargs: dict) -> Tuple[bytes, float]:
+    """Выполняется в процессе пула: собирает PDF и возвращает (содержимое, секунды сборки)."""
+    import pdf_generator
+
+    started = time.perf_counter()
+    content = getattr(pdf_generator, builder)(*args, **kwargs)
+    return content, time.perf_counter() - started
+
+
+def _get_context():
+    global _context
+    if _context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            # Процессы форкаются от сервера, в котором ReportLab и шрифты уже загружены
+            _context = multiprocessing.get_context("forkserver")
+            _context.set_forkserver_preload(["pdf_generator"])
+        else:
+            _context = multiprocessing.get_context("spawn")
+    return _context
+
+
+def _get_idle() -> asyncio.Queue:
+    global _idle
+    if _idle is None:
+        _idle = asyncio.Queue()
+        for _ in range(PDF_WORKERS):
+            _idle.put_nowait(None)   # Процессы создаются при первой надобности
+    return _idle
+
+
+async def _spawn_worker() -> int:
+    """Запускает процесс (с инициализацией) и возвращает его pid."""
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=_get_context(), initializer=_init_worker)
+    try:
+        pid = await asyncio.get_running_loop().run_in_executor(executor, os.getpid)
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    _workers[pid] = executor
+    return pid
+
+
+def _return_spawned(task: asyncio.Task):
+    """Процесс, который создавался для ушедшего ожидающего, достаётся следующему."""
+    failed = task.cancelled() or task.exception() is not None
+    _get_idle().put_nowait(None if failed else task.result())
+
+
+async def _acquire_worker() -> int:
+    """Ждёт свободный процесс (при необходимости создаёт его) и возвращает pid."""
+    idle = _get_idle()
+    pid = await idle.get()
+    if pid is not None:
+        return pid
+    task = asyncio.ensure_future(_spawn_worker())
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        task.add_done_callback(_return_spawned)
+        raise
+    except Exception:
+        idle.put_nowait(None)
+        raise
+
+
+def _stop_worker(pid: int):
+    """Останавливает один процесс (зависший или упавший); вместо него позже создаётся новый."""
+    executor = _workers.pop(pid, None)
+    _get_idle().put_nowait(None)
+    if executor is None:
+        return
+    pdf_stats["restarts"] += 1
+    logging.warning(f"PDF worker {pid} restarted")
+    executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass  # Процесс уже завершился
+
+
+async def _finish(pid: int, future: asyncio.Future, deadline: float, detached: bool = False) -> Tuple[bytes, float]:
+    """
+    Ждёт сборку в процессе pid до deadline (time.monotonic) и возвращает процесс в пул.
+    По дедлайну или при падении процесса останавливается только этот процесс.
+    detached — ожидающий уже ушёл, сборку дожидается фоновая задача.
+    """
+    try:
+        result = await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        pdf_stats["timeouts"] += 1
+        future.add_done_callback(_discard_result)
+        _stop_worker(pid)
+        raise PdfTimeoutError(f"PDF не сформирован за {PDF_TIMEOUT} с")
+    except asyncio.CancelledError:
+        if detached:
+            raise  # Остановка бота
+        # Ожидающий ушёл: процесс вернётся в пул, когда дособерёт отчёт
+        task = asyncio.ensure_future(_finish(pid, future, deadline, detached=True))
+        task.add_done_callback(_discard_result)
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        raise
+    except BrokenProcessPool:
+        pdf_stats["failed"] += 1
+        _stop_worker(pid)
+        raise
+    except Exception:
+        pdf_stats["failed"] += 1
+        _get_idle().put_nowait(pid)
+        raise
+    _get_idle().put_nowait(pid)
+    return result
+
+
+async def render_pdf(*args, builder: str = "generate_pdf_report", **kwargs) -> bytes:
+    """
+    Асинхронная обёртка над функцией сборки из pdf_generator (по умолчанию
+    generate_pdf_report; части портфеля — generate_portfolio_summary и
+    generate_portfolio_sections): собирает PDF в свободном процессе пула и
+    возвращает его содержимое. Бросает PdfTimeoutError по дедлайну.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PDF_MAX_PENDING)
+
+    queued_at = time.monotonic()
+    async with _slots:
+        pid = await _acquire_worker()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_workers[pid], _render, builder, args, kwargs)
+        content, render_time = await _finish(pid, future, time.monotonic() + PDF_TIMEOUT)
+
+    pdf_stats["rendered"] += 1
+    _render_times.append(render_time)
+    _wait_times.append(time.monotonic() - queued_at - render_time)
+    _sizes.append(len(content))
+    return content
+
+
+def _discard_result(future: asyncio.Future):
+    """Забирает результат брошенной сборки, чтобы asyncio не ругался на необработанную ошибку."""
+    if not future.cancelled():
+        future.exception()
+
+
+async def start_pool():
+    """Запускает процессы пула заранее, при старте бота, а не на первом отчёте."""
+    results = await asyncio.gather(*(_acquire_worker() for _ in range(PDF_WORKERS)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, int):
+            _get_idle().put_nowait(result)   # Неудачный запуск _acquire_worker уже вернул в пул сам
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+
+def shutdown_pool():
+    """Останавливает пул при завершении бота."""
+    global _idle
+    for executor in _workers.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _workers.clear()
+    _idle = None
+
+
+def get_pdf_metrics() -> Dict[str, Any]:
+    """Снимок для админ-статистики: счётчики и среднее/максимум сборки, ожидания и размера (байт)."""
+    def summary(samples) -> Dict[str, float]:
+        if not samples:
+            return {}
+        return {"avg": sum(samples) / len(samples), "max": max(samples)}
+
+    return {
+        **pdf_stats,
+        "workers": PDF_WORKERS,
+        "render": summary(_render_times),
+        "wait": summary(_wait_times),
+        "size": summary(_sizes),
+    }
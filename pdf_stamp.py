@@ -0,0 +1,80 @@
+"""
+Персональная отметка на готовом PDF-отчёте.
+
+Тело отчёта зависит только от данных компании: оно собирается один раз на
+снимок данных и лежит в pdf_cache. Всё, что относится к конкретной выдаче
+(номер экземпляра, время выдачи, номера страниц), рисуется отдельным тонким
+слоем и накладывается на страницы готового файла через pypdf — это миллисекунды
+вместо полной сборки ReportLab.
+
+Получатель в отметке не называется: PDF пересылают дальше, и Telegram ID
+в нём раскрыл бы, кому отчёт выдан. Номер экземпляра случайный, связь
+номера с пользователем хранится только в pdf_issued.
+"""
+
+import io
+import secrets
+from datetime import datetime
+from typing import Optional
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+
+from pdf_generator import ensure_fonts
+
+STAMP_FONT_SIZE = 7
+STAMP_MARGIN = 20         # Отступ отметки от нижнего края страницы, pt
+ISSUE_NO_BYTES = 4        # Длина номера экземпляра: 8 шестнадцатеричных знаков
+
+
+def new_issue_number() -> str:
+    """Случайный номер экземпляра (по нему нельзя восстановить получателя)."""
+    return secrets.token_hex(ISSUE_NO_BYTES).upper()
+
+
+def _overlay(page_sizes: list, issue_no: Optional[str], issued_at: datetime,
+             first_number: int, total: Optional[int]) -> PdfReader:
+    """Слой отметки: по странице на каждую страницу отчёта."""
+    font_name, _ = ensure_fonts()
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer)
+    issued = issued_at.strftime('%d.%m.%Y %H:%M')
+    label = f"Экземпляр № {issue_no} · выдан {issued}" if issue_no else f"Выдан {issued}"
+    for number, (width, height) in enumerate(page_sizes, start=first_number):
+        overlay.setPageSize((width, height))
+        overlay.setFont(font_name, STAMP_FONT_SIZE)
+        overlay.setFillGray(0.5)
+        overlay.drawString(STAMP_MARGIN * 2, STAMP_MARGIN, label)
+        page_label = f"Стр. {number} из {total}" if total else f"Стр. {number}"
+        overlay.drawRightString(width - STAMP_MARGIN * 2, STAMP_MARGIN, page_label)
+        overlay.showPage()
+    overlay.save()
+    return PdfReader(io.BytesIO(buffer.getvalue()))
+
+
+def stamp_pages(pages, issue_no: Optional[str] = None, issued_at: Optional[datetime] = None,
+                first_number: int = 1, total: Optional[int] = None):
+    """
+    Накладывает отметку на страницы pypdf (на месте). Нумерация — с first_number;
+    total — страниц во всём документе (None — без «из N», когда итог ещё неизвестен).
+    """
+    page_sizes = [(float(page.mediabox.width), float(page.mediabox.height)) for page in pages]
+    overlay = _overlay(page_sizes, issue_no, issued_at or datetime.now(), first_number, total)
+
+    for page, stamp in zip(pages, overlay.pages):
+        # Слой добавляется отдельным потоком содержимого, страница отчёта не разбирается
+        page.merge_transformed_page(stamp, (1, 0, 0, 1, 0, 0), over=True, expand=False)
+        page.compress_content_streams()
+
+
+def stamp_pdf(content: bytes, issue_no: Optional[str] = None, issued_at: Optional[datetime] = None) -> bytes:
+    """
+    Накладывает отметку выдачи на каждую страницу отчёта и возвращает новый PDF.
+    issue_no — номер экземпляра (без него в отметке только время выдачи).
+    """
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(content)))
+    stamp_pages(writer.pages, issue_no, issued_at, total=len(writer.pages))
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
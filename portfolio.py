@@ -0,0 +1,179 @@
+"""
+PDF-портфель: один документ по списку компаний (избранное или загруженный список ИНН).
+
+Сначала компании проверяются массовой проверкой (bulk_check): из неё берутся
+строки сводной таблицы, риск считается одним пакетом. Затем документ
+собирается по частям: сводная таблица и разделы компаний (пачками по
+PORTFOLIO_CHUNK) рендерятся в пуле процессов (pdf_pool) отдельными небольшими
+PDF и по порядку дописываются в итоговый файл через pypdf — по мере
+готовности, не дожидаясь остальных. Отметка выдачи (время и номера страниц)
+накладывается на страницы каждой части сразу при дописывании, а не на
+готовый документ: вторую копию всего портфеля держать не нужно.
+
+В работе одновременно не больше PORTFOLIO_WINDOW пачек: данные компаний
+читаются из кеша API (его заполнила массовая проверка) прямо перед сборкой
+их пачки и отпускаются после, а не держатся в памяти для всего списка.
+Готовый документ пишется во временный файл, и только после того, как
+PdfWriter отпущен, читается в память для отправки.
+"""
+
+import asyncio
+import io
+import logging
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+from bulk_check import PROGRESS_INTERVAL, run_bulk_check
+from pdf_pool import PDF_WORKERS, render_pdf
+from database import get_cached_sections
+from pdf_stamp import stamp_pages
+from zachestnyibiznes import CompanyProfile, QUICK_METHODS, split_methods, report_fetched_at
+
+MAX_PORTFOLIO_COMPANIES = 200          # Компаний в одном портфеле
+PORTFOLIO_CHUNK = 10                   # Компаний в одной части (шрифты встраиваются раз на часть)
+PORTFOLIO_WINDOW = PDF_WORKERS * 2     # Частей в работе одновременно
+
+portfolio_stats = {"built": 0, "companies": 0, "sections_failed": 0, "build_time": 0.0}
+
+
+def _load_profile(row: Dict[str, Any]) -> Optional[CompanyProfile]:
+    """
+    Профиль из кеша API, который только что заполнила массовая проверка.
+    В API не ходит: истёкшие с тех пор секции берутся как есть — это те же
+    данные, что в сводной таблице, а квота уже списана в run_bulk_check.
+    """
+    quick = split_methods(QUICK_METHODS)
+    sections = {m: section for m, section in get_cached_sections(row["inn"]).items() if m in quick}
+    if "card" not in sections:
+        logging.warning(f"Portfolio section for {row['inn']} skipped: no cached card")
+        return None
+    data = {m: section["data"] for m, section in sections.items()}
+    fetched_at = report_fetched_at({m: section["fetched_at"] for m, section in sections.items()})
+    profile = CompanyProfile.from_data(data, row["inn"], fetched_at, score=False)
+    profile.risk_level = row["risk_level"]   # Тот же уровень, что в сводной таблице
+    return profile
+
+
+async def _render_chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> Tuple[Optional[bytes], int]:
+    """Часть портфеля по пачке строк [(номер, строка)]. Returns: (PDF или None, пропущено компаний)."""
+    profiles = await asyncio.to_thread(lambda: [_load_profile(row) for _, row in chunk])
+    items = [(number, profile) for (number, _), profile in zip(chunk, profiles) if profile is not None]
+    skipped = len(chunk) - len(items)
+    if not items:
+        return None, skipped
+    return await render_pdf(items, builder="generate_portfolio_sections"), skipped
+
+
+def _append(writer: PdfWriter, content: bytes, issued_at: Optional[datetime] = None):
+    """Дописывает часть в документ; с issued_at — сразу с отметкой выдачи на её страницах."""
+    start = len(writer.pages)
+    writer.append(PdfReader(io.BytesIO(content)))
+    if issued_at is not None:
+        # Сколько страниц будет всего, пока неизвестно — нумерация без «из N»
+        stamp_pages(writer.pages[start:], issued_at=issued_at, first_number=start + 1)
+
+
+def _write(writer: PdfWriter):
+    """Пишет документ во временный файл (не в память) и возвращает файл, перемотанный в начало."""
+    output = tempfile.TemporaryFile()
+    writer.write(output)
+    output.seek(0)
+    return output
+
+
+def _read(output) -> bytes:
+    with output:
+        return output.read()
+
+
+async def build_portfolio(
+    inns: List[str],
+    user_id: int = None,
+    title: str = "",
+    on_progress: Callable[[int, int, int], Awaitable[None]] = None,
+    on_section: Callable[[int, int], Awaitable[None]] = None,
+    can_check: Callable[[], bool] = None,
+) -> Dict[str, Any]:
+    """
+    Собирает PDF-портфель по списку ИНН (не больше MAX_PORTFOLIO_COMPANIES, без повторов).
+
+    Args:
+        inns: ИНН компаний
+        user_id: кому выдаётся портфель; если задан, на страницы накладывается отметка
+                 выдачи — время и номера страниц (pdf_stamp), сам user_id в PDF не попадает
+        title: подзаголовок сводной страницы (например, «Избранное»)
+        on_progress: прогресс проверки (готово, всего, ошибок) — как в run_bulk_check
+        on_section: прогресс сборки (разделов готово, всего), не чаще PROGRESS_INTERVAL
+        can_check: ограничение квоты для run_bulk_check
+
+    Returns:
+        {"success", "content", "rows", "pages", "error"}
+    """
+    inns = list(dict.fromkeys(inns))[:MAX_PORTFOLIO_COMPANIES]
+    if not inns:
+        return {"success": False, "rows": [], "error": "Список компаний пуст"}
+
+    started = time.monotonic()
+    rows = await run_bulk_check(inns, on_progress, can_check=can_check)
+    checked = [(number, row) for number, row in enumerate(rows, start=1) if not row["error"]]
+    if not checked:
+        return {"success": False, "rows": rows, "error": "Ни одну компанию не удалось проверить"}
+
+    issued_at = datetime.now() if user_id is not None else None
+    writer = PdfWriter()
+    summary = await render_pdf(rows, title, builder="generate_portfolio_summary")
+    await asyncio.to_thread(_append, writer, summary, issued_at)
+
+    # Части: не больше PORTFOLIO_WINDOW в работе, в файл — строго в порядке списка
+    chunks = iter([checked[i:i + PORTFOLIO_CHUNK] for i in range(0, len(checked), PORTFOLIO_CHUNK)])
+    pending = deque()
+
+    def schedule_next():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append((len(chunk), asyncio.ensure_future(_render_chunk(chunk))))
+
+    for _ in range(PORTFOLIO_WINDOW):
+        schedule_next()
+
+    done, last_report = 0, time.monotonic()
+    try:
+        while pending:
+            size, task = pending.popleft()
+            try:
+                content, skipped = await task
+            except Exception as e:
+                logging.error(f"Portfolio chunk failed: {e}")
+                content, skipped = None, size
+            schedule_next()
+
+            portfolio_stats["sections_failed"] += skipped
+            if content is not None:
+                await asyncio.to_thread(_append, writer, content, issued_at)
+            done += size
+
+            now = time.monotonic()
+            if on_section and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                try:
+                    await on_section(done, len(checked))
+                except Exception:
+                    pass  # Прогресс не должен ронять сборку
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+    pages = len(writer.pages)
+    output = await asyncio.to_thread(_write, writer)
+    del writer   # Объекты страниц отпускаются до того, как файл читается в память
+    content = await asyncio.to_thread(_read, output)
+
+    portfolio_stats["built"] += 1
+    portfolio_stats["companies"] += len(checked)
+    portfolio_stats["build_time"] += time.monotonic() - started
+    return {"success": True, "content": content, "rows": rows, "pages": pages, "error": ""}
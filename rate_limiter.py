@@ -0,0 +1,245 @@
+"""
+Ограничение и учёт запросов к внешним API.
+
+- Token bucket на провайдера сглаживает всплески (массовая проверка, популярный ИНН).
+- Каждый запрос учитывается по провайдеру и методу. Счётчики копятся в памяти
+  и пачками записываются в api_usage / api_usage_daily.
+- Дневной лимит расхода: после его исчерпания новые запросы не выполняются,
+  а проверки отдают данные из кеша (если они есть).
+- Когда остаток годовой квоты опускается ниже порога, администраторы получают оповещение.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from database import increment_api_usage, add_daily_api_usage, get_daily_api_usage, get_api_usage
+
+# (запросов в секунду, размер всплеска) по провайдерам
+RATE_LIMITS = {
+    "zachestnyibiznes": (10, 20),
+    "api_assist": (5, 10),
+    "dadata": (20, 30),
+}
+DEFAULT_RATE_LIMIT = (5, 10)
+
+# Запись счётчиков в БД
+FLUSH_BATCH = 50      # Записываем, когда накопилось столько запросов...
+FLUSH_INTERVAL = 60   # ...или прошло столько секунд с прошлой записи
+
+# Дневной лимит: задаётся переменной окружения <PROVIDER>_DAILY_CAP (0 — без лимита).
+# Если не задан, для провайдеров с годовой квотой в api_usage берётся
+# равномерная доля остатка до даты сброса с запасом DAILY_CAP_MULTIPLIER.
+DAILY_CAP_MULTIPLIER = 2
+DAILY_CAP_FLOOR = 500
+
+
+class QuotaExceededError(Exception):
+    """Исчерпан дневной лимит запросов к провайдеру."""
+
+    def __init__(self, provider: str, cap: int):
+        self.provider = provider
+        self.cap = cap
+        super().__init__(f"Дневной лимит запросов к {provider} исчерпан ({cap})")
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity про запас."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Забирает токены, если они есть. Возвращает 0 или сколько секунд подождать."""
+        tokens = min(tokens, self.capacity)
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        """Ждёт, пока в ведре появятся токены."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_pending: Dict[Tuple[str, str], Dict[str, int]] = {}   # (provider, day) -> {method: count}, ещё не записано в БД
+_daily: Dict[str, list] = {}               # provider -> [day, count] (записанное + в памяти)
+_daily_caps: Dict[str, list] = {}          # provider -> [day, cap]
+_cap_alerted: Dict[str, str] = {}          # provider -> день, когда уже оповещали о лимите
+_last_flush = time.monotonic()
+_alert_handler: Optional[Callable[[str, dict], Awaitable[None]]] = None
+_alert_tasks = set()
+
+
+def set_alert_handler(handler: Callable[[str, dict], Awaitable[None]]):
+    """Регистрирует корутину handler(provider, info) для оповещений администраторов."""
+    global _alert_handler
+    _alert_handler = handler
+
+
+def _notify(provider: str, info: dict):
+    if _alert_handler is None:
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_alert_handler(provider, info))
+    except RuntimeError:
+        return  # Нет event loop (вызов из синхронного кода вне бота)
+    _alert_tasks.add(task)
+    task.add_done_callback(_alert_tasks.discard)
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    bucket = _buckets.get(provider)
+    if bucket is None:
+        rate, capacity = RATE_LIMITS.get(provider, DEFAULT_RATE_LIMIT)
+        bucket = _buckets[provider] = TokenBucket(rate, capacity)
+    return bucket
+
+
+def daily_used(provider: str) -> int:
+    """Запросов к провайдеру за сегодня (включая ещё не записанные в БД)."""
+    today = _today()
+    entry = _daily.get(provider)
+    if entry is None or entry[0] != today:
+        persisted = sum(get_daily_api_usage(provider, today).values())
+        pending = sum(_pending.get((provider, today), {}).values())
+        entry = _daily[provider] = [today, persisted + pending]
+    return entry[1]
+
+
+def get_daily_cap(provider: str) -> Optional[int]:
+    """Дневной лимит провайдера (None — без лимита). Пересчитывается раз в день."""
+    today = _today()
+    entry = _daily_caps.get(provider)
+    if entry is not None and entry[0] == today:
+        return entry[1]
+
+    cap = None
+    configured = os.getenv(f"{provider.upper()}_DAILY_CAP")
+    if configured is not None:
+        try:
+            cap = int(configured) or None
+        except ValueError:
+            logging.warning(f"Invalid {provider.upper()}_DAILY_CAP: {configured!r}")
+    else:
+        usage = get_api_usage(provider)
+        if usage and usage.get("reset_date"):
+            try:
+                days_left = max(1, (datetime.strptime(usage["reset_date"], "%Y-%m-%d") - datetime.now()).days)
+                fair_share = math.ceil(max(0, usage["remaining"]) / days_left)
+                cap = max(DAILY_CAP_FLOOR, fair_share * DAILY_CAP_MULTIPLIER)
+            except ValueError:
+                cap = None
+
+    _daily_caps[provider] = [today, cap]
+    return cap
+
+
+def ensure_within_cap(provider: str, methods: list):
+    """Бросает QuotaExceededError, если запрос не помещается в дневной лимит."""
+    cap = get_daily_cap(provider)
+    if cap is None:
+        return
+    if daily_used(provider) + len(methods) > cap:
+        today = _today()
+        if _cap_alerted.get(provider) != today:
+            _cap_alerted[provider] = today
+            logging.warning(f"Daily cap reached for {provider}: {cap}")
+            _notify(provider, {"kind": "daily_cap", "cap": cap, "used": daily_used(provider)})
+        raise QuotaExceededError(provider, cap)
+
+
+async def acquire(provider: str, methods: list):
+    """Перед запросом: проверка дневного лимита и ожидание токена."""
+    ensure_within_cap(provider, methods)
+    await get_bucket(provider).acquire()
+
+
+def record_usage(provider: str, methods: list):
+    """Учитывает выполненный запрос: каждый метод — одна единица квоты."""
+    daily_used(provider)  # Сначала загружаем дневной счётчик, потом добавляем запрос
+    entry = _daily[provider]
+    entry[1] += len(methods)
+    # День запоминается при учёте: запись после полуночи не переносит запросы на следующие сутки
+    pending = _pending.setdefault((provider, entry[0]), {})
+    for method in methods:
+        pending[method] = pending.get(method, 0) + 1
+
+    total_pending = sum(sum(counts.values()) for counts in _pending.values())
+    if total_pending >= FLUSH_BATCH or time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush_usage()
+
+
+def counted(provider: str, methods: list, func: Callable) -> Callable:
+    """
+    Оборачивает одну попытку запроса (для call_async / call_sync): usage
+    записывается перед каждой отправкой. Провайдер списывает квоту и за
+    повторы, и за неудачные вызовы — иначе дневной лимит недосчитывает их
+    как раз тогда, когда API сбоит.
+    """
+    if asyncio.iscoroutinefunction(func):
+        async def attempt(*args, **kwargs):
+            record_usage(provider, methods)
+            return await func(*args, **kwargs)
+    else:
+        def attempt(*args, **kwargs):
+            record_usage(provider, methods)
+            return func(*args, **kwargs)
+    return attempt
+
+
+def flush_usage():
+    """Записывает накопленные счётчики в БД и рассылает оповещения о низком остатке."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    batch = {key: counts for key, counts in _pending.items() if counts}
+    _pending.clear()
+
+    for (provider, day), counts in batch.items():
+        try:
+            add_daily_api_usage(provider, counts, day)
+            usage_info = increment_api_usage(provider, sum(counts.values()))
+        except Exception as e:
+            logging.error(f"API usage flush failed for {provider}: {e}")
+            # Вернём счётчики, чтобы записать их при следующей попытке
+            pending = _pending.setdefault((provider, day), {})
+            for method, count in counts.items():
+                pending[method] = pending.get(method, 0) + count
+            continue
+        if usage_info.get("should_alert"):
+            _notify(provider, {"kind": "low_balance", **usage_info})
+
+
+def get_usage_snapshot(provider: str) -> dict:
+    """Расход за сегодня для админ-статистики."""
+    today = _today()
+    by_method = get_daily_api_usage(provider, today)
+    for method, count in _pending.get((provider, today), {}).items():
+        by_method[method] = by_method.get(method, 0) + count
+    return {
+        "used_today": sum(by_method.values()),
+        "daily_cap": get_daily_cap(provider),
+        "by_method": by_method,
+    }
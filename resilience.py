@@ -0,0 +1,226 @@
+"""
+Устойчивость к сбоям внешних API: повторы и circuit breaker.
+
+- Идемпотентные запросы повторяются с экспоненциальной задержкой и случайным джиттером.
+- У каждого провайдера свой breaker: после серии сбоев он «размыкается» и запросы
+  сразу отклоняются, не нагружая лежащий сервис. По истечении паузы пропускается
+  пробный запрос (half-open): успех замыкает цепь, сбой снова размыкает.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import aiohttp
+
+# Сетевые ошибки, которые имеет смысл повторять
+_TRANSIENT_ERRORS = (asyncio.TimeoutError, OSError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+try:
+    import httpx  # Транспорт библиотеки dadata
+    _TRANSIENT_ERRORS += (httpx.TransportError,)
+except ImportError:
+    pass
+
+# Повторы
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5  # сек, задержка перед первым повтором (до джиттера)
+RETRY_MAX_DELAY = 5.0
+
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = 5   # Сбоев подряд до размыкания
+BREAKER_RESET_TIMEOUT = 30      # Сколько секунд breaker открыт до пробного запроса
+BREAKER_HALF_OPEN_PROBES = 1    # Сколько пробных запросов пропускать одновременно
+
+
+class CircuitOpenError(Exception):
+    """Провайдер временно отключён: breaker открыт."""
+
+    def __init__(self, provider: str, retry_in: float = 0):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f"Сервис {provider} временно недоступен, повторите через {retry_in:.0f} сек")
+
+
+class CircuitBreaker:
+    """Circuit breaker одного провайдера (closed → open → half_open → closed)."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT, half_open_probes: int = BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+        # Статистика для админки
+        self.total_failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def retry_in(self) -> float:
+        """Сколько секунд осталось до пробного запроса (0, если breaker не открыт)."""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить запрос сейчас."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.info(f"Circuit breaker {self.name}: closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes_in_flight = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                    logging.warning(f"Circuit breaker {self.name}: open after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние для админ-статистики."""
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if state == self.OPEN else 0.0
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "total_failures": self.total_failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "retry_in": retry_in,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Возвращает breaker провайдера (создаётся при первом обращении)."""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers.setdefault(provider, CircuitBreaker(provider))
+    return breaker
+
+
+def get_breakers_status() -> list:
+    """Состояние всех breaker'ов для админ-панели."""
+    return [breaker.snapshot() for breaker in _breakers.values()]
+
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    Временный ли это сбой: таймаут, обрыв соединения, 5xx или 429.
+    Ошибки клиента (4xx) не повторяются и не размыкают breaker.
+    """
+    status = getattr(exc, "status", None)  # aiohttp.ClientResponseError
+    if status is None:
+        response = getattr(exc, "response", None)  # requests.HTTPError
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(exc, _TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером перед повтором номер attempt (1, 2, ...)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+async def call_async(provider: str, func: Callable, *args, attempts: int = RETRY_ATTEMPTS, **kwargs) -> Any:
+    """
+    Выполняет корутину func(*args, **kwargs) с повторами через breaker провайдера.
+    Подходит только для идемпотентных запросов.
+
+    Raises:
+        CircuitOpenError: breaker открыт, запрос не выполнялся
+        Exception: исходная ошибка последней попытки
+    """
+    breaker = get_breaker(provider)
+    for attempt in range(1, attempts + 1):
+        if not breaker.allow_request():
+            raise CircuitOpenError(provider, breaker.retry_in())
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Отмена по общему дедлайну: запрос не уложился во время — это сбой
+            breaker.record_failure()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()  # Сервис ответил — это не сбой инфраструктуры
+                raise
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            logging.info(f"{provider}: attempt {attempt} failed ({e!r}), retrying")
+            await asyncio.sleep(backoff_delay(attempt))
+        else:
+            breaker.record_success()
+            return result
+
+
+def call_sync(provider: str, func: Callable, *args, attempts: int = RETRY_ATTEMPTS, **kwargs) -> Any:
+    """Синхронный вариант call_async для кода на requests."""
+    breaker = get_breaker(provider)
+    for attempt in range(1, attempts + 1):
+        if not breaker.allow_request():
+            raise CircuitOpenError(provider, breaker.retry_in())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            logging.info(f"{provider}: attempt {attempt} failed ({e!r}), retrying")
+            time.sleep(backoff_delay(attempt))
+        else:
+            breaker.record_success()
+            return result
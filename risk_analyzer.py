@@ -6,6 +6,9 @@
 from datetime import datetime
 from typing import Dict, Any, List, Tuple
 
+import risk_engine
+from risk_engine import THRESHOLDS
+
 
 def calculate_age_days(timestamp_ms) -> int:
     """Вычисляет количество дней с даты (timestamp в миллисекундах)."""
@@ -35,10 +38,9 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
     - emoji светофора (🟢/🟡/🔴)
     - текстовый статус
     - список факторов с их оценками
+    Итоговый уровень считает risk_engine; факторы — расшифровка для отчёта.
     """
     factors = []
-    critical_issues = 0
-    warnings = 0
     
     # 1. Статус компании
     status = data.get('state', {}).get('status', 'UNKNOWN')
@@ -46,22 +48,21 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
         factors.append({"name": "Статус", "value": "Действующая", "emoji": "✅"})
     elif status == 'LIQUIDATING':
         factors.append({"name": "Статус", "value": "В процессе ликвидации", "emoji": "❌"})
-        critical_issues += 1
     else:
         factors.append({"name": "Статус", "value": "Ликвидирована/Банкрот", "emoji": "❌"})
-        critical_issues += 1
     
     # 2. Возраст компании
     reg_date = data.get('state', {}).get('registration_date')
     age_days = calculate_age_days(reg_date)
     age_years = age_days // 365
     
-    if age_days < 180:  # Меньше 6 месяцев
+    if not reg_date:
+        factors.append({"name": "Возраст", "value": "Неизвестен", "emoji": "⚠️"})
+    elif age_days < THRESHOLDS["critical_age_days"]:  # Меньше 6 месяцев
         factors.append({"name": "Возраст", "value": f"{age_days} дней", "emoji": "❌"})
-        critical_issues += 1
-    elif age_days < 365:  # Меньше года
-        factors.append({"name": "Возраст", "value": f"{age_days} дней", "emoji": "⚠️"})
-        warnings += 1
+    elif age_days < THRESHOLDS["young_age_days"]:  # Меньше двух лет
+        value = f"{age_days} дней" if age_days < 365 else f"{age_years} год"
+        factors.append({"name": "Возраст", "value": value, "emoji": "⚠️"})
     else:
         factors.append({"name": "Возраст", "value": f"{age_years} лет", "emoji": "✅"})
     
@@ -69,7 +70,6 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
     invalid = data.get('invalid')
     if invalid:
         factors.append({"name": "Достоверность", "value": "Есть недостоверные сведения!", "emoji": "❌"})
-        critical_issues += 1
     else:
         factors.append({"name": "Достоверность", "value": "Сведения достоверны", "emoji": "✅"})
     
@@ -79,7 +79,6 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
         address_qc = address_data.get('data', {}).get('qc') if isinstance(address_data.get('data'), dict) else None
         if address_qc is not None and address_qc != 0:
             factors.append({"name": "Адрес", "value": "Проблемы с адресом", "emoji": "⚠️"})
-            warnings += 1
         else:
             factors.append({"name": "Адрес", "value": "Адрес подтвержден", "emoji": "✅"})
     
@@ -87,9 +86,8 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
     capital = data.get('capital', {})
     if isinstance(capital, dict):
         capital_value = capital.get('value', 0) or 0
-        if capital_value < 10000:
+        if capital_value < THRESHOLDS["low_capital"]:
             factors.append({"name": "Уставный капитал", "value": f"{capital_value:,.0f} ₽".replace(",", " "), "emoji": "⚠️"})
-            warnings += 1
         else:
             factors.append({"name": "Уставный капитал", "value": f"{capital_value:,.0f} ₽".replace(",", " "), "emoji": "✅"})
     
@@ -116,9 +114,8 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
             manager_days = calculate_age_days(manager_date)
             date_str = format_date_from_timestamp(manager_date)
             
-            if manager_days < 90:  # Меньше 3 месяцев
+            if manager_days < THRESHOLDS["recent_manager_days"]:  # Меньше 3 месяцев
                 factors.append({"name": "Руководитель", "value": f"Назначен {date_str} (недавно!)", "emoji": "⚠️"})
-                warnings += 1
             elif manager_days < 365:  # Меньше года
                 factors.append({"name": "Руководитель", "value": f"Назначен {date_str}", "emoji": "✅"})
             else:
@@ -128,18 +125,14 @@ def analyze_risks(data: Dict[str, Any]) -> Tuple[str, str, List[Dict[str, Any]]]
             factors.append({"name": "Руководитель", "value": "Указан (дата неизвестна)", "emoji": "✅"})
     else:
         factors.append({"name": "Руководитель", "value": "Не указан", "emoji": "⚠️"})
-        warnings += 1
     
     # Итоговый индикатор риска (круглый светофор)
-    if critical_issues > 0:
-        overall_emoji = "🔴"
-        overall_text = "Высокий риск"
-    elif warnings >= 2:
-        overall_emoji = "🟡"
-        overall_text = "Средний риск"
-    else:
-        overall_emoji = "🟢"
-        overall_text = "Низкий риск"
+    level = risk_engine.score_one(risk_engine.features_from_dadata(data))
+    overall_emoji, overall_text = {
+        "high": ("🔴", "Высокий риск"),
+        "medium": ("🟡", "Средний риск"),
+        "low": ("🟢", "Низкий риск"),
+    }[level]
     
     return overall_emoji, overall_text, factors
 
@@ -0,0 +1,210 @@
+"""
+Единая оценка риска контрагента.
+
+Каждая компания сводится к вектору признаков (FEATURES), а уровень риска
+считается сразу для пачки векторов в массивах NumPy:
+- критический признак (ликвидация, крупные долги ФССП, много дел в роли ответчика...)
+  даёт высокий риск;
+- предупреждения набирают баллы (WARNING_WEIGHTS), от MEDIUM_POINTS — средний риск;
+- иначе риск низкий.
+
+Одни и те же пороги используются в сообщении о проверке, PDF, массовой проверке,
+анализе DaData и пересчёте истории проверок (/rescore).
+Неизвестный признак — NaN: он не срабатывает ни в одном правиле.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+FEATURES = (
+    "liquidated",      # 1 — ликвидирована / прекратила деятельность
+    "age_days",        # Возраст компании, дней
+    "has_director",    # 1 — руководитель указан
+    "fssp_count",      # Исполнительных производств
+    "fssp_sum",        # Сумма долгов ФССП, ₽
+    "arb_defendant",   # Арбитражных дел в роли ответчика
+    "invalid",         # 1 — недостоверные сведения в ЕГРЮЛ
+    "address_issue",   # 1 — проблемы с адресом
+    "capital",         # Уставный капитал, ₽
+    "manager_days",    # Сколько дней назад назначен руководитель
+)
+_COL = {name: i for i, name in enumerate(FEATURES)}
+
+RISK_LEVELS = np.array(["low", "medium", "high"])
+
+THRESHOLDS = {
+    "critical_age_days": 180,       # Моложе — критично
+    "young_age_days": 730,          # Моложе двух лет — предупреждение
+    "fssp_count_high": 3,           # Больше производств — критично
+    "fssp_sum_high": 500_000,       # Больше сумма долгов — критично
+    "arb_defendant_high": 5,        # Больше дел в роли ответчика — критично
+    "low_capital": 10_000,          # Меньше уставный капитал — предупреждение
+    "recent_manager_days": 90,      # Руководитель сменился недавно — предупреждение
+}
+
+WARNING_WEIGHTS = {
+    "young": 2,
+    "no_director": 2,
+    "fssp": 2,
+    "arb_defendant": 1,
+    "address_issue": 1,
+    "low_capital": 1,
+    "recent_manager": 1,
+}
+MEDIUM_POINTS = 2
+
+RESCORE_BATCH = 500   # ИНН за один проход пересчёта истории
+
+
+def score_batch(matrix) -> np.ndarray:
+    """
+    Уровни риска ("low" / "medium" / "high") для матрицы признаков N × len(FEATURES).
+    """
+    m = np.asarray(matrix, dtype=float).reshape(-1, len(FEATURES))
+    col = lambda name: m[:, _COL[name]]
+    t = THRESHOLDS
+
+    critical = (
+        (col("liquidated") == 1)
+        | (col("age_days") < t["critical_age_days"])
+        | (col("invalid") == 1)
+        | (col("fssp_count") > t["fssp_count_high"])
+        | (col("fssp_sum") > t["fssp_sum_high"])
+        | (col("arb_defendant") > t["arb_defendant_high"])
+    )
+
+    warnings = {
+        "young": col("age_days") < t["young_age_days"],
+        "no_director": col("has_director") == 0,
+        "fssp": col("fssp_count") > 0,
+        "arb_defendant": col("arb_defendant") > 0,
+        "address_issue": col("address_issue") == 1,
+        "low_capital": col("capital") < t["low_capital"],
+        "recent_manager": col("manager_days") < t["recent_manager_days"],
+    }
+    points = np.zeros(len(m))
+    for name, flags in warnings.items():
+        points += WARNING_WEIGHTS[name] * flags
+
+    return RISK_LEVELS[np.where(critical, 2, np.where(points >= MEDIUM_POINTS, 1, 0))]
+
+
+def score_one(features: List[float]) -> str:
+    return str(score_batch([features])[0])
+
+
+# ============ Признаки ============
+
+def _days_since(value) -> float:
+    """Дней с даты "ДД.ММ.ГГГГ", "ГГГГ-ММ-ДД..." или timestamp в миллисекундах (NaN, если не разобрать)."""
+    if not value:
+        return np.nan
+    try:
+        if isinstance(value, (int, float)):
+            date = datetime.fromtimestamp(value / 1000)
+        elif "." in value:
+            date = datetime.strptime(value[:10], "%d.%m.%Y")
+        elif "-" in value:
+            date = datetime.strptime(value[:10], "%Y-%m-%d")
+        else:
+            return np.nan
+    except (ValueError, OSError, OverflowError):
+        return np.nan
+    return float((datetime.now() - date).days)
+
+
+def features_from_profile(profile) -> List[float]:
+    """Признаки из CompanyProfile (данные ЗАЧЕСТНЫЙБИЗНЕС)."""
+    card = profile.card
+    status = card.get("status", "")
+    row = [np.nan] * len(FEATURES)
+    row[_COL["liquidated"]] = 1.0 if any(w in status for w in ("Ликвид", "Прекращ", "Банкрот")) else 0.0
+    row[_COL["age_days"]] = _days_since(card.get("reg_date"))
+    row[_COL["has_director"]] = 1.0 if card.get("director") else 0.0
+    row[_COL["manager_days"]] = _days_since(card.get("director_date"))
+    row[_COL["fssp_count"]] = profile.fssp["count"]
+    row[_COL["fssp_sum"]] = profile.fssp["total_sum"]
+    row[_COL["arb_defendant"]] = profile.arbitration["as_defendant"]
+    return row
+
+
+def features_from_sections(fssp: Dict[str, Any], arbitration: Dict[str, Any]) -> List[float]:
+    """Признаки только по ФССП и арбитражу (когда карточки нет)."""
+    row = [np.nan] * len(FEATURES)
+    row[_COL["fssp_count"]] = fssp["count"]
+    row[_COL["fssp_sum"]] = fssp["total_sum"]
+    row[_COL["arb_defendant"]] = arbitration["as_defendant"]
+    return row
+
+
+def features_from_dadata(data: Dict[str, Any]) -> List[float]:
+    """Признаки из ответа DaData (findById/party)."""
+    state = data.get("state") or {}
+    row = [np.nan] * len(FEATURES)
+    row[_COL["liquidated"]] = 0.0 if state.get("status") == "ACTIVE" else 1.0
+    row[_COL["age_days"]] = _days_since(state.get("registration_date"))
+    row[_COL["invalid"]] = 1.0 if data.get("invalid") else 0.0
+
+    address = data.get("address")
+    if isinstance(address, dict):
+        qc = address.get("data", {}).get("qc") if isinstance(address.get("data"), dict) else None
+        row[_COL["address_issue"]] = 1.0 if qc is not None and qc != 0 else 0.0
+
+    capital = data.get("capital")
+    if isinstance(capital, dict):
+        row[_COL["capital"]] = capital.get("value", 0) or 0
+
+    manager = data.get("management") or {}
+    row[_COL["has_director"]] = 1.0 if manager.get("name") else 0.0
+    if manager.get("name"):
+        manager_date = None
+        for m in data.get("managers") or []:
+            if m.get("fio", {}).get("surname") in manager.get("name", ""):
+                manager_date = m.get("date")
+                break
+        row[_COL["manager_days"]] = _days_since(manager_date or state.get("actuality_date"))
+    return row
+
+
+def score_profiles(profiles: list) -> List[str]:
+    """Уровни риска для списка CompanyProfile (одним векторным проходом)."""
+    if not profiles:
+        return []
+    return score_batch([features_from_profile(p) for p in profiles]).tolist()
+
+
+# ============ Пересчёт истории ============
+
+def rescore_history() -> Dict[str, int]:
+    """
+    Пересчитывает risk_level в check_history по текущим порогам.
+    Данные берутся из api_cache; ИНН без закешированных карточки, ФССП
+    или арбитража пропускаются.
+    """
+    from database import get_history_inns, get_cached_sections, update_history_risk_levels
+    from zachestnyibiznes import CompanyProfile, has_risk_sections
+
+    stats = {"inns": 0, "rescored": 0, "changed": 0, "skipped": 0}
+    inns = get_history_inns()
+    stats["inns"] = len(inns)
+
+    for start in range(0, len(inns), RESCORE_BATCH):
+        scored_inns, profiles = [], []
+        for inn in inns[start:start + RESCORE_BATCH]:
+            sections = get_cached_sections(inn)
+            data = {method: section["data"] for method, section in sections.items()}
+            if not has_risk_sections(data):
+                stats["skipped"] += 1
+                continue
+            scored_inns.append(inn)
+            profiles.append(CompanyProfile.from_data(data, inn, score=False))
+
+        levels = score_profiles(profiles)
+        stats["changed"] += update_history_risk_levels(dict(zip(scored_inns, levels)))
+        stats["rescored"] += len(profiles)
+
+    logging.info(f"Risk rescore: {stats}")
+    return stats
@@ -1,8 +1,11 @@
 import os
+import asyncio
 from aiogram import Router, types
 from aiogram.filters import Command
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
 from dadata import Dadata
+from resilience import call_async
+import rate_limiter
 from .base_tool import BaseTool
 
 class CompanyCheckTool(BaseTool):
@@ -59,7 +62,10 @@ class CompanyCheckTool(BaseTool):
                 dadata = Dadata(api_key, secret_key) if secret_key else Dadata(api_key)
                 
                 inn = message.text.strip()
-                result = dadata.find_by_id("party", inn)
+                # Синхронный клиент DaData — в отдельном потоке, с повторами и circuit breaker
+                await rate_limiter.acquire("dadata", ["find_party"])
+                attempt = rate_limiter.counted("dadata", ["find_party"], asyncio.to_thread)
+                result = await call_async("dadata", attempt, dadata.find_by_id, "party", inn)
                     
                 if not result:
                     await message.answer("❌ Компания с таким ИНН не найдена.")
@@ -77,11 +83,11 @@ class CompanyCheckTool(BaseTool):
                 # Генерируем PDF
                 await status_msg.edit_text("📄 Генерирую PDF-отчет...")
                 
-                from pdf_generator import generate_pdf_report
-                pdf_path = generate_pdf_report(data, user_id)
+                from pdf_pool import render_pdf
+                content = await render_pdf(data, user_id)
                 
-                # Отправляем PDF
-                pdf_file = FSInputFile(pdf_path, filename=f"Отчет_{inn}.pdf")
+                # Отправляем PDF прямо из памяти
+                pdf_file = BufferedInputFile(content, filename=f"Отчет_{inn}.pdf")
                 await message.answer_document(
                     pdf_file,
                     caption="📎 PDF-отчет для приложения к договору"
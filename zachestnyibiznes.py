@@ -6,38 +6,351 @@ https://zachestnyibiznesapi.ru/docs
 """
 
 import os
-import requests
+import asyncio
+import aiohttp
+from dataclasses import dataclass
 from typing import Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from http_client import get_session, make_timeout, REQUEST_TIMEOUT
+from json_stream import read_json, PREVIEW_ITEMS, SUMMARY_KEY
+import risk_engine
+from risk_engine import THRESHOLDS
+from resilience import call_async, CircuitOpenError
+import rate_limiter
+from rate_limiter import QuotaExceededError
+from database import get_cached_sections, get_cached_times, save_cached_sections
 
 BASE_URL = "https://zachestnyibiznesapi.ru/paid/data"
 
 # Оптимальный набор методов
 DEFAULT_METHODS = "card,fs-fns,fssp-list,rating,court-arbitration,affilation-company,contacts"
 
+# Двухфазная загрузка: для первого сообщения хватает лёгких секций,
+# тяжёлые (связи и контакты) догружаются только для PDF, избранного и просмотра связей
+QUICK_METHODS = "card,fs-fns,fssp-list,rating,court-arbitration"
+HEAVY_METHODS = "affilation-company,contacts"
+
+# Секции, без которых уровень риска (risk_engine) не считается
+RISK_METHODS = ("card", "fssp-list", "court-arbitration")
+
+# Срок свежести закешированных данных по каждому методу
+CACHE_TTL = {
+    "card": timedelta(hours=6),
+    "rating": timedelta(hours=6),
+    "fs-fns": timedelta(days=90),  # Бухотчётность обновляется раз в год
+    "fssp-list": timedelta(days=1),
+    "court-arbitration": timedelta(days=1),
+    "affilation-company": timedelta(days=1),
+    "contacts": timedelta(days=7),
+}
+DEFAULT_CACHE_TTL = timedelta(hours=6)
+# Старше самого долгого TTL секция уже нигде не нужна — её удаляет prune_api_cache
+API_CACHE_MAX_AGE = max([*CACHE_TTL.values(), DEFAULT_CACHE_TTL])
+
+QUOTA_EXCEEDED_MESSAGE = "Дневной лимит запросов к API исчерпан, попробуйте завтра"
+
+# Названия секций для прогрессивного отчёта
+SECTION_TITLES = {
+    "card": "Карточка",
+    "fs-fns": "Финансы",
+    "fssp-list": "ФССП",
+    "rating": "Рейтинг ЗСК",
+    "court-arbitration": "Арбитраж",
+    "affilation-company": "Связи",
+    "contacts": "Контакты",
+}
+
+# Счётчики кеша (по секциям) для админ-статистики.
+# misses — секции, за которыми ушёл запрос в API; coalesced — устаревшие секции,
+# дождавшиеся чужого запроса (в API не ходили).
+cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+# Запросы к API, которые выполняются прямо сейчас: (inn, методы) -> Task.
+# Одинаковые одновременные проверки ждут один общий запрос.
+_inflight: Dict[tuple, asyncio.Task] = {}
+coalesce_stats = {"upstream": 0, "collapsed": 0}
+
+# Экономия от ленивой загрузки: сколько устаревших тяжёлых методов отложено
+# и сколько из них потом всё же запрошено у API
+lazy_stats = {"deferred": 0, "loaded": 0}
+
 
 def get_api_key() -> str:
     """Получает API ключ (ленивая загрузка после load_dotenv)."""
     return os.getenv("ZACHESTNYIBIZNES_API_KEY", "")
 
 
-def get_company_data(inn: str, methods: str = None) -> Dict[str, Any]:
+async def _get_json(url: str, params: Dict[str, str], timeout: float) -> Any:
+    """Одна попытка GET-запроса через общую сессию (длинные списки сворачиваются при чтении)."""
+    session = get_session()
+    async with session.get(url, params=params, timeout=make_timeout(timeout)) as response:
+        response.raise_for_status()
+        return await read_json(response)
+
+
+async def _fetch_json(url: str, params: Dict[str, str], methods: list, timeout: float) -> Any:
+    """
+    GET-запрос с повторами и circuit breaker; timeout — общий дедлайн на все попытки
+    (включая ожидание в rate limiter). methods — что списывается с квоты
+    за каждую отправленную попытку.
     """
-    Получает полные данные о компании одним запросом.
+    async def request():
+        await rate_limiter.acquire("zachestnyibiznes", methods)
+        attempt = rate_limiter.counted("zachestnyibiznes", methods, _get_json)
+        return await call_async("zachestnyibiznes", attempt, url, params, timeout)
+
+    return await asyncio.wait_for(request(), timeout)
+
+
+def split_methods(methods: str) -> list:
+    """Разбирает строку методов "card,rating" в список без дублей."""
+    result = []
+    for method in (methods or DEFAULT_METHODS).split(","):
+        method = method.strip()
+        if method and method not in result:
+            result.append(method)
+    return result
+
+
+def is_fresh(method: str, fetched_at: str, now: datetime = None) -> bool:
+    """Проверяет, не истёк ли срок свежести закешированной секции."""
+    try:
+        fetched = datetime.fromisoformat(fetched_at)
+    except (TypeError, ValueError):
+        return False
+    now = now or datetime.now()
+    return now - fetched < CACHE_TTL.get(method, DEFAULT_CACHE_TTL)
+
+
+def plan_refresh(method_list: list, cached: Dict[str, Dict], now: datetime = None) -> list:
+    """Возвращает методы, которые нужно запросить у API: их нет в кеше или они устарели."""
+    now = now or datetime.now()
+    return [
+        m for m in method_list
+        if m not in cached or not is_fresh(m, cached[m]["fetched_at"], now)
+    ]
+
+
+async def get_company_data(inn: str, methods: str = None, timeout: float = REQUEST_TIMEOUT, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Получает полные данные о компании.
+    Свежие секции отдаются из кеша, устаревшие дозапрашиваются по отдельности
+    и подмешиваются к сохранённым. Если в кеше ничего нет — один запрос multiple-methods.
     
     Args:
         inn: ИНН компании (10 или 12 цифр)
         methods: Список методов через запятую (по умолчанию оптимальный набор)
+        timeout: Дедлайн на весь запрос, сек
+        use_cache: Использовать кеш ответов (False — всегда идти в API)
     
     Returns:
         Словарь с данными компании или ошибкой
     """
+    method_list = split_methods(methods)
+    cached = get_cached_sections(inn) if use_cache else {}
+    stale = plan_refresh(method_list, cached)
+    
+    if use_cache:
+        cache_stats["hits"] += len(method_list) - len(stale)
+    
+    fetched = {}
+    if stale:
+        refresh = await _refresh_shared(inn, stale, len(stale) == len(method_list), timeout, count=use_cache)
+        if refresh.get("success"):
+            fetched = refresh["sections"]
+        elif not any(m in cached for m in method_list):
+            return dict(refresh)
+        # Иначе (лимит исчерпан, сервис недоступен) отдаём то, что есть в кеше
+    
+    # Собираем ответ: свежие данные из API поверх кеша.
+    # Если секцию обновить не удалось, отдаём устаревшую из кеша.
+    data = {}
+    times = []
+    for m in method_list:
+        section = fetched.get(m) or cached.get(m)
+        if section:
+            data[m] = section["data"]
+            times.append(section["fetched_at"])
+    
+    return {
+        "success": True,
+        "status": "found",
+        "data": data,
+        "raw": data,
+        "from_cache": not fetched,
+        "refreshed": [m for m in method_list if m in fetched],
+        "stale_sections": [m for m in stale if m not in fetched and m in cached],
+        "fetched_at": min(times) if times else datetime.now().isoformat(),
+    }
+
+
+def count_deferred_heavy(inn: str) -> int:
+    """
+    Сколько тяжёлых методов пришлось бы запросить у API, если бы их грузили сразу:
+    свежие секции из кеша ничего не стоят, поэтому отложенными не считаются.
+    """
+    cached = {m: {"fetched_at": t} for m, t in get_cached_times(inn).items()}
+    return len(plan_refresh(split_methods(HEAVY_METHODS), cached))
+
+
+async def get_quick_company_data(inn: str, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """Первая фаза проверки: только лёгкие секции для сообщения в чат."""
+    result = await get_company_data(inn, QUICK_METHODS, timeout)
+    if result.get("success"):
+        lazy_stats["deferred"] += count_deferred_heavy(inn)
+    return result
+
+
+async def load_heavy_sections(inn: str, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """Вторая фаза: догружает связи и контакты по запросу пользователя."""
+    result = await get_company_data(inn, HEAVY_METHODS, timeout)
+    if result.get("success"):
+        lazy_stats["loaded"] += len(result.get("refreshed", []))   # Только то, что пришло из API
+    return result
+
+
+async def refresh_cached_sections(inn: str, methods: list, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """
+    Фоновое обновление кеша (без ответа пользователю): запрашивает секции
+    и сохраняет их в api_cache. Несколько секций — одним запросом multiple-methods.
+    
+    Returns:
+        {"success", "refreshed": [методы], "errors": {метод: причина}, "error"}
+    """
+    refresh = await _refresh_shared(inn, methods, len(methods) > 1, timeout, count=False)
+    if not refresh.get("success"):
+        return {"success": False, "refreshed": [], "errors": {}, "error": refresh.get("error", "Ошибка запроса")}
+    return {"success": True, "refreshed": list(refresh["sections"]), "errors": refresh.get("errors", {})}
+
+
+async def iter_company_sections(inn: str, methods: str = None, timeout: float = REQUEST_TIMEOUT):
+    """
+    Асинхронный генератор для прогрессивного отчёта: выдаёт пачки секций,
+    готовых одновременно, — списки (method, section, error). Первая пачка —
+    свежие секции из кеша, дальше устаревшие, каждая своим запросом,
+    в порядке прихода ответов. Если в кеше нет ничего свежего (первая
+    проверка), все секции приходят одной пачкой из одного запроса
+    multiple-methods: по одному запросу на секцию это дороже по квоте и rate limiter.
+    
+    section — {"data", "fetched_at"} или None (тогда в error причина).
+    Если обновить секцию не удалось, но в кеше есть устаревшая, выдаётся она.
+    """
+    method_list = split_methods(methods)
+    cached = get_cached_sections(inn)
+    stale = plan_refresh(method_list, cached)
+    cache_stats["hits"] += len(method_list) - len(stale)
+    
+    fresh = [(m, cached[m], None) for m in method_list if m not in stale]
+    if fresh:
+        yield fresh
+    
+    if stale and not fresh:
+        groups = [stale]
+    else:
+        groups = [[m] for m in stale]
+    tasks = {
+        asyncio.ensure_future(_refresh_shared(inn, group, len(group) > 1, timeout)): group
+        for group in groups
+    }
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            batch = []
+            for task in done:
+                refresh = task.result()
+                for m in tasks[task]:
+                    section = refresh.get("sections", {}).get(m) or cached.get(m)
+                    error = None if section else refresh.get("errors", {}).get(m) or refresh.get("error")
+                    batch.append((m, section, error))
+            yield batch
+    finally:
+        # Читатель остановился раньше (например, компания не найдена).
+        # Отменяется только ожидание: общие запросы других проверок продолжаются.
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_quick_sections(inn: str, timeout: float = REQUEST_TIMEOUT):
+    """iter_company_sections для лёгких секций (первая фаза проверки)."""
+    lazy_stats["deferred"] += count_deferred_heavy(inn)
+    sections = iter_company_sections(inn, QUICK_METHODS, timeout)
+    try:
+        async for batch in sections:
+            yield batch
+    finally:
+        await sections.aclose()
+
+
+async def _refresh_shared(inn: str, methods: list, full: bool, timeout: float, count: bool = True) -> Dict[str, Any]:
+    """
+    _refresh_sections с объединением одинаковых одновременных запросов (single-flight).
+    count — учитывать секции в cache_stats: промахом считается только тот,
+    кто запустил запрос; остальные ожидающие — coalesced.
+    """
+    key = (inn, tuple(sorted(methods)))
+    task = _inflight.get(key)
+    if task is not None:
+        coalesce_stats["collapsed"] += 1
+        if count:
+            cache_stats["coalesced"] += len(methods)
+    else:
+        coalesce_stats["upstream"] += 1
+        if count:
+            cache_stats["misses"] += len(methods)
+        task = asyncio.ensure_future(_refresh_sections(inn, methods, full, timeout))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # shield: отмена одного ожидающего не должна отменять общий запрос
+    return await asyncio.shield(task)
+
+
+async def _refresh_sections(inn: str, methods: list, full: bool, timeout: float) -> Dict[str, Any]:
+    """
+    Запрашивает секции у API и сохраняет их в кеш.
+    full=True — одним запросом multiple-methods (первая проверка),
+    иначе каждая устаревшая секция параллельно через get_single_method.
+    Ошибки отдельных секций возвращаются в "errors".
+    """
+    errors = {}
+    if full:
+        result = await _fetch_multiple(inn, ",".join(methods), timeout)
+        if not result.get("success"):
+            return result
+        sections = {m: result["data"][m] for m in methods if isinstance(result["data"].get(m), dict)}
+    else:
+        results = await asyncio.gather(*(get_single_method(inn, m, timeout) for m in methods))
+        sections = {}
+        for m, res in zip(methods, results):
+            section = res.get("data")
+            if not res.get("success"):
+                errors[m] = res.get("error", "Ошибка запроса")
+            elif not isinstance(section, dict) or section.get("status") == "error":
+                errors[m] = "Ошибка ответа API"
+            elif section.get("status") == "260":
+                errors[m] = "Компания не найдена"
+            else:
+                sections[m] = section
+    
+    fetched_at = datetime.now().isoformat()
+    if sections:
+        save_cached_sections(inn, sections, fetched_at)
+    
+    return {
+        "success": True,
+        "sections": {m: {"data": section, "fetched_at": fetched_at} for m, section in sections.items()},
+        "errors": errors,
+    }
+
+
+async def _fetch_multiple(inn: str, methods: str, timeout: float) -> Dict[str, Any]:
+    """Запрос multiple-methods к API (без кеша)."""
     api_key = get_api_key()
     if not api_key:
         return {"error": "API key not configured", "success": False}
     
-    methods = methods or DEFAULT_METHODS
-    
     try:
         url = f"{BASE_URL}/multiple-methods"
         params = {
@@ -47,9 +360,7 @@ def get_company_data(inn: str, methods: str = None) -> Dict[str, Any]:
             "_format": "json"
         }
         
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        data = await _fetch_json(url, params, split_methods(methods), timeout)
         
         # Для ИП API может вернуть список [{card:...}, {card:...}] вместо словаря
         # Объединяем в один словарь
@@ -77,16 +388,20 @@ def get_company_data(inn: str, methods: str = None) -> Dict[str, Any]:
             "raw": data
         }
         
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         return {"error": "Превышено время ожидания", "success": False}
-    except requests.exceptions.RequestException as e:
+    except CircuitOpenError:
+        return {"error": "Сервис данных временно недоступен, попробуйте через минуту", "success": False}
+    except QuotaExceededError:
+        return {"error": QUOTA_EXCEEDED_MESSAGE, "success": False}
+    except aiohttp.ClientError as e:
         return {"error": f"Ошибка запроса: {str(e)}", "success": False}
     except Exception as e:
         return {"error": f"Неожиданная ошибка: {str(e)}", "success": False}
 
 
-def get_single_method(inn: str, method: str) -> Dict[str, Any]:
-    """Получает данные одним методом (для отладки или экономии)."""
+async def get_single_method(inn: str, method: str, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """Получает данные одним методом (для точечного обновления устаревших секций)."""
     api_key = get_api_key()
     if not api_key:
         return {"error": "API key not configured", "success": False}
@@ -99,10 +414,13 @@ def get_single_method(inn: str, method: str) -> Dict[str, Any]:
             "_format": "json"
         }
         
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        return {"success": True, "data": response.json()}
+        data = await _fetch_json(url, params, [method], timeout)
+        return {"success": True, "data": data}
         
+    except asyncio.TimeoutError:
+        return {"error": "Превышено время ожидания", "success": False}
+    except QuotaExceededError:
+        return {"error": QUOTA_EXCEEDED_MESSAGE, "success": False}
     except Exception as e:
         return {"error": str(e), "success": False}
 
@@ -239,12 +557,18 @@ def parse_fssp(data: Dict) -> Dict[str, Any]:
         fssp = data.get("fssp-list", {})
     
     items = fssp.get("Записи", [])
-    total_sum = sum(float(item.get("СуммаДолга", 0) or 0) for item in items)
+    summary = fssp.get(SUMMARY_KEY)
+    if summary:
+        # Список свёрнут при чтении ответа (json_stream)
+        count, total_sum = summary["count"], summary["total_sum"]
+    else:
+        count = len(items)
+        total_sum = sum(float(item.get("СуммаДолга", 0) or 0) for item in items)
     
     return {
-        "count": len(items),
+        "count": count,
         "total_sum": total_sum,
-        "items": items[:5],  # Первые 5 для отображения
+        "items": items[:PREVIEW_ITEMS],  # Первые для отображения
     }
 
 
@@ -274,14 +598,20 @@ def parse_arbitration(data: Dict) -> Dict[str, Any]:
         arb = data.get("court-arbitration", {})
     
     cases = arb.get("Дела", [])
-    as_plaintiff = sum(1 for c in cases if c.get("Роль") == "Истец")
-    as_defendant = sum(1 for c in cases if c.get("Роль") == "Ответчик")
+    summary = arb.get(SUMMARY_KEY)
+    if summary:
+        # Список свёрнут при чтении ответа (json_stream)
+        total, as_plaintiff, as_defendant = summary["count"], summary["as_plaintiff"], summary["as_defendant"]
+    else:
+        total = len(cases)
+        as_plaintiff = sum(1 for c in cases if c.get("Роль") == "Истец")
+        as_defendant = sum(1 for c in cases if c.get("Роль") == "Ответчик")
     
     return {
-        "total": len(cases),
+        "total": total,
         "as_plaintiff": as_plaintiff,
         "as_defendant": as_defendant,
-        "cases": cases[:5],
+        "cases": cases[:PREVIEW_ITEMS],
     }
 
 
@@ -353,6 +683,89 @@ def parse_contacts(data: Dict) -> Dict[str, Any]:
 
 
 
+def has_risk_sections(data: Dict) -> bool:
+    """
+    Загружены ли все секции, от которых зависит уровень риска. Не загрузившаяся
+    секция парсится как пустая (0 производств, 0 дел) и занизила бы оценку.
+    """
+    return all(m in data for m in RISK_METHODS)
+
+
+def assess_risk_level(fssp: Dict[str, Any], arb: Dict[str, Any]) -> str:
+    """Уровень риска только по ФССП и арбитражу: low / medium / high (см. risk_engine)."""
+    return risk_engine.score_one(risk_engine.features_from_sections(fssp, arb))
+
+
+@dataclass
+class CompanyProfile:
+    """
+    Разобранные данные одной проверки. Строится один раз из ответа API
+    и дальше используется отчётом, PDF, историей и избранным — без повторного
+    парсинга и без хранения сырого ответа.
+    affiliates и contacts равны None, пока тяжёлые секции не догружены.
+    sections — методы, которые действительно пришли: секции, которых там нет,
+    заполнены значениями парсеров по умолчанию.
+    """
+    __slots__ = (
+        "inn", "name", "card", "finances", "fssp", "rating", "arbitration",
+        "affiliates", "contacts", "risk_level", "fetched_at", "sections",
+    )
+    
+    inn: str
+    name: str
+    card: Dict[str, Any]
+    finances: Dict[str, Any]
+    fssp: Dict[str, Any]
+    rating: Dict[str, Any]
+    arbitration: Dict[str, Any]
+    affiliates: Optional[list]
+    contacts: Optional[Dict[str, Any]]
+    risk_level: str
+    fetched_at: Optional[str]
+    sections: tuple
+    
+    @classmethod
+    def from_data(cls, data: Dict, inn: str = "", fetched_at: str = None, score: bool = True) -> "CompanyProfile":
+        """
+        Парсит все секции ответа (тяжёлые — только если они есть в data).
+        score=False — уровень риска не считается (для пачки профилей см. risk_engine.score_profiles).
+        Без секций RISK_METHODS (не загрузились) risk_level остаётся пустым — «не оценён».
+        """
+        card = parse_card(data)
+        profile = cls(
+            inn=card.get("inn") or inn,
+            name=card.get("name") or card.get("full_name") or "Неизвестно",
+            card=card,
+            finances=parse_finances(data),
+            fssp=parse_fssp(data),
+            rating=parse_rating(data),
+            arbitration=parse_arbitration(data),
+            affiliates=parse_affiliates(data) if "affilation-company" in data else None,
+            contacts=parse_contacts(data) if "contacts" in data else None,
+            risk_level="",
+            fetched_at=fetched_at,
+            sections=tuple(data),
+        )
+        if score and has_risk_sections(data):
+            profile.risk_level = risk_engine.score_one(risk_engine.features_from_profile(profile))
+        return profile
+    
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], inn: str = "") -> "CompanyProfile":
+        """Профиль из результата get_company_data / get_quick_company_data."""
+        return cls.from_data(result.get("data", {}), inn, result.get("fetched_at"))
+    
+    @property
+    def heavy_loaded(self) -> bool:
+        return self.affiliates is not None and self.contacts is not None
+    
+    def add_heavy_sections(self, data: Dict):
+        """Дополняет профиль связями и контактами из load_heavy_sections."""
+        self.affiliates = parse_affiliates(data)
+        self.contacts = parse_contacts(data)
+        self.sections = tuple(dict.fromkeys(self.sections + tuple(data)))
+
+
 # ============ Форматирование отчёта ============
 
 def format_number(num) -> str:
@@ -371,27 +784,83 @@ def format_number(num) -> str:
         return "Н/Д"
 
 
-def format_company_report(result: Dict[str, Any]) -> str:
+def report_fetched_at(times: Dict[str, str]) -> Optional[str]:
+    """
+    Время данных отчёта по {метод: fetched_at}: самая старая из часто меняющихся
+    секций (бухотчётность с TTL в месяцы не в счёт, если есть другие).
+    """
+    volatile = [t for m, t in times.items() if CACHE_TTL.get(m, DEFAULT_CACHE_TTL) <= timedelta(days=1)]
+    return min(volatile or times.values()) if times else None
+
+
+def format_freshness(fetched_at: Optional[str], now: datetime = None) -> str:
+    """Насколько свежи данные отчёта (по самой старой секции)."""
+    try:
+        fetched = datetime.fromisoformat(fetched_at)
+    except (TypeError, ValueError):
+        return ""
+    age = ((now or datetime.now()) - fetched).total_seconds()
+    if age < 60:
+        return "данные получены только что"
+    if age < 3600:
+        return f"данные из кеша, обновлены {int(age // 60)} мин назад"
+    if age < 86400:
+        return f"данные из кеша, обновлены {int(age // 3600)} ч назад"
+    return f"данные из кеша от {fetched.strftime('%d.%m.%Y %H:%M')}"
+
+
+def format_related_sections(affiliates: list, contacts: Dict[str, Any]) -> list:
+    """Строки отчёта о связанных компаниях и контактах (тяжёлые секции)."""
+    lines = []
+    
+    # Связанные компании (фильтруем пустые)
+    valid_affiliates = [a for a in affiliates if a.get("name") and a.get("inn")]
+    if valid_affiliates:
+        lines.append(f"\n🔗 **Связанные компании:**")
+        lines.append(f"Руководитель связан еще с {len(valid_affiliates)} компаниями:")
+        for comp in valid_affiliates[:5]:
+            status_emoji = "🟢" if "Действующ" in comp.get("status", "") else "🔴"
+            name_short = comp['name'][:35] if len(comp.get('name', '')) > 35 else comp.get('name', '?')
+            lines.append(f"  {status_emoji} {name_short} (ИНН: {comp.get('inn', '?')})")
+        if len(valid_affiliates) > 5:
+            lines.append(f"  ... и еще {len(valid_affiliates) - 5} компаний")
+    
+    # Контакты
+    if contacts.get("has_data"):
+        lines.append(f"\n📞 **Контакты:**")
+        if contacts.get("phones"):
+            lines.append(f"  ☎️ {', '.join(contacts['phones'][:2])}")
+        if contacts.get("emails"):
+            lines.append(f"  ✉️ {', '.join(contacts['emails'])}")
+        if contacts.get("sites"):
+            lines.append(f"  🌐 {', '.join(contacts['sites'])}")
+    
+    return lines
+
+
+def format_company_report(profile, pending=(), failed=()) -> str:
     """
     Форматирует полный отчёт о компании для Telegram.
     Включает светофор рисков, финансы, ФССП, арбитраж, связи.
-    """
-    if not result.get("success"):
-        return f"❌ Ошибка: {result.get('error', 'Unknown error')}"
     
-    data = result.get("data", {})
+    Args:
+        profile: CompanyProfile (или результат get_company_data — для обратной совместимости)
+        pending: методы, которые ещё загружаются (прогрессивный отчёт)
+        failed: методы, которые загрузить не удалось
+    """
+    if isinstance(profile, dict):
+        if not profile.get("success"):
+            return f"❌ Ошибка: {profile.get('error', 'Unknown error')}"
+        profile = CompanyProfile.from_result(profile)
     
-    # Парсим все секции
-    card = parse_card(data)
-    finances = parse_finances(data)
-    fssp = parse_fssp(data)
-    rating = parse_rating(data)
-    arb = parse_arbitration(data)
-    affiliates = parse_affiliates(data)
+    card = profile.card
+    finances = profile.finances
+    fssp = profile.fssp
+    rating = profile.rating
+    arb = profile.arbitration
     
     # === СВЕТОФОР РИСКОВ ===
     risk_factors = []
-    overall_risk = "low"
     
     # 1. Статус компании
     status = card.get("status", "")
@@ -399,7 +868,6 @@ def format_company_report(result: Dict[str, Any]) -> str:
         risk_factors.append(("✅", "Статус", "Действующая"))
     elif "Ликвид" in status:
         risk_factors.append(("🔴", "Статус", "Ликвидирована"))
-        overall_risk = "high"
     elif status:
         risk_factors.append(("🟡", "Статус", status))
     else:
@@ -416,14 +884,17 @@ def format_company_report(result: Dict[str, Any]) -> str:
             else:
                 reg_dt = None
             if reg_dt:
-                age_years = (datetime.now() - reg_dt).days // 365
-                if age_years >= 5:
-                    risk_factors.append(("✅", "Возраст", f"{age_years} лет"))
-                elif age_years >= 2:
-                    risk_factors.append(("🟡", "Возраст", f"{age_years} года"))
+                age_days = (datetime.now() - reg_dt).days
+                age_years = age_days // 365
+                # Те же границы, что в risk_engine
+                if age_days < THRESHOLDS["critical_age_days"]:
+                    risk_factors.append(("🔴", "Возраст", "Менее 6 месяцев"))
+                elif age_days < THRESHOLDS["young_age_days"]:
+                    risk_factors.append(("🟡", "Возраст", "Менее 2 лет (молодая)"))
+                elif age_years < 5:
+                    risk_factors.append(("✅", "Возраст", f"{age_years} года"))
                 else:
-                    risk_factors.append(("🔴", "Возраст", f"Менее 2 лет (молодая)"))
-                    overall_risk = "medium" if overall_risk == "low" else overall_risk
+                    risk_factors.append(("✅", "Возраст", f"{age_years} лет"))
         except:
             pass
     
@@ -437,7 +908,6 @@ def format_company_report(result: Dict[str, Any]) -> str:
             risk_factors.append(("✅", "Руководитель", "Назначен"))
     else:
         risk_factors.append(("🔴", "Руководитель", "Не указан"))
-        overall_risk = "medium" if overall_risk == "low" else overall_risk
     
     # 4. Адрес
     address = card.get("address", "")
@@ -447,21 +917,26 @@ def format_company_report(result: Dict[str, Any]) -> str:
         risk_factors.append(("⚠️", "Адрес", "Не указан"))
     
     # 5. ФССП
-    if fssp["count"] > 0:
-        if fssp["total_sum"] > 500000:
+    if "fssp-list" in pending:
+        risk_factors.append(("⏳", "ФССП", "загружается..."))
+    elif "fssp-list" in failed:
+        risk_factors.append(("⚠️", "ФССП", "Нет данных"))
+    elif fssp["count"] > 0:
+        if fssp["total_sum"] > THRESHOLDS["fssp_sum_high"] or fssp["count"] > THRESHOLDS["fssp_count_high"]:
             risk_factors.append(("🔴", "ФССП", f"{fssp['count']} производств ({format_number(fssp['total_sum'])})"))
-            overall_risk = "high"
         else:
             risk_factors.append(("🟡", "ФССП", f"{fssp['count']} производств"))
-            overall_risk = "medium" if overall_risk == "low" else overall_risk
     else:
         risk_factors.append(("✅", "ФССП", "Исполнительных производств нет"))
     
     # 6. Арбитраж
-    if arb["total"] > 0:
-        if arb["as_defendant"] > 5:
+    if "court-arbitration" in pending:
+        risk_factors.append(("⏳", "Арбитраж", "загружается..."))
+    elif "court-arbitration" in failed:
+        risk_factors.append(("⚠️", "Арбитраж", "Нет данных"))
+    elif arb["total"] > 0:
+        if arb["as_defendant"] > THRESHOLDS["arb_defendant_high"]:
             risk_factors.append(("🔴", "Арбитраж", f"{arb['total']} дел (ответчик: {arb['as_defendant']})"))
-            overall_risk = "high"
         elif arb["as_defendant"] > 0:
             risk_factors.append(("🟡", "Арбитраж", f"{arb['total']} дел"))
         else:
@@ -487,9 +962,14 @@ def format_company_report(result: Dict[str, Any]) -> str:
         risk_emoji = "🟢"
         risk_text = "НИЗКИЙ РИСК (ЗСК)"
     else:
-        # Fallback на нашу логику если ЗСК не вернул рейтинг
+        # Fallback на нашу оценку (risk_engine), если ЗСК не вернул рейтинг.
+        # Пустой risk_level — ФССП или арбитраж не загрузились, оценивать не по чему.
         risk_map = {"low": ("🟢", "НИЗКИЙ РИСК"), "medium": ("🟡", "СРЕДНИЙ РИСК"), "high": ("🔴", "ВЫСОКИЙ РИСК")}
-        risk_emoji, risk_text = risk_map[overall_risk]
+        risk_emoji, risk_text = risk_map.get(profile.risk_level, ("⚪", "РИСК НЕ ОЦЕНЁН"))
+    
+    # Итоговую оценку показываем, только когда пришли все секции, от которых она зависит
+    if any(m in pending for m in ("rating", "fssp-list", "court-arbitration")):
+        risk_emoji, risk_text = "⏳", "ОЦЕНКА РИСКА..."
     
     
     # === ФОРМИРУЕМ ОТЧЁТ ===
@@ -512,7 +992,9 @@ def format_company_report(result: Dict[str, Any]) -> str:
     lines.append(f"\n💰 **Финансы{year_suffix}:**")
     if card.get("capital") and float(card.get("capital") or 0) > 0:
         lines.append(f"  💵 Уставный капитал: {format_number(card['capital'])}")
-    if finances.get("has_data"):
+    if "fs-fns" in pending:
+        lines.append(f"  ⏳ Загружается...")
+    elif finances.get("has_data"):
         lines.append(f"  📈 Выручка: {format_number(finances['revenue'])}")
         lines.append(f"  💹 Прибыль: {format_number(finances['profit'])}")
         if finances.get("taxes_paid") and float(finances.get("taxes_paid") or 0) > 0:
@@ -552,13 +1034,13 @@ def format_company_report(result: Dict[str, Any]) -> str:
         
         # Проверяем ФССП
         if fssp["count"] > 0:
-            if fssp["total_sum"] > 500000:
+            if fssp["total_sum"] > THRESHOLDS["fssp_sum_high"]:
                 risk_reasons.append(f"⚠️ ФССП: {fssp['count']} производств на {format_number(fssp['total_sum'])}")
             else:
                 risk_reasons.append(f"⚠️ ФССП: {fssp['count']} производств")
         
         # Проверяем арбитраж
-        if arb["as_defendant"] > 3:
+        if arb["as_defendant"] > THRESHOLDS["arb_defendant_high"]:
             risk_reasons.append(f"⚠️ Арбитраж: ответчик в {arb['as_defendant']} делах")
         elif arb["as_defendant"] > 0:
             risk_reasons.append(f"ℹ️ Арбитраж: ответчик в {arb['as_defendant']} делах")
@@ -618,28 +1100,8 @@ def format_company_report(result: Dict[str, Any]) -> str:
             else:
                 lines.append(f"  🏛 Налоги ({fin_year}): {format_number(finances['taxes_paid'])}")
     
-    # Связанные компании (фильтруем пустые)
-    valid_affiliates = [a for a in affiliates if a.get("name") and a.get("inn")]
-    if valid_affiliates:
-        lines.append(f"\n🔗 **Связанные компании:**")
-        lines.append(f"Руководитель связан еще с {len(valid_affiliates)} компаниями:")
-        for comp in valid_affiliates[:5]:
-            status_emoji = "🟢" if "Действующ" in comp.get("status", "") else "🔴"
-            name_short = comp['name'][:35] if len(comp.get('name', '')) > 35 else comp.get('name', '?')
-            lines.append(f"  {status_emoji} {name_short} (ИНН: {comp.get('inn', '?')})")
-        if len(valid_affiliates) > 5:
-            lines.append(f"  ... и еще {len(valid_affiliates) - 5} компаний")
-    
-    # Контакты
-    contacts = parse_contacts(data)
-    if contacts.get("has_data"):
-        lines.append(f"\n📞 **Контакты:**")
-        if contacts.get("phones"):
-            lines.append(f"  ☎️ {', '.join(contacts['phones'][:2])}")
-        if contacts.get("emails"):
-            lines.append(f"  ✉️ {', '.join(contacts['emails'])}")
-        if contacts.get("sites"):
-            lines.append(f"  🌐 {', '.join(contacts['sites'])}")
+    # Связанные компании и контакты
+    lines.extend(format_related_sections(profile.affiliates or [], profile.contacts or {}))
     
     # Реквизиты
     lines.append(f"\n📋 **Реквизиты:**")
@@ -654,6 +1116,10 @@ def format_company_report(result: Dict[str, Any]) -> str:
         lines.append(f"  🏭 ОКВЭД: {card['okved']} - {okved_name}")
     
     
-    lines.append(f"\n_Отчёт: {datetime.now().strftime('%d.%m.%Y %H:%M')}_")
+    if pending:
+        lines.append(f"\n_⏳ Загружаются: {', '.join(SECTION_TITLES.get(m, m) for m in pending)}_")
+    else:
+        freshness = format_freshness(profile.fetched_at)
+        lines.append(f"\n_Отчёт: {datetime.now().strftime('%d.%m.%Y %H:%M')}" + (f" · {freshness}_" if freshness else "_"))
     
     return "\n".join(lines)